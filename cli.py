@@ -1,24 +1,92 @@
 import os
 import subprocess
+import sys
 import tempfile
 import time
+from typing import Optional
 
 import typer
-from rich.console import Console
-from rich.progress import Progress, SpinnerColumn, TextColumn
 
-from config import Config
-from core import analyzer, git
-from core.filters import DiffFilter
-from core.redaction import SecretRedactor
-from llm.openai import OpenAIProvider
+from core import git
+
+# Imported on demand so `--help` and the "nothing staged" exit stay fast when
+# edgecommit runs as a git hook; `--profile-startup` reports what they cost.
+DEFERRED_MODULES = (
+    "rich.console",
+    "rich.progress",
+    "config",
+    "core.analyzer",
+    "core.blobcache",
+    "core.cache",
+    "core.entropy",
+    "core.filters",
+    "core.pipeline",
+    "core.redaction",
+    "core.tokenizer",
+    "daemon",
+    "llm.local",
+    "llm.openai",
+    "llm.router",
+    "reword",
+    "tiktoken",
+)
+_OWN_PACKAGES = {"cli", "config", "core", "daemon", "llm", "reword"}
+PROFILE_TOP_MODULES = 20
 
 app = typer.Typer(
     name="edgecommit",
     help="AI-powered git commit message generator",
     no_args_is_help=False,
 )
-console = Console()
+
+
+class _LazyConsole:
+    _console = None
+    
+    @classmethod
+    def get(cls):
+        if cls._console is None:
+            from rich.console import Console
+            cls._console = Console()
+        return cls._console
+    
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+
+console = _LazyConsole()
+
+
+def profile_startup() -> dict[str, float]:
+    """Import cli and every deferred module in a fresh interpreter; return self time in ms."""
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    python_path = os.pathsep.join(filter(None, [package_dir, os.getenv("PYTHONPATH")]))
+    code = "import cli\n" + "".join(f"import {name}\n" for name in DEFERRED_MODULES)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        env={**os.environ, "PYTHONPATH": python_path},
+    )
+    
+    timings: dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        try:
+            self_ms = int(self_us) / 1000
+        except ValueError:
+            continue
+        
+        name = name.strip()
+        top = name.split(".")[0]
+        key = name if top in _OWN_PACKAGES else top
+        timings[key] = timings.get(key, 0.0) + self_ms
+        if name == "cli":
+            timings["<fast path>"] = int(cumulative_us) / 1000
+    
+    return timings
 
 
 def fallback_to_editor(template: str = None) -> str:
@@ -53,6 +121,85 @@ def fallback_to_editor(template: str = None) -> str:
         os.unlink(temp_file)
 
 
+def generation_fallback(summary, error) -> str:
+    """Report a failed generation and have the user write the message in their editor."""
+    console.print(f"[yellow]⚠[/yellow] AI generation failed: {error}")
+    console.print("[yellow]→[/yellow] Falling back to editor...")
+    
+    template = f"""# Auto-commit fallback - AI generation failed
+# 
+# Error: {str(error)}
+# 
+# Analyzed changes:
+# Type: {summary.change_type}
+# Files: {summary.total_files} files changed
+# Stats: +{summary.total_added}/-{summary.total_removed} lines
+#
+# Files changed:
+"""
+    for file in summary.significant_files[:5]:
+        template += f"# - {file.path}: +{file.added}/-{file.removed}\n"
+    
+    template += """#
+# Please write a conventional commit message:
+# Format: <type>(<scope>): <subject>
+#
+# Types: feat, fix, docs, style, refactor, perf, test, chore
+
+"""
+    
+    return fallback_to_editor(template)
+
+
+def heuristic_message(summary, config, timings) -> Optional[str]:
+    """A rule-based message for a trivial change, if it is confident enough to skip the model."""
+    from core import analyzer
+    
+    threshold = config.heuristic_threshold
+    if threshold is None:
+        return None
+    with timings.stage("heuristic"):
+        guess = analyzer.heuristic_commit(summary, threshold)
+    return guess.message if guess is not None else None
+
+
+def describe_ignored_changes(numstats, config, timings):
+    """Summary and message for staged files the filters all drop, such as a lockfile refresh.
+    
+    Exits when no rule describes them, as there is nothing to send the model.
+    """
+    from core import analyzer
+    
+    try:
+        summary = analyzer.analyze_changes(numstats, "")
+    except ValueError:
+        # Only binary files
+        summary = None
+    message = heuristic_message(summary, config, timings) if summary is not None else None
+    if message is None:
+        console.print("[yellow]⚠[/yellow] All changed files are ignored. Nothing to commit.")
+        raise typer.Exit(0)
+    return summary, message
+
+
+def generate_in_daemon(client, config, timings):
+    """Run generation in the daemon; None if it failed and this process should do it instead."""
+    from daemon import DaemonError
+    
+    sent = time.perf_counter()
+    try:
+        with client:
+            result = client.generate(os.getcwd(), config)
+    except DaemonError as e:
+        console.print(f"[yellow]⚠[/yellow] Daemon request failed: {e}")
+        console.print("[yellow]→[/yellow] Generating in this process...")
+        return None
+    
+    for name, start, end in result.timings:
+        timings.record(f"daemon:{name}", sent + start, sent + end)
+    return result
+
+
 @app.command()
 def main(
     dry_run: bool = typer.Option(
@@ -61,101 +208,214 @@ def main(
         "-d",
         help="Show commit message without creating commit",
     ),
+    no_cache: bool = typer.Option(
+        False,
+        "--no-cache",
+        help="Always ask the model instead of reusing a cached message",
+    ),
+    show_timings: bool = typer.Option(
+        False,
+        "--timings",
+        help="Show when each pipeline stage ran and how much they overlapped",
+    ),
+    profile_startup_flag: bool = typer.Option(
+        False,
+        "--profile-startup",
+        help="Report import time per module and exit",
+    ),
+    no_daemon: bool = typer.Option(
+        False,
+        "--no-daemon",
+        help="Generate in this process even if `edgecommit daemon` is running",
+    ),
+    no_stream: bool = typer.Option(
+        False,
+        "--no-stream",
+        help="Wait for the whole reply instead of showing the subject as it arrives",
+    ),
+    candidates: Optional[int] = typer.Option(
+        None,
+        "--candidates",
+        min=1,
+        help="Request this many messages at once and keep the first valid Conventional Commit",
+    ),
+    provider: Optional[str] = typer.Option(
+        None,
+        "--provider",
+        help="Provider to generate with, e.g. openai or local (default: EDGE_PROVIDER)",
+    ),
+    no_heuristic: bool = typer.Option(
+        False,
+        "--no-heuristic",
+        help="Ask the model even for lockfile, rename, docs-only and version-bump commits",
+    ),
 ) -> None:
     start_time = time.time()
+    start_counter = time.perf_counter()
+    
+    if profile_startup_flag:
+        timings = profile_startup()
+        fast_path = timings.pop("<fast path>", 0.0)
+        ranked = sorted(timings.items(), key=lambda item: item[1], reverse=True)
+        for name, ms in ranked[:PROFILE_TOP_MODULES]:
+            console.print(f"{ms:8.1f} ms  {name}")
+        rest = ranked[PROFILE_TOP_MODULES:]
+        if rest:
+            console.print(f"{sum(ms for _, ms in rest):8.1f} ms  {len(rest)} other modules")
+        console.print(f"[bold]{sum(timings.values()):8.1f} ms  total[/bold]")
+        console.print(f"[dim]{fast_path:8.1f} ms  fast path (import cli only)[/dim]")
+        return
     
     try:
-        config = Config()
-        
-        if not git.has_staged_changes():
-            console.print("[red]✗[/red] No staged changes found. Run 'git add' first.")
-            raise typer.Exit(1)
-        
-        with Progress(
-            SpinnerColumn(),
-            TextColumn("[progress.description]{task.description}"),
-            console=console,
-            transient=True,
-        ) as progress:
-            task = progress.add_task("Analyzing staged changes...", total=None)
-            
-            numstats = git.get_staged_numstat()
-            if not numstats:
-                console.print("[red]✗[/red] No changes found in staged files.")
+        with git.StagedDiffStream() as stream:
+            numstat_done = time.perf_counter()
+            if not stream.numstats:
+                # Plain typer output: this path must not pay for importing rich
+                typer.echo(typer.style("✗", fg="red") + " No staged changes found. Run 'git add' first.")
                 raise typer.Exit(1)
             
-            progress.update(task, description="Processing changes...")
+            from rich.progress import Progress, SpinnerColumn, TextColumn
             
-            diff_filter = DiffFilter(config)
-            filtered_numstats = [
-                stat for stat in numstats 
-                if not diff_filter.should_skip_file(stat.file_path)
-            ]
+            from config import Config
+            from core import analyzer, tokenizer
+            from core.cache import ResponseCache, cache_key
+            from core.filters import DiffFilter
+            from core.pipeline import Generation, PipelineTimings, generate_message
             
-            if not filtered_numstats:
-                console.print("[yellow]⚠[/yellow] All changed files are ignored. Nothing to commit.")
-                raise typer.Exit(0)
+            timings = PipelineTimings(origin=start_counter)
+            timings.record("numstat", start_counter, numstat_done)
+            config = Config()
+            if candidates is not None:
+                config.commit_candidates = candidates
+            if provider is not None:
+                config.llm_provider = provider
+            if no_heuristic:
+                config.heuristic_commits = False
             
-
-            diff_patch = git.get_diff_patch()
-            truncated_diff = diff_filter.parse_diff_patch_file(diff_patch)
-            print(truncated_diff)
-            summary = analyzer.analyze_changes(filtered_numstats, truncated_diff)
-            progress.update(task, description="Generating commit message...")
+            commit_msg = None
+            heuristic = False
+            response_cache = None
+            if not no_cache:
+                response_cache = ResponseCache(ttl=config.cache_ttl, max_entries=config.cache_max_entries)
+                try:
+                    key = cache_key(git.write_tree(), config.cache_model, analyzer.PROMPT_VERSION)
+                    commit_msg = response_cache.get(key)
+                except git.GitError:
+                    # e.g. unmerged paths in the index; generate without the cache
+                    response_cache = None
+            cached = commit_msg is not None
             
-            try:
-                llm = OpenAIProvider(config)
-                commit_msg = llm.generate_commit(summary)
-                
-                redactor = SecretRedactor()
-                if redactor.has_potential_secrets(commit_msg):
-                    commit_msg = redactor.redact_diff(commit_msg)
-                
-            except Exception as e:
-                console.print(f"[yellow]⚠[/yellow] AI generation failed: {e}")
-                console.print("[yellow]→[/yellow] Falling back to editor...")
+            daemon_client = None
+            if not cached and not no_daemon:
+                from daemon import DaemonClient
+                daemon_client = DaemonClient.connect()
+            
+            if not cached and daemon_client is None:
+                # Load the BPE tables while git is still producing the diff
+                tokenizer.preload()
+            
+            with Progress(
+                SpinnerColumn(),
+                TextColumn("[progress.description]{task.description}"),
+                console=console.get(),
+                transient=True,
+            ) as progress:
+                task = progress.add_task("Processing changes...", total=None)
                 
-                template = f"""# Auto-commit fallback - AI generation failed
-# 
-# Error: {str(e)}
-# 
-# Analyzed changes:
-# Type: {summary.change_type}
-# Files: {summary.total_files} files changed
-# Stats: +{summary.total_added}/-{summary.total_removed} lines
-#
-# Files changed:
-"""
-                for file in summary.significant_files[:5]:
-                    template += f"# - {file.path}: +{file.added}/-{file.removed}\n"
+                result = None
+                if daemon_client is not None:
+                    progress.update(task, description="Generating commit message...")
+                    result = generate_in_daemon(daemon_client, config, timings)
+                    if result is None:
+                        progress.update(task, description="Processing changes...")
+                        tokenizer.preload()
                 
-                template += """#
-# Please write a conventional commit message:
-# Format: <type>(<scope>): <subject>
-#
-# Types: feat, fix, docs, style, refactor, perf, test, chore
-
-"""
+                if result is not None:
+                    # The daemon read the diff itself
+                    stream.close()
+                elif cached:
+                    # The message is reused as is, so neither the diff nor any
+                    # file's content is read; only the ignore rules apply to the summary
+                    stream.close()
+                    diff_filter = DiffFilter(config)
+                    with timings.stage("filter"):
+                        filtered_numstats = [
+                            stat for stat in stream.numstats 
+                            if not diff_filter.should_skip_file(stat.file_path)
+                        ]
+                    if filtered_numstats:
+                        result = Generation(analyzer.analyze_changes(filtered_numstats, ""), commit_msg)
+                    else:
+                        result = Generation(None)
+                else:
+                    from llm.router import build_provider
+                    
+                    blob_cache = None
+                    if config.blob_cache:
+                        from core.blobcache import BlobCache
+                        blob_cache = BlobCache(max_entries=config.blob_cache_max_entries)
+                    diff_filter = DiffFilter(config, cache=blob_cache)
+                    
+                    on_update = None
+                    if not no_stream:
+                        from rich.markup import escape
+                        
+                        def on_update(streamed):
+                            if streamed.subject:
+                                progress.update(task, description=f"[green]{escape(streamed.subject)}[/green]")
+                    
+                    result = generate_message(
+                        stream,
+                        config,
+                        diff_filter,
+                        lambda: build_provider(config),
+                        timings,
+                        on_generate=lambda: progress.update(task, description="Generating commit message..."),
+                        on_update=on_update,
+                    )
+                    stream.close()
                 
-                commit_msg = fallback_to_editor(template)
+                if result.summary is None:
+                    summary, commit_msg = describe_ignored_changes(stream.numstats, config, timings)
+                    heuristic = True
+                else:
+                    summary = result.summary
+                    commit_msg = result.message
+                    heuristic = result.heuristic
+                    if commit_msg is None:
+                        commit_msg = generation_fallback(summary, result.error)
+                    elif response_cache is not None and not cached and not heuristic:
+                        response_cache.put(key, commit_msg)
         
         processing_time = time.time() - start_time
         
-        console.print(f"\n[bold cyan]Generated commit message:[/bold cyan] [dim]({processing_time:.2f}s)[/dim]")
+        source = ", cached" if cached else ", no model needed" if heuristic else ""
+        console.print(f"\n[bold cyan]Generated commit message:[/bold cyan] [dim]({processing_time:.2f}s{source})[/dim]")
         console.print(f"[green]{commit_msg}[/green]\n")
         
         if summary.total_files > 1:
             console.print(f"[dim]Files: {summary.total_files} changed (+{summary.total_added}/-{summary.total_removed})[/dim]")
         
+        if summary.redactions:
+            redacted = ", ".join(f"{path} ({count})" for path, count in sorted(summary.redactions.items()))
+            console.print(f"[yellow]⚠[/yellow] Redacted {summary.total_redactions} secret(s) before sending: {redacted}")
+        
+        if show_timings:
+            for line in timings.report():
+                console.print(f"[dim]{line}[/dim]")
+        
         if dry_run:
             console.print("[yellow]ℹ[/yellow] Dry run mode - no commit created")
         else:
             if typer.confirm("Create commit with this message?", default=True):
-                git.create_commit(commit_msg)
+                git.create_commit(commit_msg, check_staged=False)
                 console.print("[green]✓[/green] Commit created successfully!")
             else:
                 console.print("[yellow]ℹ[/yellow] Commit cancelled")
                 
+    except typer.Exit:
+        raise
+        
     except git.GitError as e:
         console.print(f"[red]✗ Git error:[/red] {e}")
         console.print("[yellow]→[/yellow] Falling back to editor...")
@@ -187,6 +447,164 @@ def main(
             raise typer.Exit(1)
 
 
+@app.command("daemon")
+def daemon_command(
+    stop: bool = typer.Option(
+        False,
+        "--stop",
+        help="Stop the running daemon",
+    ),
+    idle_timeout: Optional[int] = typer.Option(
+        None,
+        "--idle-timeout",
+        help="Exit after this many seconds without a request (0 to never exit)",
+    ),
+) -> None:
+    """Keep the API connection, tokenizers and ignore rules warm between commits."""
+    from daemon import CommitDaemon, DaemonClient, DaemonError, socket_path
+
+    path = socket_path()
+    if stop:
+        client = DaemonClient.connect(path)
+        if client is None:
+            console.print("[yellow]ℹ[/yellow] No daemon is running")
+            raise typer.Exit(1)
+        with client:
+            client.shutdown()
+        console.print("[green]✓[/green] Daemon stopped")
+        return
+
+    from config import Config
+
+    commit_daemon = CommitDaemon(Config(), idle_timeout)
+    console.print(f"[green]✓[/green] Serving on {path}")
+    try:
+        commit_daemon.serve(path)
+    except DaemonError as e:
+        console.print(f"[red]✗[/red] {e}")
+        raise typer.Exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
+@app.command("reword")
+def reword_command(
+    revision_range: str = typer.Argument(
+        ...,
+        metavar="RANGE",
+        help="Commits to reword, e.g. main..HEAD; a single revision means every commit after it",
+    ),
+    dry_run: bool = typer.Option(
+        False,
+        "--dry-run",
+        "-d",
+        help="Show the new messages without rewriting history",
+    ),
+    yes: bool = typer.Option(
+        False,
+        "--yes",
+        "-y",
+        help="Rewrite without asking for confirmation",
+    ),
+    concurrency: Optional[int] = typer.Option(
+        None,
+        "--concurrency",
+        min=1,
+        help="Model calls in flight at once (default: EDGE_REWORD_CONCURRENCY)",
+    ),
+    provider: Optional[str] = typer.Option(
+        None,
+        "--provider",
+        help="Provider to generate with, e.g. openai or local (default: EDGE_PROVIDER)",
+    ),
+    no_heuristic: bool = typer.Option(
+        False,
+        "--no-heuristic",
+        help="Ask the model even for lockfile, rename, docs-only and version-bump commits",
+    ),
+) -> None:
+    """Generate new messages for a range of commits and rewrite them in one pass."""
+    from rich.markup import escape
+    from rich.progress import Progress, SpinnerColumn, TextColumn
+
+    from config import Config
+    from core import tokenizer
+    from core.filters import DiffFilter
+    from llm.router import build_provider
+    from reword import CommitReworder, RewordError, apply_results, reword_range
+
+    start_time = time.time()
+    config = Config()
+    if concurrency is not None:
+        config.reword_concurrency = concurrency
+    if provider is not None:
+        config.llm_provider = provider
+    if no_heuristic:
+        config.heuristic_commits = False
+
+    blob_cache = None
+    try:
+        llm = build_provider(config)
+        if config.blob_cache:
+            from core.blobcache import BlobCache
+            blob_cache = BlobCache(max_entries=config.blob_cache_max_entries)
+        # Load the BPE tables while git starts producing the log
+        tokenizer.preload()
+
+        with Progress(
+            SpinnerColumn(),
+            TextColumn("[progress.description]{task.description}"),
+            console=console.get(),
+            transient=True,
+        ) as progress:
+            task = progress.add_task("Reading commits...", total=None)
+            done = []
+
+            def on_result(result):
+                done.append(result)
+                progress.update(task, description=f"Generated {len(done)} message(s)...")
+
+            reworder = CommitReworder(config, llm, DiffFilter(config, cache=blob_cache), on_result=on_result)
+            results = reword_range(revision_range, reworder)
+    except (RewordError, git.GitError) as e:
+        console.print(f"[red]✗[/red] {e}")
+        raise typer.Exit(1)
+    except ValueError as e:
+        console.print(f"[red]✗ Configuration error:[/red] {e}")
+        raise typer.Exit(1)
+    finally:
+        if blob_cache is not None:
+            blob_cache.close()
+
+    processing_time = time.time() - start_time
+    changed = [result for result in results if result.message is not None and result.message != result.commit.message]
+    console.print(f"\n[bold cyan]Reworded {len(results)} commit(s):[/bold cyan] [dim]({processing_time:.2f}s)[/dim]")
+    for result in results:
+        oid = result.commit.oid[:7]
+        if result.message is None:
+            console.print(f"[yellow]{oid}[/yellow] {escape(result.commit.subject)} [dim](kept: {escape(result.error or '')})[/dim]")
+        else:
+            source = " [dim](no model needed)[/dim]" if result.heuristic else ""
+            console.print(f"[dim]{oid} {escape(result.commit.subject)}[/dim]")
+            console.print(f"  [green]→ {escape(result.message.splitlines()[0])}[/green]{source}")
+
+    if dry_run:
+        console.print("[yellow]ℹ[/yellow] Dry run mode - history not rewritten")
+        return
+    if not changed:
+        console.print("[yellow]ℹ[/yellow] No messages changed")
+        return
+    if not yes and not typer.confirm(f"Rewrite {len(changed)} commit message(s)?", default=True):
+        console.print("[yellow]ℹ[/yellow] Rewrite cancelled")
+        return
+    try:
+        head = apply_results(results)
+    except git.GitError as e:
+        console.print(f"[red]✗ Git error:[/red] {e}")
+        raise typer.Exit(1)
+    console.print(f"[green]✓[/green] Rewrote {len(results)} commit(s); HEAD is now {head[:7]}")
+
+
 @app.callback()
 def callback() -> None:
     pass
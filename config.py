@@ -12,13 +12,61 @@ class Config(BaseSettings):
     filter_extra_ignore: str = Field(default="", alias="FILTER_EXTRA_IGNORE")
     max_prompt_tokens: int = Field(default=8000, alias="MAX_PROMPT_TOKENS")
     edge_telemetry: bool = Field(default=True, alias="EDGE_TELEMETRY")  
+    cache_ttl: int = Field(default=7 * 24 * 60 * 60, alias="EDGE_CACHE_TTL")
+    cache_max_entries: int = Field(default=256, alias="EDGE_CACHE_MAX_ENTRIES")
+    entropy_min_length: int = Field(default=20, alias="EDGE_ENTROPY_MIN_LENGTH")
+    entropy_base64_threshold: float = Field(default=4.5, alias="EDGE_ENTROPY_BASE64_THRESHOLD")
+    entropy_hex_threshold: float = Field(default=3.0, alias="EDGE_ENTROPY_HEX_THRESHOLD")
+    daemon_idle_timeout: int = Field(default=30 * 60, alias="EDGE_DAEMON_IDLE_TIMEOUT")
+    commit_candidates: int = Field(default=1, ge=1, alias="EDGE_CANDIDATES")
+    candidate_timeout: float = Field(default=30.0, alias="EDGE_CANDIDATE_TIMEOUT")
     
     
     openai_api_key: Optional[str] = Field(default=None, alias="OPENAI_API_KEY")
     openai_model: str = Field(default="gpt-4-turbo-preview", alias="OPENAI_MODEL")
+    openai_base_url: Optional[str] = Field(default=None, alias="OPENAI_BASE_URL")
+    
+    llm_provider: str = Field(default="openai", alias="EDGE_PROVIDER")
+    local_base_url: str = Field(default="http://127.0.0.1:8080/v1", alias="EDGE_LOCAL_BASE_URL")
+    local_model: str = Field(default="local", alias="EDGE_LOCAL_MODEL")
+    local_api_key: Optional[str] = Field(default=None, alias="EDGE_LOCAL_API_KEY")
+    fallback_providers: str = Field(default="", alias="EDGE_FALLBACK_PROVIDERS")
+    hedge_delay: float = Field(default=10.0, alias="EDGE_HEDGE_DELAY")
+    heuristic_commits: bool = Field(default=True, alias="EDGE_HEURISTIC")
+    heuristic_min_confidence: float = Field(default=0.8, alias="EDGE_HEURISTIC_MIN_CONFIDENCE")
+    semantic_diff: bool = Field(default=True, alias="EDGE_SEMANTIC_DIFF")
+    detect_generated: bool = Field(default=True, alias="EDGE_DETECT_GENERATED")
+    blob_cache: bool = Field(default=True, alias="EDGE_BLOB_CACHE")
+    blob_cache_max_entries: int = Field(default=50_000, alias="EDGE_BLOB_CACHE_MAX_ENTRIES")
+    reword_concurrency: int = Field(default=4, ge=1, alias="EDGE_REWORD_CONCURRENCY")
+    reword_max_retries: int = Field(default=5, ge=0, alias="EDGE_REWORD_MAX_RETRIES")
     
     @property
     def extra_ignore_patterns(self) -> list[str]:
         if not self.filter_extra_ignore:
             return []
-        return [pattern.strip() for pattern in self.filter_extra_ignore.split(",") if pattern.strip()]
\ No newline at end of file
+        return [pattern.strip() for pattern in self.filter_extra_ignore.split(",") if pattern.strip()]
+    
+    @property
+    def provider_chain(self) -> list[str]:
+        """The primary provider followed by each distinct fallback, in configured order."""
+        chain = [self.llm_provider]
+        for name in self.fallback_providers.split(","):
+            name = name.strip()
+            if name and name not in chain:
+                chain.append(name)
+        return chain
+    
+    @property
+    def heuristic_threshold(self) -> Optional[float]:
+        """Confidence a rule-based message needs to skip the model; None when disabled."""
+        return self.heuristic_min_confidence if self.heuristic_commits else None
+    
+    @property
+    def cache_model(self) -> str:
+        """Names the provider and model behind a message, for keying cached responses."""
+        if self.llm_provider == "openai":
+            return self.openai_model
+        if self.llm_provider == "local":
+            return f"local:{self.local_base_url}:{self.local_model}"
+        return f"{self.llm_provider}:{self.openai_model}"
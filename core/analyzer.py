@@ -1,9 +1,34 @@
-from dataclasses import dataclass
-from typing import Literal
+import ast
+import copy
+import hashlib
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import PurePosixPath
+from typing import TYPE_CHECKING, Literal, Optional
 
+from core import git
 from core.git import NumStat
 
-ChangeType = Literal["feat", "fix", "refactor", "style", "docs", "test", "chore", "perf"]
+if TYPE_CHECKING:
+    from core.blobcache import BlobCache
+
+MAX_PROMPT_FILES = 10
+# Bump whenever the prompt text changes so cached responses are not reused
+PROMPT_VERSION = 2
+
+PYTHON_SUFFIXES = (".py", ".pyi")
+# Larger sources go to the model as hunks; parsing them costs more than it saves
+MAX_SEMANTIC_SOURCE_BYTES = 512 * 1024
+# Below this many Python files, starting worker processes costs more than it saves
+SEMANTIC_POOL_MIN_FILES = 8
+MAX_SEMANTIC_WORKERS = 8
+# Blob cache kind for module_symbols results; bump when what they fingerprint changes
+SYMBOL_TABLE_KIND = "symbols:2"
+
+ChangeType = Literal["feat", "fix", "refactor", "style", "docs", "test", "chore", "perf", "build"]
 
 
 @dataclass
@@ -15,6 +40,16 @@ class FileSummary:
     old_path: str | None = None
 
 
+@dataclass(frozen=True)
+class SymbolChange:
+    kind: Literal["function", "class", "module"]
+    # Qualified within the module, e.g. "Config.load"
+    name: str
+    change: Literal["added", "removed", "modified"]
+    # Tells apart definitions sharing a name: "setter", "overload #2", "#2" for a redefinition
+    role: str = ""
+
+
 @dataclass
 class DiffSummary:
     files: list[FileSummary]
@@ -22,11 +57,19 @@ class DiffSummary:
     total_removed: int
     change_type: ChangeType
     contents: str
+    # Secrets masked in the diff before it was packed, per file
+    redactions: dict[str, int] = field(default_factory=dict)
+    # Python files described by their changed symbols; their hunks are not in contents
+    symbols: dict[str, list[SymbolChange]] = field(default_factory=dict)
     
     @property
     def total_files(self) -> int:
         return len(self.files)
     
+    @property
+    def total_redactions(self) -> int:
+        return sum(self.redactions.values())
+    
     @property
     def significant_files(self) -> list[FileSummary]:
         return [f for f in self.files if (f.added + f.removed) > 5]
@@ -60,7 +103,356 @@ def _determine_change_type(files: list[FileSummary]) -> ChangeType:
             return "feat"
 
 
-def analyze_changes(numstats: list[NumStat], contents:str) -> DiffSummary:
+LOCKFILE_NAMES = frozenset({
+    "package-lock.json", "yarn.lock", "pnpm-lock.yaml", "npm-shrinkwrap.json",
+    "Pipfile.lock", "poetry.lock", "uv.lock", "Cargo.lock", "composer.lock",
+    "Gemfile.lock", "go.sum", "mix.lock", "pubspec.lock", "flake.lock",
+})
+MANIFEST_NAMES = frozenset({
+    "pyproject.toml", "setup.py", "setup.cfg", "package.json", "Cargo.toml",
+    "composer.json", "__init__.py", "__version__.py", "version.py", "_version.py",
+})
+DOC_NAMES = frozenset({"README", "CHANGELOG", "CHANGES", "LICENSE", "CONTRIBUTING", "AUTHORS", "NOTICE"})
+# Everything under a directory of this name is documentation
+DOC_DIRS = frozenset({"docs", "doc", "documentation"})
+# Directories that hold a project's code rather than name a part of it
+_CONTAINER_DIRS = frozenset({"src", "lib", "app", "pkg", "packages", "internal"})
+# Below this many changed lines a commit is small enough to describe from its paths
+SMALL_CHANGE_LINES = 10
+MAX_SUBJECT_LENGTH = 72
+
+# `"version": "1.2.3",`, `version = "1.2.3"`, `__version__ = '1.2.3'` and `name==1.2.3`
+_PINNED_VALUE = re.compile(
+    r"""\s*["']?(?P<key>[\w.@/\-]+)["']?\s*"""
+    r"""(?:[:=]\s*["'](?P<quoted>[^"']+)["'],?|(?P<op>==|>=|~=|<=)\s*(?P<bare>[^\s;#]+))\s*"""
+)
+_VERB = {"added": "add", "deleted": "remove", "modified": "update", "renamed": "rename"}
+
+
+@dataclass
+class HeuristicCommit:
+    message: str
+    # 0 to 1: how likely the message describes the change as well as the model would
+    confidence: float
+
+
+def _is_lockfile(path: str) -> bool:
+    return PurePosixPath(path).name in LOCKFILE_NAMES
+
+
+def _is_doc(path: str) -> bool:
+    # Not by extension: CMakeLists.txt, requirements.txt and robots.txt are not docs
+    pure = PurePosixPath(path)
+    return pure.stem.upper() in DOC_NAMES or any(part.lower() in DOC_DIRS for part in pure.parts[:-1])
+
+
+def _is_manifest(path: str) -> bool:
+    name = PurePosixPath(path).name
+    return name in MANIFEST_NAMES or (name.startswith("requirements") and name.endswith(".txt"))
+
+
+def _scope(paths: list[str], change_type: str) -> Optional[str]:
+    """The first directory every path shares, skipping src/, lib/ and one named like the type."""
+    common = os.path.commonprefix([PurePosixPath(path).parts[:-1] for path in paths])
+    parts = [part for part in common if part not in _CONTAINER_DIRS and part != change_type]
+    return parts[0].lower() if parts else None
+
+
+def _format(change_type: ChangeType, scope: Optional[str], subject: str) -> str:
+    prefix = f"{change_type}({scope}): " if scope else f"{change_type}: "
+    if len(prefix + subject) > MAX_SUBJECT_LENGTH:
+        prefix = f"{change_type}: "
+    return (prefix + subject)[:MAX_SUBJECT_LENGTH]
+
+
+def _describe_files(files: list[FileSummary], noun: str = "files") -> str:
+    if len(files) == 1:
+        file = files[0]
+        if file.change_type == "renamed" and file.old_path:
+            return f"rename {PurePosixPath(file.old_path).name} to {PurePosixPath(file.path).name}"
+        return f"{_VERB[file.change_type]} {PurePosixPath(file.path).name}"
+    kinds = {file.change_type for file in files}
+    verb = _VERB[kinds.pop()] if len(kinds) == 1 else "update"
+    return f"{verb} {len(files)} {noun}"
+
+
+def _changed_lines(contents: str) -> tuple[list[str], list[str]]:
+    removed, added = [], []
+    for line in contents.splitlines():
+        if line.startswith(("+++", "---")):
+            continue
+        if line.startswith("+"):
+            added.append(line[1:])
+        elif line.startswith("-"):
+            removed.append(line[1:])
+    return removed, added
+
+
+def _pinned_values(lines: list[str]) -> Optional[dict[str, str]]:
+    values = {}
+    for line in lines:
+        match = _PINNED_VALUE.fullmatch(line)
+        if match is None:
+            return None
+        values[match["key"]] = match["quoted"] or match["bare"]
+    return values
+
+
+def _version_bump(summary: DiffSummary) -> Optional[HeuristicCommit]:
+    # Every changed line pins a version, and each one removed is replaced
+    removed, added = _changed_lines(summary.contents)
+    if not added or len(removed) != len(added):
+        return None
+    old, new = _pinned_values(removed), _pinned_values(added)
+    if old is None or new is None or old.keys() != new.keys():
+        return None
+
+    own = [key for key in new if key.strip("_").lower() == "version"]
+    if own:
+        # The project's own version, possibly repeated in several files
+        versions = set(new.values())
+        if len(own) != len(new) or len(versions) != 1:
+            return None
+        return HeuristicCommit(_format("chore", "release", f"bump version to {versions.pop()}"), 0.95)
+
+    if len(new) == 1:
+        (name, version), = new.items()
+        return HeuristicCommit(_format("build", "deps", f"bump {name} from {old[name]} to {version}"), 0.9)
+    return HeuristicCommit(_format("build", "deps", f"bump {', '.join(sorted(new))}"), 0.85)
+
+
+def heuristic_commit(summary: DiffSummary, min_confidence: float = 0.0) -> Optional[HeuristicCommit]:
+    """Describe a trivial change without the model, or None if no rule applies.
+
+    Lockfile-only, rename-only, docs-only and version-bump changes are
+    recognised with high confidence.  Other changes under SMALL_CHANGE_LINES
+    lines get a message built from their paths with a lower score; callers
+    skip the model only when the score reaches min_confidence.
+    """
+    files = summary.files
+    if not files:
+        return None
+    paths = [file.path for file in files]
+
+    if all(map(_is_lockfile, paths)):
+        guess = HeuristicCommit(_format("chore", "deps", _describe_files(files, "lockfiles")), 0.95)
+    elif all(f.change_type == "renamed" and not (f.added or f.removed) for f in files):
+        guess = HeuristicCommit(_format("refactor", _scope(paths, "refactor"), _describe_files(files)), 0.9)
+    elif all(map(_is_manifest, paths)) and (bump := _version_bump(summary)) is not None:
+        guess = bump
+    elif all(map(_is_doc, paths)):
+        guess = HeuristicCommit(_format("docs", _scope(paths, "docs"), _describe_files(files, "docs")), 0.85)
+    elif summary.total_added + summary.total_removed < SMALL_CHANGE_LINES:
+        change_type = summary.change_type
+        if len(files) > 1:
+            confidence = 0.4
+        elif files[0].change_type in ("added", "deleted"):
+            confidence = 0.7
+        else:
+            # A small edit's purpose is not in its paths
+            confidence = 0.6
+        guess = HeuristicCommit(_format(change_type, _scope(paths, change_type), _describe_files(files)), confidence)
+    else:
+        return None
+
+    return guess if guess.confidence >= min_confidence else None
+
+
+def _fingerprint(node: ast.AST) -> str:
+    return hashlib.sha1(ast.dump(node).encode()).hexdigest()
+
+
+_ACCESSOR_ROLES = frozenset({"getter", "setter", "deleter"})
+
+
+def _decorator_role(node: ast.FunctionDef | ast.AsyncFunctionDef) -> str:
+    # A property's setter and an overload stub share the name of the definition they belong to
+    for decorator in node.decorator_list:
+        # `@overload` or `@typing.overload`; `@port.setter` and the like
+        name = decorator.id if isinstance(decorator, ast.Name) else getattr(decorator, "attr", None)
+        if name == "overload" or (name in _ACCESSOR_ROLES and isinstance(decorator, ast.Attribute)):
+            return name
+    return ""
+
+
+def _collect_symbols(body: list[ast.stmt], prefix: str, symbols: dict[str, list[str]]) -> list[ast.stmt]:
+    # Returns the statements that are not definitions; a class is fingerprinted
+    # without its methods, which are symbols of their own.  Each entry is keyed
+    # by name and role, and the nth definition with both gets "#n" added, so
+    # none of them replaces another.
+    rest = []
+    for node in body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            is_class = isinstance(node, ast.ClassDef)
+            name = prefix + node.name
+            first = f"{name} {'' if is_class else _decorator_role(node)}".rstrip()
+            key = first
+            occurrence = 1
+            while key in symbols:
+                occurrence += 1
+                key = f"{first} #{occurrence}"
+            role = key[len(name):].lstrip()
+            if is_class:
+                shell = copy.copy(node)
+                shell.body = _collect_symbols(node.body, key + ".", symbols)
+                symbols[key] = ["class", _fingerprint(shell), name, role]
+            else:
+                symbols[key] = ["function", _fingerprint(node), name, role]
+        else:
+            rest.append(node)
+    return rest
+
+
+def module_symbols(source: str) -> Optional[dict]:
+    """Fingerprints of a module's functions, methods and classes, and of the code around them.
+    
+    The result is plain JSON, so it can be stored per blob.  None when the
+    source does not parse.
+    """
+    symbols: dict[str, list[str]] = {}
+    try:
+        rest = _collect_symbols(ast.parse(source).body, "", symbols)
+    except (SyntaxError, ValueError, RecursionError):
+        return None
+    return {"symbols": symbols, "rest": _fingerprint(ast.Module(body=rest, type_ignores=[]))}
+
+
+def compare_symbols(old_table: dict, new_table: dict) -> Optional[list[SymbolChange]]:
+    """Changes between two module_symbols results; None if no definition changed."""
+    old, new = old_table["symbols"], new_table["symbols"]
+    changes = []
+    for key, (kind, digest, name, role) in new.items():
+        if key not in old:
+            changes.append(SymbolChange(kind, name, "added", role))
+        elif old[key][1] != digest:
+            changes.append(SymbolChange(kind, name, "modified", role))
+    changes.extend(
+        SymbolChange(kind, name, "removed", role) for key, (kind, _, name, role) in old.items() if key not in new
+    )
+    if not changes:
+        return None
+    if old_table["rest"] != new_table["rest"]:
+        changes.append(SymbolChange("module", "top-level code", "modified"))
+    return changes
+
+
+def symbol_changes(old_source: str, new_source: str) -> Optional[list[SymbolChange]]:
+    """Functions and classes added, removed or modified between two versions of a module.
+    
+    Definitions are compared by their syntax tree, so formatting and comment
+    changes do not count.  None when either version does not parse or when
+    nothing but top-level code outside definitions changed, which the hunks
+    describe better.
+    """
+    old, new = module_symbols(old_source), module_symbols(new_source)
+    if old is None or new is None:
+        return None
+    return compare_symbols(old, new)
+
+
+def _blob_symbols(oid: str, source: str) -> tuple[str, Optional[dict]]:
+    return oid, module_symbols(source)
+
+
+def _blob_ids(specs: list[str], cwd: Optional[str]) -> dict[str, tuple[str, int]]:
+    with git.GitObjectReader(cwd, contents=False) as check:
+        return {spec: (obj.oid, obj.size) for spec, obj in check.iter_objects(specs) if obj is not None}
+
+
+def _read_sources(specs: list[str], cwd: Optional[str]) -> dict[str, tuple[str, int, str]]:
+    # Every blob comes through one cat-file process
+    sources = {}
+    with git.GitObjectReader(cwd) as reader:
+        for spec, obj in reader.iter_objects(specs):
+            if obj is not None:
+                sources[spec] = (obj.oid, obj.size, str(obj.data, 'utf-8', 'replace'))
+    return sources
+
+
+def semantic_workers(file_count: int) -> int:
+    """Number of parser processes worth starting for this many files; 1 means in-process."""
+    if file_count < SEMANTIC_POOL_MIN_FILES:
+        return 1
+    return max(1, min(MAX_SEMANTIC_WORKERS, os.cpu_count() or 1, file_count))
+
+
+def _parse_blobs(sources: dict[str, str]) -> dict[str, Optional[dict]]:
+    workers = semantic_workers(len(sources))
+    if workers == 1:
+        return dict(_blob_symbols(oid, source) for oid, source in sources.items())
+    # spawn rather than fork: the caller may be running several threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers, mp_context=context) as pool:
+        return dict(pool.map(_blob_symbols, sources.keys(), sources.values(), chunksize=4))
+
+
+def summarize_python_changes(
+    numstats: list[NumStat],
+    cwd: Optional[str | os.PathLike] = None,
+    cache: Optional["BlobCache"] = None,
+    revision: Optional[str] = None,
+) -> dict[str, list[SymbolChange]]:
+    """Changed symbols of each staged Python file that has them, parsed in parallel.
+    
+    The staged blob (`:path`) is compared with the committed one
+    (`HEAD:path`, or the old path of a rename); given a revision, that
+    commit's blob is compared with its parent's instead.  A version that does
+    not exist counts as empty.  Files that do not parse or change only outside
+    definitions are left out, and keep their hunks.  With a cache, each blob's
+    symbol table is looked up by blob id and only new blobs are read and parsed.
+    """
+    old_prefix, new_prefix = (f"{revision}^:", f"{revision}:") if revision is not None else ("HEAD:", ":")
+    pairs = {
+        stat.file_path: (f"{old_prefix}{stat.old_path or stat.file_path}", f"{new_prefix}{stat.file_path}")
+        for stat in numstats
+        if stat.file_path.endswith(PYTHON_SUFFIXES) and not stat.is_binary
+    }
+    if not pairs:
+        return {}
+    cwd = os.fspath(cwd) if cwd is not None else None
+    specs = [spec for pair in pairs.values() for spec in pair]
+    
+    tables: dict[str, Optional[dict]] = {}
+    if cache is not None:
+        blobs = _blob_ids(specs, cwd)
+        oids = {spec: oid for spec, (oid, size) in blobs.items() if size <= MAX_SEMANTIC_SOURCE_BYTES}
+        tables = cache.get_many(SYMBOL_TABLE_KIND, oids.values())
+        unread = [spec for spec, oid in oids.items() if oid not in tables]
+        sources = _read_sources(unread, cwd) if unread else {}
+    else:
+        sources = _read_sources(specs, cwd)
+        blobs = {spec: (oid, size) for spec, (oid, size, _) in sources.items()}
+        oids = {spec: oid for spec, (oid, size) in blobs.items() if size <= MAX_SEMANTIC_SOURCE_BYTES}
+    
+    parsed = _parse_blobs({oid: source for spec, (oid, _, source) in sources.items() if spec in oids})
+    if cache is not None:
+        cache.put_many(SYMBOL_TABLE_KIND, parsed)
+    tables.update(parsed)
+    
+    empty = module_symbols("")
+    symbols = {}
+    for path, (old, new) in pairs.items():
+        if old not in blobs and new not in blobs:
+            continue
+        # Larger sources go to the model as hunks
+        if any(spec in blobs and spec not in oids for spec in (old, new)):
+            continue
+        old_table = tables.get(oids[old]) if old in oids else empty
+        new_table = tables.get(oids[new]) if new in oids else empty
+        if old_table is None or new_table is None:
+            continue
+        changes = compare_symbols(old_table, new_table)
+        if changes:
+            symbols[path] = changes
+    return symbols
+
+
+def analyze_changes(
+    numstats: list[NumStat],
+    contents: str,
+    redactions: Optional[dict[str, int]] = None,
+    symbols: Optional[dict[str, list[SymbolChange]]] = None,
+) -> DiffSummary:
     if not numstats:
         raise ValueError("No changes to analyze")
     
@@ -106,40 +498,86 @@ def analyze_changes(numstats: list[NumStat], contents:str) -> DiffSummary:
         total_removed=total_removed,
         contents=contents,
         change_type=change_type,
+        redactions=dict(redactions or {}),
+        symbols=dict(symbols or {}),
     )
 
 
-def build_prompt(summary: DiffSummary) -> str:
-    prompt = f"""Generate a conventional commit message for these changes:
+PROMPT_FOOTER = """
+Generate a conventional commit message:
+- Format: <type>(<scope>): <subject>
+- Body: explain what and why (2-3 lines max)
+Return only the commit message."""
+
+
+def prompt_header(change_type: str, total_files: int, total_added: int, total_removed: int) -> str:
+    return f"""Generate a conventional commit message for these changes:
+
+Type: {change_type}
+Files: {total_files} files changed
+Stats: +{total_added}/-{total_removed} lines
+"""
 
-Type: {summary.change_type}
-Files: {summary.total_files} files changed
-Stats: +{summary.total_added}/-{summary.total_removed} lines
-Diff Patch: {summary.contents}
+
+def prompt_body(contents: str) -> str:
+    return f"""Diff Patch: {contents}
 Files changed:
 """
+
+
+def _symbol_label(change: SymbolChange) -> str:
+    if change.kind == "function":
+        label = f"{change.name}()"
+    elif change.kind == "class":
+        label = f"class {change.name}"
+    else:
+        label = change.name
+    return f"{label} ({change.role})" if change.role else label
+
+
+def prompt_symbols(symbols: dict[str, list[SymbolChange]]) -> str:
+    if not symbols:
+        return ""
+    lines = ["Python symbols changed (in place of their diff):"]
+    for path, changes in symbols.items():
+        groups = []
+        for kind in ("added", "modified", "removed"):
+            labels = [_symbol_label(change) for change in changes if change.change == kind]
+            if labels:
+                groups.append(f"{kind} {', '.join(labels)}")
+        lines.append(f"- {path}: {'; '.join(groups)}")
+    return "\n".join(lines) + "\n"
+
+
+def prompt_file_line(file: FileSummary) -> str:
+    change_desc = ""
+    if file.change_type == "added":
+        change_desc = " (new)"
+    elif file.change_type == "deleted":
+        change_desc = " (deleted)"
+    elif file.change_type == "renamed":
+        change_desc = f" (renamed from {file.old_path})"
     
+    return f"- {file.path}: +{file.added}/-{file.removed}{change_desc}\n"
+
+
+def prompt_other_files_line(count: int) -> str:
+    return f"- ... and {count} other files with minor changes\n" if count else ""
+
+
+def build_prompt(summary: DiffSummary) -> str:
     significant = summary.significant_files
-    other_files = [f for f in summary.files if f not in significant]
-    
-    for file in significant[:10]:
-        change_desc = ""
-        if file.change_type == "added":
-            change_desc = " (new)"
-        elif file.change_type == "deleted":
-            change_desc = " (deleted)"
-        elif file.change_type == "renamed":
-            change_desc = f" (renamed from {file.old_path})"
-        
-        prompt += f"- {file.path}: +{file.added}/-{file.removed}{change_desc}\n"
     
-    if other_files:
-        prompt += f"- ... and {len(other_files)} other files with minor changes\n"
+    prompt = prompt_header(
+        summary.change_type, summary.total_files, summary.total_added, summary.total_removed
+    )
+    prompt += prompt_symbols(summary.symbols)
+    prompt += prompt_body(summary.contents)
     
-    prompt += """
-Generate a conventional commit message:
-- Format: <type>(<scope>): <subject>
-- Body: explain what and why (2-3 lines max)
-Return only the commit message."""
+    for file in significant[:MAX_PROMPT_FILES]:
+        prompt += prompt_file_line(file)
+    
+    prompt += prompt_other_files_line(len(summary.files) - len(significant))
+    prompt += PROMPT_FOOTER
     
     return prompt
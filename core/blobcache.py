@@ -0,0 +1,174 @@
+import json
+import sqlite3
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+DEFAULT_BLOB_CACHE_MAX_ENTRIES = 50_000
+CACHE_FILE_NAME = "blobs.sqlite"
+# Entries looked up or stored per statement, under SQLite's variable limit
+_CHUNK = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    used REAL NOT NULL,
+    PRIMARY KEY (kind, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_used ON entries (used);
+"""
+
+
+def repo_cache_path(cwd: Optional[str | Path] = None) -> Optional[Path]:
+    """Where a repository keeps its blob cache: .git/edgecommit/, shared by worktrees."""
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--path-format=absolute", "--git-common-dir"],
+            capture_output=True,
+            text=True,
+            cwd=cwd,
+        )
+    except OSError:
+        return None
+    if result.returncode != 0 or not result.stdout.strip():
+        return None
+    return Path(result.stdout.strip()) / "edgecommit" / CACHE_FILE_NAME
+
+
+def _chunks(items: list, size: int = _CHUNK) -> Iterable[list]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class BlobCache:
+    """Analysis results keyed by content id, in one SQLite file per repository.
+
+    Each entry is a JSON value under (kind, key): kind names what was computed
+    and how ("generated:1", "symbols:1", ...), key is a blob id or a content
+    hash, so an entry never goes stale.  Lookups mark entries used; once there
+    are more than max_entries the least recently used are dropped.  Every
+    operation is best effort: an unusable database behaves as an empty cache.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str | Path] = None,
+        max_entries: int = DEFAULT_BLOB_CACHE_MAX_ENTRIES,
+        cwd: Optional[str | Path] = None,
+    ):
+        self._path = Path(path) if path is not None else None
+        self.cwd = cwd
+        self.max_entries = max_entries
+        self._db: Optional[sqlite3.Connection] = None
+        self._opened = False
+        # Shared by the pipeline's threads and the daemon's request handlers
+        self._lock = threading.Lock()
+
+    @property
+    def path(self) -> Optional[Path]:
+        if self._path is None:
+            self._path = repo_cache_path(self.cwd)
+        return self._path
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        # Opened on first use, so runs that never consult the cache do not pay for it
+        if not self._opened:
+            self._opened = True
+            path = self.path
+            if path is None:
+                return None
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                db = sqlite3.connect(path, timeout=1.0, check_same_thread=False, isolation_level=None)
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("PRAGMA synchronous=NORMAL")
+                db.executescript(_SCHEMA)
+            except (OSError, sqlite3.Error):
+                return None
+            self._db = db
+        return self._db
+
+    def get_many(self, kind: str, keys: Iterable[str]) -> dict[str, Any]:
+        """The stored value of each key that has one."""
+        keys = list(dict.fromkeys(keys))
+        found: dict[str, Any] = {}
+        if not keys:
+            return found
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return found
+            try:
+                for chunk in _chunks(keys):
+                    marks = ",".join("?" * len(chunk))
+                    rows = db.execute(
+                        f"SELECT key, value FROM entries WHERE kind = ? AND key IN ({marks})", [kind, *chunk]
+                    ).fetchall()
+                    for key, value in rows:
+                        found[key] = json.loads(value)
+                    if rows:
+                        db.execute(
+                            f"UPDATE entries SET used = ? WHERE kind = ? AND key IN ({marks})",
+                            [time.time(), kind, *[key for key, _ in rows]],
+                        )
+            except (sqlite3.Error, ValueError):
+                return found
+        return found
+
+    def get(self, kind: str, key: str, default: Any = None) -> Any:
+        return self.get_many(kind, [key]).get(key, default)
+
+    def put_many(self, kind: str, items: dict[str, Any]) -> None:
+        if not items:
+            return
+        now = time.time()
+        rows = [(kind, key, json.dumps(value), now) for key, value in items.items()]
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            try:
+                with db:
+                    db.execute("BEGIN")
+                    db.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)", rows)
+                self._evict(db)
+            except sqlite3.Error:
+                pass
+
+    def put(self, kind: str, key: str, value: Any) -> None:
+        self.put_many(kind, {key: value})
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        (count,) = db.execute("SELECT count(*) FROM entries").fetchone()
+        if count > self.max_entries:
+            db.execute(
+                "DELETE FROM entries WHERE (kind, key) IN (SELECT kind, key FROM entries ORDER BY used LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+    def count(self) -> int:
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return 0
+            try:
+                return db.execute("SELECT count(*) FROM entries").fetchone()[0]
+            except sqlite3.Error:
+                return 0
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+            self._db = None
+            self._opened = False
+
+    def __enter__(self) -> "BlobCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
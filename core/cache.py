@@ -0,0 +1,104 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_CACHE_TTL = 7 * 24 * 60 * 60
+DEFAULT_CACHE_MAX_ENTRIES = 256
+
+
+def cache_dir() -> Path:
+    root = os.getenv("EDGE_RESPONSE_CACHE")
+    if root:
+        return Path(root)
+    return Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "edgecommit" / "responses"
+
+
+def cache_key(tree: str, model: str, prompt_version: int) -> str:
+    """Key a generated message by the staged tree, the model and the prompt template."""
+    return hashlib.sha256(f"{tree}\0{model}\0{prompt_version}".encode()).hexdigest()
+
+
+class ResponseCache:
+    """Content-addressed store of generated commit messages, one JSON file per key.
+
+    An entry's mtime is its last use: hits touch the file and eviction drops
+    the least recently used entries once there are more than max_entries.
+    Entries older than ttl seconds are treated as misses and removed.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str | Path] = None,
+        ttl: float = DEFAULT_CACHE_TTL,
+        max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+    ):
+        self.directory = Path(directory) if directory is not None else cache_dir()
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text())
+            message = entry["message"]
+            created = float(entry["created"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+        if time.time() - created > self.ttl:
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return message
+
+    def put(self, key: str, message: str) -> None:
+        path = self._path(key)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps({"message": message, "created": time.time()}))
+            os.replace(tmp_path, path)
+            self.evict()
+        except OSError:
+            # The cache only saves a round-trip; never fail a commit over it
+            pass
+
+    def evict(self) -> None:
+        entries = []
+        now = time.time()
+        for path in self.directory.glob("*.json"):
+            try:
+                mtime = path.stat().st_mtime
+            except OSError:
+                continue
+            # An entry unused for longer than the TTL must have been created before it
+            if now - mtime > self.ttl:
+                self._remove(path)
+            else:
+                entries.append((mtime, path))
+
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, path in entries[: len(entries) - self.max_entries]:
+                self._remove(path)
+
+    def clear(self) -> None:
+        for path in self.directory.glob("*.json"):
+            self._remove(path)
+
+    @staticmethod
+    def _remove(path: Path) -> None:
+        try:
+            path.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,134 @@
+import math
+import re
+from typing import Optional, Sequence
+
+DEFAULT_MIN_LENGTH = 20
+# Bits per character above which a value is treated as random, per charset
+DEFAULT_BASE64_THRESHOLD = 4.5
+DEFAULT_HEX_THRESHOLD = 3.0
+
+# Below this many values, NumPy's per-call overhead outweighs the batching
+NUMPY_MIN_BATCH = 256
+
+_HEX_DIGITS = "0123456789abcdefABCDEF"
+# Standard and URL-safe base64 alphabets together; hex is a subset
+_BASE64_VALUE = re.compile(r"[A-Za-z0-9+/=_\-]+")
+
+_numpy = None
+
+
+def _load_numpy():
+    """Return numpy if it is installed, else None; imported on first large batch."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+def _entropy_python(values: Sequence[str], alphabets: Optional[Sequence[set[str]]] = None) -> list[float]:
+    # H = log2(n) - sum(c * log2(c)) / n, with c * log2(c) looked up per count
+    longest = max(map(len, values), default=0)
+    c_log_c = [0.0] + [count * math.log2(count) for count in range(1, longest + 1)]
+    lookup = c_log_c.__getitem__
+    if alphabets is None:
+        alphabets = map(set, values)
+    entropies = []
+    for value, alphabet in zip(values, alphabets):
+        length = len(value)
+        if not length:
+            entropies.append(0.0)
+            continue
+        total = sum(map(lookup, map(value.count, alphabet)))
+        entropies.append(math.log2(length) - total / length)
+    return entropies
+
+
+def _entropy_numpy(np, values: Sequence[str]) -> list[float]:
+    # Every value's bytes in one buffer, with the index of the value each byte belongs to
+    data = np.frombuffer("".join(values).encode("latin-1", "replace"), dtype=np.uint8)
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=len(values))
+    owners = np.repeat(np.arange(len(values), dtype=np.int64), lengths)
+
+    # One histogram bin per (value, byte) pair that actually occurs
+    pairs, counts = np.unique(owners * 256 + data, return_counts=True)
+    pair_owners = pairs >> 8
+    p = counts / lengths[pair_owners]
+    return np.bincount(pair_owners, weights=-p * np.log2(p), minlength=len(values)).tolist()
+
+
+def shannon_entropy(values: Sequence[str], alphabets: Optional[Sequence[set[str]]] = None) -> list[float]:
+    """Shannon entropy in bits per character of each value, computed as one batch.
+
+    alphabets, when the caller already has them, are the distinct characters of each value.
+    """
+    if len(values) >= NUMPY_MIN_BATCH:
+        np = _load_numpy()
+        if np is not None:
+            return _entropy_numpy(np, values)
+    return _entropy_python(values, alphabets)
+
+
+class EntropyDetector:
+    """Flags values that look random for their character set.
+
+    Values made only of hex digits are compared against hex_threshold and
+    values made only of base64 characters against base64_threshold; anything
+    else is not a key.  A value with d distinct characters cannot exceed
+    log2(d) bits, so most identifiers are ruled out before any entropy is
+    computed.
+    """
+
+    def __init__(
+        self,
+        min_length: int = DEFAULT_MIN_LENGTH,
+        base64_threshold: float = DEFAULT_BASE64_THRESHOLD,
+        hex_threshold: float = DEFAULT_HEX_THRESHOLD,
+    ):
+        self.min_length = min_length
+        self.base64_threshold = base64_threshold
+        self.hex_threshold = hex_threshold
+
+    @classmethod
+    def from_config(cls, config) -> "EntropyDetector":
+        return cls(
+            min_length=config.entropy_min_length,
+            base64_threshold=config.entropy_base64_threshold,
+            hex_threshold=config.entropy_hex_threshold,
+        )
+
+    def classify(self, values: Sequence[str]) -> list[Optional[str]]:
+        """Return "hex" or "base64" for each value that looks random, else None."""
+        results: list[Optional[str]] = [None] * len(values)
+        # A value with d distinct characters has at most log2(d) bits per character
+        hex_distinct = 2 ** self.hex_threshold
+        base64_distinct = 2 ** self.base64_threshold
+        base64_value = _BASE64_VALUE.fullmatch
+        candidates = []
+        alphabets = []
+        for i, value in enumerate(values):
+            if len(value) < self.min_length:
+                continue
+            # Only values drawn entirely from a key alphabet are scored, which
+            # rules out prose, paths and URLs without counting anything
+            if not base64_value(value):
+                continue
+            if value.strip(_HEX_DIGITS):
+                kind, threshold, needed = "base64", self.base64_threshold, base64_distinct
+            else:
+                kind, threshold, needed = "hex", self.hex_threshold, hex_distinct
+            if len(value) > needed:
+                alphabet = set(value)
+                if len(alphabet) > needed:
+                    candidates.append((i, kind, threshold))
+                    alphabets.append(alphabet)
+
+        if candidates:
+            entropies = shannon_entropy([values[i] for i, _, _ in candidates], alphabets)
+            for (i, kind, threshold), entropy in zip(candidates, entropies):
+                if entropy > threshold:
+                    results[i] = kind
+        return results
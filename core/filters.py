@@ -1,87 +1,235 @@
-import fnmatch
-import re
+import hashlib
+import math
 from pathlib import Path
-import tiktoken
+from typing import TYPE_CHECKING, Iterable, Optional
+
 from config import Config
+from core import tokenizer
+from core.generated import GeneratedFileDetector, GeneratedKind
+from core.git import FileDiff, NumStat, parse_patch
+from core.ignore import IGNORE_FILE_NAME, IgnoreMatcher, read_ignore_file
+
+if TYPE_CHECKING:
+    from core.blobcache import BlobCache
+
+# pick a ceiling that leaves headroom for the prompt
+MAX_PATCH_TOKENS = 6000
+
+# Roughly a file header plus one short hunk; below this a file's share is useless
+MIN_FILE_TOKENS = 48
+
+ENCODING_NAME = "cl100k_base"
+# Blob cache kind for token counts of file diff texts, keyed by the text's hash
+TOKEN_COUNT_KIND = f"tokens:{ENCODING_NAME}"
+
+
+def _omitted_marker(count: int) -> str:
+    return f"# …{count} lines omitted by CommitPilot"
+
+
+def allocate_token_budget(needs: list[int], weights: list[float], budget: int) -> list[int]:
+    """Weighted max-min fair split of budget: nobody gets more than they need."""
+    allocations = [0] * len(needs)
+    remaining = budget
+    total_weight = sum(weights)
+    
+    # Visiting files by need per unit of weight means once one file can't be
+    # satisfied, none of the following ones can either.
+    order = sorted(range(len(needs)), key=lambda i: needs[i] / weights[i])
+    for position, i in enumerate(order):
+        share = remaining * weights[i] / total_weight if total_weight > 0 else 0
+        if needs[i] > share:
+            for j in order[position:]:
+                allocations[j] = int(remaining * weights[j] / total_weight)
+            break
+        allocations[i] = needs[i]
+        remaining -= needs[i]
+        total_weight -= weights[i]
+    
+    return allocations
 
 
 class DiffFilter:
     
-    def __init__(self, config: Config):
+    def __init__(
+        self,
+        config: Config,
+        ignore_file: str | Path = IGNORE_FILE_NAME,
+        cache: Optional["BlobCache"] = None,
+    ):
         self.config = config
+        self.ignore_file = Path(ignore_file)
+        self.cache = cache
+        self._matcher: Optional[IgnoreMatcher] = None
+        self._encoder: Optional[object] = None
+        # Kept with the filter so a long-lived one (the daemon's) never rescans a blob
+        self.generated = GeneratedFileDetector(cache=cache)
+    
+    @property
+    def matcher(self) -> IgnoreMatcher:
+        # Compiled once per run instead of re-reading the ignore file per path
+        if self._matcher is None:
+            try:
+                patterns = read_ignore_file(self.ignore_file)
+            except FileNotFoundError:
+                raise ValueError(".commitpilotignore file not found. ")
+            self._matcher = IgnoreMatcher(
+                [*patterns, *self.config.extra_ignore_patterns],
+                root=self.ignore_file.parent,
+            )
+        return self._matcher
     
     def should_skip_file(self, file_path: str) -> bool:
-        path = Path(file_path)
-        
-        # read the commitpilotignore file
-        try:
-            with open(".commitpilotignore", "r") as commitpilotignore:
-                lines = commitpilotignore.readlines()
-                for line in lines:
-                    line = line.strip()
-                    if line and not line.startswith("#"):
-                        # Check if the pattern matches the file path
-                        if fnmatch.fnmatch(str(path), line):
-                            return True
-        except FileNotFoundError:
-            raise ValueError(".commitpilotignore file not found. ")
-            pass
-
-        return False
+        return self.matcher.matches(file_path)
     
-    def parse_diff_patch_file(self, patch_file: str) -> str:
-        enc = tiktoken.get_encoding("cl100k_base")
-        tokens = enc.encode(patch_file)
-        MAX = 6000           # pick a ceiling that leaves headroom for the prompt
-
-        if len(tokens) > MAX:
-            truncated_diff = enc.decode(tokens[:MAX])
-            truncated_diff += "\n# …truncated by CommitPilot ({} tokens)\n".format(len(tokens) - MAX)
-            return truncated_diff
-
-        return patch_file
+    def find_generated_files(
+        self, numstats: list[NumStat], cwd: Optional[Path] = None, revision: Optional[str] = None
+    ) -> dict[str, GeneratedKind]:
+        """Staged files (or a commit's) the ignore rules let through whose content looks generated or minified."""
+        if not self.config.detect_generated:
+            return {}
+        return self.generated.classify(numstats, cwd, revision)
     
-    def filter_diff(self, raw_diff: str) -> str:
-        if not raw_diff:
-            return raw_diff
-        
-        lines = raw_diff.split('\n')
-        filtered_lines = []
-        current_file = None
-        skip_current_file = False
+    @property
+    def encoder(self):
+        if self._encoder is None:
+            self._encoder = tokenizer.get_encoding(ENCODING_NAME)
+        return self._encoder
+    
+    def _count_text_tokens(self, texts: list[str]) -> list[int]:
+        # File diff texts repeat across runs (amend, rebase), so their counts are cached by hash
+        if self.cache is None:
+            return [len(self.encoder.encode(text)) for text in texts]
+        keys = [hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest() for text in texts]
+        counts = self.cache.get_many(TOKEN_COUNT_KIND, keys)
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in counts and key not in missing:
+                missing[key] = len(self.encoder.encode(text))
+        self.cache.put_many(TOKEN_COUNT_KIND, missing)
+        counts.update(missing)
+        return [counts[key] for key in keys]
+    
+    def _count_line_tokens(self, lines: list[str]) -> list[int]:
+        enc = self.encoder
+        # Not encode_ordinary_batch: it starts a thread pool per call, which
+        # costs more than encoding one hunk's lines
+        encode = getattr(enc, "encode_ordinary", enc.encode)
+        return [len(encode(line + '\n')) for line in lines]
+    
+    def _render_within_budget(self, file_diff: FileDiff, budget: int) -> str:
+        # Keep the "diff --git" line plus mode/rename info, every hunk header we can
+        # afford, and the first changed lines of each hunk in an even split.
+        header = [
+            line for line in file_diff.header
+            if not line.startswith(('index ', '--- ', '+++ '))
+        ] or [f"diff --git a/{file_diff.path} b/{file_diff.path}"]
+        header_costs = self._count_line_tokens(header)
+        total_lines = file_diff.omitted_lines + sum(hunk.line_count + 1 for hunk in file_diff.hunks)
+        marker_cost = self._count_line_tokens([_omitted_marker(total_lines)])[0]
+        out = header[:1]
+        remaining = budget - marker_cost - header_costs[0]
+        if remaining <= 0:
+            return out[0]
+        for line, cost in zip(header[1:], header_costs[1:]):
+            if cost <= remaining:
+                out.append(line)
+                remaining -= cost
         
-        for line in lines:
-            if line.startswith('diff --git'):
-                
-                match = re.match(r'diff --git a/(.*) b/(.*)', line)
-                if match:
-                    current_file = match.group(2)  
-                    skip_current_file = self.should_skip_file(current_file)
-                else:
-                    skip_current_file = False
+        omitted = file_diff.omitted_lines
+        hunks = file_diff.hunks
+        for index, hunk in enumerate(hunks):
+            lines = hunk.lines
+            costs = self._count_line_tokens([hunk.header, *lines])
+            if costs[0] > remaining:
+                omitted += sum(h.line_count + 1 for h in hunks[index:])
+                break
+            out.append(hunk.header)
+            remaining -= costs[0]
             
-            if not skip_current_file:
-                filtered_lines.append(line)
+            share = remaining // (len(hunks) - index)
+            kept = 0
+            for line, cost in zip(lines, costs[1:]):
+                if cost > share:
+                    break
+                out.append(line)
+                share -= cost
+                remaining -= cost
+                kept += 1
+            omitted += len(lines) - kept
         
-        return '\n'.join(filtered_lines)
+        if omitted:
+            out.append(_omitted_marker(omitted))
+        return '\n'.join(out)
     
-    def clamp_large_file_diff(self, diff_content: str, max_lines: int = 200) -> str:
-        lines = diff_content.split('\n')
-        result = []
-        file_line_count = 0
-        in_file_diff = False
+    def pack_file_diffs(
+        self,
+        file_diffs: Iterable[FileDiff],
+        numstats: Optional[list[NumStat]] = None,
+        max_tokens: int = MAX_PATCH_TOKENS,
+    ) -> str:
+        """Share the token budget across files instead of keeping the head of the patch.
         
-        for line in lines:
-            if line.startswith('diff --git'):
-                file_line_count = 0
-                in_file_diff = True
-            
-            if in_file_diff and file_line_count >= max_lines:
-                if not line.startswith('diff --git'):
+        Each file is weighted logarithmically by its churn, files that need
+        less than their share give the rest back to the others, and files that
+        don't fit keep their hunk headers and first changed lines.
+        """
+        churn = {}
+        if numstats:
+            churn = {stat.file_path: stat.added + stat.removed for stat in numstats}
+        
+        # Past this many files nobody gets a useful share, so only the largest
+        # are packed and the rest of the stream is never read.
+        selected = None
+        if churn:
+            max_files = max(1, max_tokens // MIN_FILE_TOKENS)
+            selected = set(sorted(churn, key=churn.__getitem__, reverse=True)[:max_files])
+        
+        entries = []
+        for file_diff in file_diffs:
+            if self.should_skip_file(file_diff.path):
+                continue
+            if selected is not None:
+                if file_diff.path not in selected:
                     continue
+                selected.discard(file_diff.path)
+            
+            text = file_diff.text
+            # Counted as each file arrives, overlapping with git and redaction upstream
+            need = self._count_text_tokens([text + '\n'])[0]
+            if file_diff.omitted_lines:
+                need += self._count_line_tokens([_omitted_marker(file_diff.omitted_lines)])[0]
+            file_churn = churn.get(file_diff.path)
+            if file_churn is None:
+                file_churn = file_diff.line_count
+            entries.append((file_diff, text, need, 1 + math.log1p(file_churn)))
             
-            result.append(line)
-            if in_file_diff:
-                file_line_count += 1
+            if selected is not None and not selected:
+                break
         
-        return '\n'.join(result)
\ No newline at end of file
+        allocations = allocate_token_budget(
+            [need for _, _, need, _ in entries],
+            [weight for _, _, _, weight in entries],
+            max_tokens,
+        )
+        
+        chunks = []
+        for (file_diff, text, need, _), allocation in zip(entries, allocations):
+            if need <= allocation and not file_diff.omitted_lines:
+                chunks.append(text)
+            else:
+                chunks.append(self._render_within_budget(file_diff, allocation))
+        
+        return ''.join(chunk + '\n' for chunk in chunks)
+    
+    def filter_diff(self, raw_diff: str) -> str:
+        if not raw_diff:
+            return raw_diff
+        
+        file_diffs = parse_patch(raw_diff, skip=self.should_skip_file)
+        return '\n'.join(file_diff.text for file_diff in file_diffs)
+    
+    def clamp_large_file_diff(self, diff_content: str, max_lines: int = 200) -> str:
+        # The "diff --git" line counts towards max_lines, as it always has
+        file_diffs = parse_patch(diff_content, max_file_lines=max_lines)
+        return '\n'.join(file_diff.text for file_diff in file_diffs)
\ No newline at end of file
@@ -0,0 +1,177 @@
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Literal, Optional
+
+from core.git import GitObjectReader, NumStat
+
+if TYPE_CHECKING:
+    from core.blobcache import BlobCache
+
+GeneratedKind = Literal["generated", "minified"]
+
+# Only the head of each staged blob is read and scored
+SAMPLE_BYTES = 8 * 1024
+# Generators put their notice in the first few lines, always in a comment
+MARKER_LINES = 10
+# Mean characters per line above which a file is not meant to be read
+MINIFIED_MEAN_LINE = 250
+# A line this long counts as minified when it is also mostly punctuation
+LONG_LINE = 1000
+# Share of non-blank characters that are not identifier characters
+DENSE_SYMBOL_RATIO = 0.3
+# Blob verdicts remembered; a blob id names its content, so entries never go stale
+MAX_VERDICTS = 4096
+# Blob cache kind for verdicts; bump when the rules or thresholds change
+VERDICT_KIND = "generated:2"
+
+
+def _comment_start(*openers: bytes) -> re.Pattern[bytes]:
+    return re.compile(rb"\s*(?:" + b"|".join(map(re.escape, openers)) + rb")")
+
+
+# A generator notice only counts in a comment, in the syntax of the file's language
+_COMMENT_SYNTAX = (
+    ((b"#",), ".py .pyi .pyx .rb .sh .bash .zsh .pl .r .yml .yaml .toml .cfg .conf .tf .nix .cmake .ex .exs .jl"),
+    ((b"//", b"/*", b"*"), ".c .h .cc .cpp .cxx .hpp .cs .java .kt .kts .go .rs .swift .scala .dart .groovy"),
+    ((b"//", b"/*", b"*"), ".gradle .proto .js .jsx .mjs .cjs .ts .tsx .snap .css .scss .less .m .mm"),
+    ((b"#", b"//", b"/*", b"*"), ".php"),
+    ((b"--",), ".sql .lua .hs .elm"),
+    ((b";",), ".ini .el .lisp .clj .asm"),
+    ((b"%",), ".tex .erl"),
+    ((b"<!--",), ".html .htm .xml .svg .vue .xaml .md .markdown"),
+    # Plain text has no comments, so no line of it is a generator notice
+    ((), ".txt .rst .adoc .json"),
+)
+_COMMENT_STARTS = {
+    suffix: _comment_start(*openers) if openers else re.compile(rb"(?!)")
+    for openers, suffixes in _COMMENT_SYNTAX
+    for suffix in suffixes.split()
+}
+# Files in no language above: only openers that no line of prose starts with
+_DEFAULT_COMMENT_START = _comment_start(b"#", b"//", b"/*")
+_MARKER = re.compile(
+    rb"@generated|do not edit|auto-?generated|automatically generated|"
+    rb"generated by the protocol buffer compiler|jest snapshot",
+    re.IGNORECASE,
+)
+_BLANK = re.compile(rb"\s")
+_SYMBOL = re.compile(rb"[^\w\s]")
+
+
+def _suffix(path: str) -> str:
+    return PurePosixPath(path).suffix.lower()
+
+
+def classify_sample(sample: bytes | memoryview, path: str, complete: bool = True) -> Optional[GeneratedKind]:
+    """Whether the head of a file looks generated or minified; None for ordinary source.
+
+    path names the file, whose extension decides what a comment looks like.
+    complete says whether sample is the whole file; if not, its last line is
+    cut short and is not measured.
+    """
+    data = bytes(sample)
+    lines = data.split(b"\n")
+    comment_start = _COMMENT_STARTS.get(_suffix(path), _DEFAULT_COMMENT_START)
+    for line in lines[:MARKER_LINES]:
+        if comment_start.match(line) and _MARKER.search(line):
+            return "generated"
+
+    if not complete and len(lines) > 1:
+        lines.pop()
+    lines = [line for line in lines if line.strip()]
+    if not lines:
+        return None
+
+    # Long lines alone are also unwrapped prose; minified code is mostly punctuation
+    total = sum(map(len, lines))
+    if total / len(lines) < MINIFIED_MEAN_LINE and max(map(len, lines)) < LONG_LINE:
+        return None
+    visible = len(data) - len(_BLANK.findall(data))
+    if visible and len(_SYMBOL.findall(data)) / visible >= DENSE_SYMBOL_RATIO:
+        return "minified"
+    return None
+
+
+class GeneratedFileDetector:
+    """Classifies staged files by sampling their content, remembering each blob's verdict.
+
+    Blob ids come from one `git cat-file --batch-check` process; only blobs
+    without a remembered verdict are sampled, through one `--batch` process
+    that keeps the first SAMPLE_BYTES of each.  Verdicts are remembered in
+    memory and, with a cache, on disk for later runs.
+    """
+
+    def __init__(
+        self,
+        sample_bytes: int = SAMPLE_BYTES,
+        max_entries: int = MAX_VERDICTS,
+        cache: Optional["BlobCache"] = None,
+    ):
+        self.sample_bytes = sample_bytes
+        self.max_entries = max_entries
+        self.cache = cache
+        self._verdicts: OrderedDict[str, Optional[GeneratedKind]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: str) -> tuple[bool, Optional[GeneratedKind]]:
+        with self._lock:
+            if key not in self._verdicts:
+                return False, None
+            self._verdicts.move_to_end(key)
+            return True, self._verdicts[key]
+
+    def _remember(self, key: str, verdict: Optional[GeneratedKind]) -> None:
+        with self._lock:
+            self._verdicts[key] = verdict
+            self._verdicts.move_to_end(key)
+            while len(self._verdicts) > self.max_entries:
+                self._verdicts.popitem(last=False)
+
+    def classify(
+        self, numstats: list[NumStat], cwd: Optional[Path] = None, revision: Optional[str] = None
+    ) -> dict[str, GeneratedKind]:
+        """Map each staged file, or each file as of revision, that looks generated or minified to which it is."""
+        prefix = f"{revision}:" if revision is not None else ":"
+        specs = {f"{prefix}{stat.file_path}": stat.file_path for stat in numstats if not stat.is_binary}
+        if not specs:
+            return {}
+
+        # Deleted files have no blob and are left alone.  What counts as a
+        # comment depends on the extension, so a verdict is for a blob under one.
+        with GitObjectReader(cwd, contents=False) as check:
+            keys = {
+                spec: obj.oid + _suffix(specs[spec]) for spec, obj in check.iter_objects(specs) if obj is not None
+            }
+
+        verdicts = {}
+        unknown = []
+        for spec, key in keys.items():
+            known, verdict = self._lookup(key)
+            if known:
+                verdicts[spec] = verdict
+            else:
+                unknown.append(spec)
+
+        if unknown and self.cache is not None:
+            stored = self.cache.get_many(VERDICT_KIND, (keys[spec] for spec in unknown))
+            for spec in unknown:
+                if keys[spec] in stored:
+                    verdicts[spec] = stored[keys[spec]]
+                    self._remember(keys[spec], verdicts[spec])
+            unknown = [spec for spec in unknown if spec not in verdicts]
+
+        if unknown:
+            sampled = {}
+            with GitObjectReader(cwd, buffer_size=self.sample_bytes) as reader:
+                for spec, obj in reader.iter_objects(unknown, limit=self.sample_bytes):
+                    if obj is None:
+                        continue
+                    verdict = classify_sample(obj.data, specs[spec], complete=obj.size <= self.sample_bytes)
+                    self._remember(keys[spec], verdict)
+                    verdicts[spec] = sampled[keys[spec]] = verdict
+            if self.cache is not None:
+                self.cache.put_many(VERDICT_KIND, sampled)
+
+        return {specs[spec]: verdict for spec, verdict in verdicts.items() if verdict is not None}
@@ -1,7 +1,11 @@
+import io
+import os
+import re
 import subprocess
+import threading
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Iterable, Iterator, Optional
 
 
 class GitError(Exception):
@@ -18,6 +22,112 @@ class NumStat:
     old_path: Optional[str] = None
 
 
+class Hunk:
+    """A hunk header and its body, a span of a buffer shared by the file's hunks.
+
+    The body is kept as the UTF-8 bytes git wrote, one newline-terminated
+    line after another, and decoded only when text or lines are asked for.
+    """
+
+    __slots__ = ("header", "buffer", "start", "end")
+
+    def __init__(
+        self,
+        header: str,
+        lines: Optional[list[str]] = None,
+        *,
+        buffer: bytes = b"",
+        start: int = 0,
+        end: Optional[int] = None,
+    ):
+        self.header = header
+        if lines is not None:
+            buffer = "".join(line + "\n" for line in lines).encode("utf-8", "surrogateescape")
+            start, end = 0, None
+        self.buffer = buffer
+        self.start = start
+        self.end = len(buffer) if end is None else end
+
+    @classmethod
+    def from_text(cls, header: str, text: str) -> "Hunk":
+        """A hunk with its own buffer holding text, the body lines joined by newlines."""
+        return cls(header, buffer=(text + "\n").encode("utf-8", "surrogateescape"))
+
+    @property
+    def view(self) -> memoryview:
+        return memoryview(self.buffer)[self.start:self.end]
+
+    @property
+    def line_count(self) -> int:
+        return self.buffer.count(b"\n", self.start, self.end)
+
+    @property
+    def text(self) -> str:
+        """The body lines joined by newlines, without a trailing one."""
+        if self.end <= self.start:
+            return ""
+        return str(memoryview(self.buffer)[self.start:self.end - 1], "utf-8", "replace")
+
+    @property
+    def lines(self) -> list[str]:
+        return self.text.split("\n") if self.end > self.start else []
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Hunk):
+            return NotImplemented
+        return self.header == other.header and self.view == other.view
+
+    def __repr__(self) -> str:
+        return f"Hunk(header={self.header!r}, lines={self.line_count})"
+
+
+class FileDiff:
+    """One file's part of a patch: header lines, hunks and how many lines were dropped."""
+
+    __slots__ = ("path", "header", "hunks", "omitted_lines")
+
+    def __init__(
+        self,
+        path: str,
+        header: Optional[list[str]] = None,
+        hunks: Optional[list[Hunk]] = None,
+        omitted_lines: int = 0,
+    ):
+        self.path = path
+        self.header = header if header is not None else []
+        self.hunks = hunks if hunks is not None else []
+        self.omitted_lines = omitted_lines
+
+    @property
+    def line_count(self) -> int:
+        return sum(hunk.line_count for hunk in self.hunks)
+
+    @property
+    def text(self) -> str:
+        parts = list(self.header)
+        for hunk in self.hunks:
+            parts.append(hunk.header)
+            if hunk.end > hunk.start:
+                parts.append(hunk.text)
+        return '\n'.join(parts)
+
+    def with_hunks(self, hunks: list[Hunk]) -> "FileDiff":
+        return FileDiff(self.path, self.header, hunks, self.omitted_lines)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FileDiff):
+            return NotImplemented
+        return (self.path, self.header, self.hunks, self.omitted_lines) == (
+            other.path, other.header, other.hunks, other.omitted_lines
+        )
+
+    def __repr__(self) -> str:
+        return f"FileDiff(path={self.path!r}, hunks={self.hunks!r}, omitted_lines={self.omitted_lines})"
+
+
+DIFF_WITH_STATS_ARGS = ["diff", "--cached", "--numstat", "--patch", "-z", "--unified=0", "--no-color"]
+
+
 def _run_git_command(args: list[str], cwd: Optional[Path] = None) -> str:
     try:
         result = subprocess.run(
@@ -47,13 +157,22 @@ def get_staged_diff(cwd: Optional[Path] = None) -> str:
     return diff
 
 def get_diff_patch(cwd: Optional[Path] = None) -> str:
-    print("Running diff patch")
     diff = _run_git_command(["diff", "--cached", "--unified=0", "--no-color"], cwd)
     if not diff:
         raise GitError("No staged changes found")
     return diff
 
 
+def write_tree(cwd: Optional[Path] = None) -> str:
+    """Return the hash of the tree the index would commit; it names the staged content."""
+    return _run_git_command(["write-tree"], cwd)
+
+
+def resolve_commit(revision: str, cwd: Optional[Path] = None) -> str:
+    """The full id of the commit revision names."""
+    return _run_git_command(["rev-parse", "--verify", "--end-of-options", f"{revision}^{{commit}}"], cwd)
+
+
 def get_staged_numstat(cwd: Optional[Path] = None) -> list[NumStat]:
     try:
         output = _run_git_command(["diff", "--cached", "--numstat"], cwd)
@@ -115,11 +234,652 @@ def get_staged_numstat(cwd: Optional[Path] = None) -> list[NumStat]:
         return []
 
 
-def create_commit(message: str, cwd: Optional[Path] = None) -> None:
+def _parse_numstat_records(records: list[str]) -> list[NumStat]:
+    stats = []
+    i = 0
+    while i < len(records):
+        record = records[i]
+        i += 1
+        if not record:
+            continue
+        
+        parts = record.split('\t', 2)
+        if len(parts) < 3:
+            continue
+        
+        added_str, removed_str, file_path = parts
+        old_path = None
+        if not file_path:
+            # With -z a rename is "added\tremoved\t" followed by old and new path records
+            if i + 1 >= len(records):
+                break
+            old_path, file_path = records[i], records[i + 1]
+            i += 2
+        
+        if added_str == '-' and removed_str == '-':
+            stats.append(NumStat(
+                added=0,
+                removed=0,
+                file_path=file_path,
+                is_binary=True,
+                is_renamed=old_path is not None,
+                old_path=old_path
+            ))
+            continue
+        
+        try:
+            added = int(added_str)
+            removed = int(removed_str)
+        except ValueError:
+            added = removed = 0
+        
+        stats.append(NumStat(
+            added=added,
+            removed=removed,
+            file_path=file_path,
+            is_binary=False,
+            is_renamed=old_path is not None,
+            old_path=old_path
+        ))
+    
+    return stats
+
+
+class _FileDiffBuilder:
+    # Hunk bodies are appended to one buffer; each hunk records where its span starts
+    __slots__ = ("file_diff", "body", "hunks", "in_header", "continued")
+
+    def __init__(self, path: str, header_line: str):
+        self.file_diff = FileDiff(path=path, header=[header_line])
+        self.body = bytearray()
+        self.hunks: list[tuple[str, int]] = []
+        self.in_header = True
+        self.continued = False
+
+    def continue_section(self) -> None:
+        # A second section for the same path, as git writes for a type change
+        self.in_header = True
+        self.continued = True
+
+    def finish(self) -> FileDiff:
+        buffer = bytes(self.body)
+        ends = [start for _, start in self.hunks[1:]] + [len(buffer)]
+        self.file_diff.hunks = [
+            Hunk(header, buffer=buffer, start=start, end=end)
+            for (header, start), end in zip(self.hunks, ends)
+        ]
+        return self.file_diff
+
+
+def _decode(line: bytes) -> str:
+    return line.rstrip(b'\n').decode('utf-8', 'replace')
+
+
+_C_ESCAPES = {0x07: b'a', 0x08: b'b', 0x09: b't', 0x0a: b'n', 0x0b: b'v', 0x0c: b'f', 0x0d: b'r', 0x22: b'"', 0x5c: b'\\'}
+
+
+def _quote_path(path: str, quote_high_bytes: bool = True) -> str:
+    """A path as git writes it in a patch header: C-quoted if it has to be (see core.quotePath)."""
+    data = path.encode('utf-8', 'surrogateescape')
+
+    def needs_escape(byte: int) -> bool:
+        return byte < 0x20 or byte in (0x22, 0x5c, 0x7f) or (quote_high_bytes and byte >= 0x80)
+
+    if not any(needs_escape(byte) for byte in data):
+        return path
+    out = bytearray(b'"')
+    for byte in data:
+        if byte in _C_ESCAPES:
+            out += b'\\' + _C_ESCAPES[byte]
+        elif needs_escape(byte):
+            out += b'\\%03o' % byte
+        else:
+            out.append(byte)
+    out += b'"'
+    return out.decode('utf-8', 'replace')
+
+
+def _section_paths(numstats: list[NumStat]) -> dict[str, str]:
+    """Map each "diff --git" line git may write for these numstat records to its path."""
+    headers = {}
+    for stat in numstats:
+        old = stat.old_path or stat.file_path
+        for quote_high_bytes in (True, False):
+            a = _quote_path('a/' + old, quote_high_bytes)
+            b = _quote_path('b/' + stat.file_path, quote_high_bytes)
+            headers[f"diff --git {a} {b}"] = stat.file_path
+    return headers
+
+
+def _iter_file_diffs(
+    lines: Iterable[bytes],
+    numstats: Optional[list[NumStat]] = None,
+    skip: Optional[Callable[[str], bool]] = None,
+    max_file_lines: Optional[int] = None,
+) -> Iterator[FileDiff]:
+    """Parse patch lines, as git writes them, into file diffs.
+
+    Each section's path is looked up by its "diff --git" line among the
+    numstat records, which give it unquoted; a section whose line is not
+    found has its path read from the line.  git writes two sections for a
+    type change (say a file replaced by a symlink), which are merged into
+    one file diff.  Only header lines are decoded here; hunk bodies are
+    copied into the file's buffer as they are.
+
+    Once the last file not skipped has max_file_lines lines, nothing after
+    them can be used, so parsing stops there instead of reading the rest of
+    the patch; the lines left unread are counted from its numstat record.
+    """
+    headers = _section_paths(numstats) if numstats else {}
+    last_wanted = None
+    if numstats and max_file_lines is not None:
+        last_wanted = next(
+            (stat for stat in reversed(numstats) if skip is None or not skip(stat.file_path)), None
+        )
+    current: Optional[_FileDiffBuilder] = None
+    path: Optional[str] = None
+    skipping = False
+    kept_lines = 0
+    
+    for line in lines:
+        if line.startswith(b'diff --git '):
+            header_line = _decode(line)
+            section_path = headers.get(header_line)
+            if section_path is None:
+                match = re.match(r'diff --git a/(.*) b/(.*)', header_line)
+                section_path = match.group(2) if match else header_line[11:]
+            
+            if section_path == path:
+                if current is not None:
+                    current.continue_section()
+                continue
+            
+            if current is not None:
+                yield current.finish()
+            path = section_path
+            current = None
+            skipping = skip is not None and skip(path)
+            if not skipping:
+                current = _FileDiffBuilder(path, header_line)
+                kept_lines = 1
+            continue
+        
+        if current is None or skipping:
+            continue
+        
+        if max_file_lines is not None and kept_lines >= max_file_lines:
+            if last_wanted is not None and path == last_wanted.file_path:
+                # Changed lines not yet read; hunk headers still to come are not counted
+                changed = last_wanted.added + last_wanted.removed
+                current.file_diff.omitted_lines = max(0, changed - current.body.count(b'\n'))
+                break
+            current.file_diff.omitted_lines += 1
+            continue
+        kept_lines += 1
+        
+        if line.startswith(b'@@'):
+            current.in_header = False
+            current.hunks.append((_decode(line), len(current.body)))
+        elif not current.in_header:
+            current.body += line
+            if not line.endswith(b'\n'):
+                current.body += b'\n'
+        elif not current.continued or not line.startswith((b'index ', b'--- ', b'+++ ')):
+            # A continued section adds its mode line; its blob ids and file names repeat the first's
+            current.file_diff.header.append(_decode(line))
+    
+    if current is not None:
+        yield current.finish()
+
+
+def _iter_patch_lines(patch: str | bytes) -> Iterator[bytes]:
+    if isinstance(patch, str):
+        patch = patch.encode('utf-8', 'surrogateescape')
+    # Line by line, as from git's pipe, rather than splitting the whole patch up front
+    return iter(io.BytesIO(patch))
+
+
+def parse_patch(
+    patch: str | bytes,
+    numstats: Optional[list[NumStat]] = None,
+    skip: Optional[Callable[[str], bool]] = None,
+    max_file_lines: Optional[int] = None,
+) -> list[FileDiff]:
+    return list(_iter_file_diffs(_iter_patch_lines(patch), numstats, skip, max_file_lines))
+
+
+class StagedDiffStream:
+    """Streams the staged numstat and patch without holding the whole output.
+    
+    The numstat block is read up front; file diffs are then parsed as git
+    writes them, ignored paths are dropped as soon as their header arrives,
+    and closing the stream terminates git if it is still producing output.
+    """
+    
+    def __init__(
+        self,
+        cwd: Optional[Path] = None,
+        skip: Optional[Callable[[str], bool]] = None,
+        max_file_lines: Optional[int] = None,
+        chunk_size: int = 64 * 1024,
+    ):
+        self.skip = skip
+        self.max_file_lines = max_file_lines
+        self.chunk_size = chunk_size
+        try:
+            self._process = subprocess.Popen(
+                ["git", *DIFF_WITH_STATS_ARGS],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=cwd,
+            )
+        except OSError as e:
+            raise GitError(f"Git command failed: {e}") from e
+        
+        self._leftover = b""
+        self.numstats = self._read_numstats()
+    
+    def _read_numstats(self) -> list[NumStat]:
+        stdout = self._process.stdout
+        buffer = bytearray()
+        search_from = 0
+        
+        while True:
+            index = buffer.find(b'\0\0', search_from)
+            if index != -1:
+                self._leftover = bytes(buffer[index + 2:])
+                del buffer[index:]
+                break
+            
+            search_from = max(len(buffer) - 1, 0)
+            chunk = stdout.read1(self.chunk_size)
+            if not chunk:
+                break
+            buffer += chunk
+        
+        if not buffer and self._process.poll() not in (None, 0):
+            stderr = self._process.stderr.read().decode('utf-8', 'replace')
+            self.close()
+            raise GitError(f"Git command failed: {stderr.strip()}")
+        
+        records = buffer.decode('utf-8', 'replace').split('\0')
+        return _parse_numstat_records(records)
+    
+    def _iter_lines(self) -> Iterator[bytes]:
+        # Lines stay as the bytes git wrote, newline included, for the parser to slice
+        *lines, pending = self._leftover.split(b'\n')
+        self._leftover = b""
+        for line in lines:
+            yield line + b'\n'
+        
+        for line in self._process.stdout:
+            if pending:
+                line = pending + line
+                pending = b""
+            yield line
+        
+        if pending:
+            yield pending
+    
+    def __iter__(self) -> Iterator[FileDiff]:
+        return _iter_file_diffs(self._iter_lines(), self.numstats, self.skip, self.max_file_lines)
+    
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.terminate()
+        self._process.wait()
+        self._process.stdout.close()
+        self._process.stderr.close()
+    
+    def __enter__(self) -> "StagedDiffStream":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+# One header per commit, fields separated by \x1f; -z ends it with a NUL
+COMMIT_HEADER_FORMAT = "commit %H%x1f%P%x1f%T%x1f%an%x1f%ae%x1f%ad%x1f%B"
+LOG_WITH_STATS_ARGS = [
+    "log", "--reverse", "--root", "--numstat", "--patch", "-z", "--unified=0", "--no-color",
+    "--date=raw", f"--format={COMMIT_HEADER_FORMAT}",
+]
+
+
+@dataclass
+class CommitDiff:
+    oid: str
+    parents: list[str]
+    tree: str
+    author_name: str
+    author_email: str
+    # git's internal "<seconds> <offset>" form, as GIT_AUTHOR_DATE accepts it
+    author_date: str
+    message: str
+    numstats: list[NumStat]
+    # Kept as git wrote it; each consumer parses it with its own skip rules
+    patch: bytes = b""
+    
+    @property
+    def subject(self) -> str:
+        return self.message.split('\n', 1)[0]
+    
+    def file_diffs(
+        self,
+        skip: Optional[Callable[[str], bool]] = None,
+        max_file_lines: Optional[int] = None,
+    ) -> list[FileDiff]:
+        return parse_patch(self.patch, self.numstats, skip, max_file_lines)
+
+
+def _parse_commit_header(header: str, numstats: list[NumStat], patch: bytes) -> CommitDiff:
+    fields = header[len("commit "):].split('\x1f', 6)
+    if len(fields) != 7:
+        raise GitError(f"Git command failed: unexpected log header {header[:80]!r}")
+    oid, parents, tree, name, email, date, message = fields
+    return CommitDiff(
+        oid=oid,
+        parents=parents.split(),
+        tree=tree,
+        author_name=name,
+        author_email=email,
+        author_date=date,
+        message=message.rstrip('\n'),
+        numstats=numstats,
+        patch=patch,
+    )
+
+
+class CommitLogStream:
+    """Streams the numstat and patch of every commit in a range from one `git log`.
+    
+    Commits come oldest first.  Each is split off the pipe as soon as the
+    next one starts, so only one commit's output is held at a time.  A commit
+    is "commit <header>\\0", then, if it changed anything, a newline, its
+    NUL-terminated numstat records, an empty record and the patch text.
+    Patch lines never start with "commit ", which marks where the next begins.
+    """
+    
+    def __init__(self, revision_range: str, cwd: Optional[Path] = None, chunk_size: int = 64 * 1024):
+        self.chunk_size = chunk_size
+        try:
+            self._process = subprocess.Popen(
+                ["git", *LOG_WITH_STATS_ARGS, revision_range, "--"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                cwd=cwd,
+            )
+        except OSError as e:
+            raise GitError(f"Git command failed: {e}") from e
+        self._buffer = bytearray()
+        self._eof = False
+    
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        chunk = self._process.stdout.read1(self.chunk_size)
+        if not chunk:
+            self._eof = True
+            return False
+        self._buffer += chunk
+        return True
+    
+    def _find(self, needle: bytes, start: int) -> int:
+        """Index of needle at or after start, reading on until it arrives; -1 once git is done."""
+        search_from = start
+        while True:
+            index = self._buffer.find(needle, search_from)
+            if index != -1:
+                return index
+            search_from = max(start, len(self._buffer) - len(needle) + 1)
+            if not self._fill():
+                return -1
+    
+    def _next_commit(self) -> Optional[CommitDiff]:
+        if not self._buffer and not self._fill():
+            return None
+        end = self._find(b'\0', 0)
+        if end == -1 or not self._buffer.startswith(b'commit '):
+            raise GitError("Git command failed: log output ended mid-commit")
+        header = self._buffer[:end].decode('utf-8', 'replace')
+        
+        position = end + 1
+        numstats: list[NumStat] = []
+        patch = b""
+        if position == len(self._buffer):
+            self._fill()
+        # An empty commit's header is followed directly by the next one
+        if self._buffer[position:position + 1] == b'\n':
+            stats_end = self._find(b'\0\0', position + 1)
+            if stats_end == -1:
+                raise GitError("Git command failed: log output ended mid-commit")
+            records = self._buffer[position + 1:stats_end].decode('utf-8', 'replace').split('\0')
+            numstats = _parse_numstat_records(records)
+            position = stats_end + 2
+            patch_end = self._find(b'\ncommit ', position)
+            patch_end = len(self._buffer) if patch_end == -1 else patch_end + 1
+            patch = bytes(self._buffer[position:patch_end])
+            position = patch_end
+        
+        del self._buffer[:position]
+        return _parse_commit_header(header, numstats, patch)
+    
+    def __iter__(self) -> Iterator[CommitDiff]:
+        while True:
+            commit = self._next_commit()
+            if commit is None:
+                break
+            yield commit
+        if self._process.wait() != 0:
+            stderr = self._process.stderr.read().decode('utf-8', 'replace')
+            raise GitError(f"Git command failed: {stderr.strip()}")
+    
+    def close(self) -> None:
+        if self._process.poll() is None:
+            self._process.terminate()
+        self._process.wait()
+        self._process.stdout.close()
+        self._process.stderr.close()
+    
+    def __enter__(self) -> "CommitLogStream":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def rewrite_messages(commits: list[CommitDiff], messages: dict[str, str], cwd: Optional[Path] = None) -> str:
+    """Recreate a linear run of commits ending at HEAD with new messages, then move HEAD there.
+    
+    Trees, parents outside the run and authorship are kept; the committer is
+    whoever runs this, as with a rebase.  Commits without a new message keep
+    theirs.  HEAD moves once, at the end, and only if it still points at the
+    last commit; returns the new tip.
+    """
+    if not commits:
+        raise ValueError("No commits to rewrite")
+    parents = commits[0].parents
+    tip = ""
+    for commit in commits:
+        args = ["git", "commit-tree", commit.tree]
+        for parent in parents:
+            args += ["-p", parent]
+        env = {
+            **os.environ,
+            "GIT_AUTHOR_NAME": commit.author_name,
+            "GIT_AUTHOR_EMAIL": commit.author_email,
+            "GIT_AUTHOR_DATE": commit.author_date,
+        }
+        try:
+            result = subprocess.run(
+                args,
+                input=messages.get(commit.oid, commit.message) + '\n',
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=cwd,
+                env=env,
+            )
+        except subprocess.CalledProcessError as e:
+            raise GitError(f"Git command failed: {e.stderr.strip()}") from e
+        tip = result.stdout.strip()
+        parents = [tip]
+    
+    _run_git_command(["update-ref", "-m", "edgecommit: reword", "HEAD", tip, commits[-1].oid], cwd)
+    return tip
+
+
+@dataclass
+class GitObject:
+    oid: str
+    type: str
+    size: int
+    # A view into the reader's buffer, valid until the next object is read: at
+    # most the first limit bytes when a limit was given, empty without contents
+    data: memoryview
+
+
+class GitObjectReader:
+    """Reads objects through one long-lived `git cat-file --batch` process.
+
+    Any revision git understands works as a spec: ":path" for the staged blob,
+    "HEAD:path", or an object id.  A feeder thread writes the requests while
+    the responses are read, so a batch of any size costs one fork and cannot
+    deadlock on full pipes.  Contents land in one buffer that is reused from
+    object to object; `iter_objects` hands out views into it, `read` copies.
+    With contents=False the process is `git cat-file --batch-check`, which
+    reports ids and sizes without sending any contents.
+    """
+
+    def __init__(self, cwd: Optional[Path] = None, buffer_size: int = 64 * 1024, contents: bool = True):
+        self.cwd = cwd
+        self.contents = contents
+        self._buffer = bytearray(buffer_size)
+        self._process: Optional[subprocess.Popen] = None
+        self._lock = threading.Lock()
+
+    def _start(self) -> subprocess.Popen:
+        if self._process is None or self._process.poll() is not None:
+            self.close()
+            try:
+                self._process = subprocess.Popen(
+                    ["git", "cat-file", "--batch" if self.contents else "--batch-check"],
+                    stdin=subprocess.PIPE,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    cwd=self.cwd,
+                )
+            except OSError as e:
+                raise GitError(f"Git command failed: {e}") from e
+        return self._process
+
+    @staticmethod
+    def _feed(process: subprocess.Popen, specs: list[str]) -> None:
+        try:
+            for spec in specs:
+                process.stdin.write(spec.encode('utf-8') + b'\n')
+            process.stdin.flush()
+        except (BrokenPipeError, ValueError):
+            # git exited or the reader was closed; the reading side reports it
+            pass
+
+    def _read_exactly(self, process: subprocess.Popen, size: int, discard: int = 0) -> memoryview:
+        # The discarded tail is read through the end of the buffer, after the kept bytes
+        scratch = min(discard, 64 * 1024)
+        if len(self._buffer) < size + scratch:
+            self._buffer = bytearray(max(size + scratch, 2 * len(self._buffer)))
+        view = memoryview(self._buffer)
+        filled = 0
+        while filled < size + discard:
+            if filled < size:
+                count = process.stdout.readinto(view[filled:size])
+            else:
+                count = process.stdout.readinto(view[size:size + min(scratch, size + discard - filled)])
+            if not count:
+                raise GitError("Git command failed: cat-file output ended mid-object")
+            filled += count
+        return view[:size]
+
+    def _read_object(self, process: subprocess.Popen, limit: Optional[int] = None) -> Optional[GitObject]:
+        header = process.stdout.readline()
+        if not header.endswith(b'\n'):
+            stderr = process.stderr.read().decode('utf-8', 'replace') if process.poll() is not None else ""
+            raise GitError(f"Git command failed: {stderr.strip() or 'cat-file exited'}")
+
+        # "<oid> <type> <size>", or "<spec> missing" / "<spec> ambiguous"
+        fields = header.decode('utf-8', 'replace').rsplit(' ', 2)
+        if len(fields) != 3 or not fields[2].strip().isdigit():
+            return None
+        oid, kind, size = fields[0], fields[1], int(fields[2])
+        if not self.contents:
+            return GitObject(oid, kind, size, memoryview(b""))
+        # The contents are followed by a newline, read (and dropped) with the rest
+        keep = size if limit is None else min(size, limit)
+        view = self._read_exactly(process, keep, discard=size - keep + 1)
+        return GitObject(oid, kind, size, view)
+
+    def iter_objects(
+        self, specs: Iterable[str], limit: Optional[int] = None
+    ) -> Iterator[tuple[str, Optional[GitObject]]]:
+        """Yield (spec, object) in request order; the object is None if spec names nothing.
+        
+        With a limit, only the first limit bytes of each object are kept.
+        """
+        specs = list(specs)
+        for spec in specs:
+            if '\n' in spec:
+                raise ValueError(f"Object spec contains a newline: {spec!r}")
+        if not specs:
+            return
+
+        with self._lock:
+            process = self._start()
+            feeder = threading.Thread(target=self._feed, args=(process, specs), daemon=True)
+            feeder.start()
+            done = 0
+            try:
+                for spec in specs:
+                    obj = self._read_object(process, limit)
+                    done += 1
+                    yield spec, obj
+            finally:
+                if done < len(specs):
+                    # Unread responses would be taken for the next batch's; start afresh
+                    self.close()
+                feeder.join()
+
+    def read(self, spec: str) -> Optional[bytes]:
+        """Contents of one object, or None if spec names nothing."""
+        for _, obj in self.iter_objects([spec]):
+            return bytes(obj.data) if obj is not None else None
+        return None
+
+    def close(self) -> None:
+        process, self._process = self._process, None
+        if process is None:
+            return
+        # Terminated before its stdin is closed: a feeder blocked on a full pipe must fail, not flush
+        if process.poll() is None:
+            process.terminate()
+        process.wait()
+        for stream in (process.stdin, process.stdout, process.stderr):
+            try:
+                stream.close()
+            except (BrokenPipeError, ValueError):
+                pass
+
+    def __enter__(self) -> "GitObjectReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def create_commit(message: str, cwd: Optional[Path] = None, check_staged: bool = True) -> None:
     if not message:
         raise ValueError("Commit message cannot be empty")
     
-    if not has_staged_changes(cwd):
+    if check_staged and not has_staged_changes(cwd):
         raise GitError("No staged changes to commit")
     
     _run_git_command(["commit", "-m", message], cwd)
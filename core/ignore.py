@@ -0,0 +1,253 @@
+import os
+import re
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+IGNORE_FILE_NAME = ".commitpilotignore"
+
+_GLOB_CHARS = frozenset("*?[\\")
+_TRAILING_SPACE = re.compile(r"(?<!\\)\s+$")
+
+
+class IgnoreRule(NamedTuple):
+    pattern: str
+    negated: bool = False
+    dir_only: bool = False
+    anchored: bool = False
+
+
+def read_ignore_file(path: str | Path) -> list[str]:
+    patterns = []
+    with open(path, "r") as ignore_file:
+        for line in ignore_file:
+            line = _TRAILING_SPACE.sub("", line.rstrip("\n"))
+            if line and not line.startswith("#"):
+                patterns.append(line)
+    return patterns
+
+
+def parse_rule(line: str) -> Optional[IgnoreRule]:
+    """Parse one gitignore-style line; returns None for blanks and comments."""
+    line = _TRAILING_SPACE.sub("", line)
+    if not line or line.startswith("#"):
+        return None
+
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith(("\\!", "\\#")):
+        line = line[1:]
+
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    anchored = "/" in line
+    line = line.lstrip("/")
+    if not line:
+        return None
+
+    return IgnoreRule(line, negated, dir_only, anchored)
+
+
+def _has_glob(pattern: str) -> bool:
+    return any(char in _GLOB_CHARS for char in pattern)
+
+
+def _segment_to_regex(segment: str) -> str:
+    parts = []
+    i, n = 0, len(segment)
+    while i < n:
+        char = segment[i]
+        i += 1
+        if char == "\\" and i < n:
+            parts.append(re.escape(segment[i]))
+            i += 1
+        elif char == "*":
+            while i < n and segment[i] == "*":
+                i += 1
+            parts.append("[^/]*")
+        elif char == "?":
+            parts.append("[^/]")
+        elif char == "[":
+            end = segment.find("]", i + 1 if i < n and segment[i] in "!]" else i)
+            if end == -1:
+                parts.append(re.escape(char))
+                continue
+            body = segment[i:end].replace("\\", "\\\\")
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            parts.append(f"[{body}]")
+            i = end + 1
+        else:
+            parts.append(re.escape(char))
+    return "".join(parts)
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """Translate a glob into a regex where wildcards never cross '/' except '**'."""
+    segments = pattern.split("/")
+    parts = []
+    for i, segment in enumerate(segments):
+        last = i == len(segments) - 1
+        if segment == "**":
+            parts.append(".*" if last else "(?:.*/)?")
+        else:
+            parts.append(_segment_to_regex(segment) + ("" if last else "/"))
+    return "".join(parts)
+
+
+class _RuleTable:
+    """Lookup tables mapping a path to the highest-numbered rule that matches it."""
+
+    def __init__(self) -> None:
+        self.names: dict[str, int] = {}
+        self.suffixes: dict[str, int] = {}
+        self.paths: dict[str, int] = {}
+        self.name_globs: list[tuple[int, str]] = []
+        self.path_globs: list[tuple[int, str]] = []
+        self.name_re: Optional[re.Pattern[str]] = None
+        self.path_re: Optional[re.Pattern[str]] = None
+        self.name_rules: list[int] = []
+        self.path_rules: list[int] = []
+
+    def add(self, index: int, rule: IgnoreRule) -> None:
+        pattern = rule.pattern
+        if not _has_glob(pattern):
+            (self.paths if rule.anchored else self.names)[pattern] = index
+        elif not rule.anchored and pattern.startswith("*.") and not _has_glob(pattern[1:]):
+            self.suffixes[pattern[1:]] = index
+        elif rule.anchored:
+            self.path_globs.append((index, _glob_to_regex(pattern)))
+        else:
+            # Unanchored rules contain no '/', so they only ever see the last component
+            self.name_globs.append((index, _glob_to_regex(pattern)))
+
+    @staticmethod
+    def _combine(globs: list[tuple[int, str]]) -> tuple[Optional[re.Pattern[str]], list[int]]:
+        if not globs:
+            return None, []
+        # Highest rule first so the first alternative that matches is the one that wins
+        ordered = sorted(globs, reverse=True)
+        regex = re.compile("|".join(f"({glob})" for _, glob in ordered), re.DOTALL)
+        return regex, [index for index, _ in ordered]
+
+    def compile(self) -> None:
+        self.name_re, self.name_rules = self._combine(self.name_globs)
+        self.path_re, self.path_rules = self._combine(self.path_globs)
+
+    def lookup(self, path: str, name: str) -> int:
+        best = max(self.names.get(name, -1), self.paths.get(path, -1))
+
+        if self.suffixes:
+            dot = name.find(".")
+            while dot != -1:
+                best = max(best, self.suffixes.get(name[dot:], -1))
+                dot = name.find(".", dot + 1)
+
+        if self.name_re is not None:
+            match = self.name_re.fullmatch(name)
+            if match is not None:
+                best = max(best, self.name_rules[match.lastindex - 1])
+
+        if self.path_re is not None:
+            match = self.path_re.fullmatch(path)
+            if match is not None:
+                best = max(best, self.path_rules[match.lastindex - 1])
+
+        return best
+
+
+class IgnoreRuleSet:
+    """The compiled rules of a single ignore file, relative to its directory."""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.rules = [rule for rule in map(parse_rule, patterns) if rule is not None]
+        self._files = _RuleTable()
+        self._dirs = _RuleTable()
+
+        for index, rule in enumerate(self.rules):
+            self._dirs.add(index, rule)
+            if not rule.dir_only:
+                self._files.add(index, rule)
+
+        self._files.compile()
+        self._dirs.compile()
+
+    def match(self, path: str, is_dir: bool = False) -> Optional[bool]:
+        """Return True if ignored, False if re-included by a negation, None if no rule applies."""
+        table = self._dirs if is_dir else self._files
+        index = table.lookup(path, path.rpartition("/")[2])
+        if index < 0:
+            return None
+        return not self.rules[index].negated
+
+
+class _DirNode:
+    __slots__ = ("children", "ignored", "rulesets")
+
+    def __init__(self, ignored: bool, rulesets: list[tuple[str, IgnoreRuleSet]]):
+        self.children: dict[str, _DirNode] = {}
+        self.ignored = ignored
+        self.rulesets = rulesets
+
+
+class IgnoreMatcher:
+    """Gitignore-compatible matcher over a hierarchy of ignore files.
+
+    Paths are resolved with a single walk down a directory trie.  Each trie
+    node caches whether its directory is ignored and which ignore files apply
+    below it, so an ignored subtree is decided at its top directory and nested
+    ignore files are only looked up once per directory.
+    """
+
+    def __init__(self, patterns: Iterable[str], root: Optional[str | Path] = None):
+        self.root = Path(root) if root is not None else None
+        self._root = _DirNode(False, [("", IgnoreRuleSet(patterns))])
+        # Every nested ignore file looked up so far, whether or not it existed
+        self.nested_files: list[Path] = []
+
+    @staticmethod
+    def _decide(rulesets: list[tuple[str, IgnoreRuleSet]], path: str, is_dir: bool) -> bool:
+        # Deeper ignore files take precedence over their parents
+        for base, ruleset in reversed(rulesets):
+            decision = ruleset.match(path[len(base):], is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+    def _load_nested(self, directory: str) -> Optional[IgnoreRuleSet]:
+        if self.root is None:
+            return None
+        ignore_file = self.root / directory / IGNORE_FILE_NAME
+        self.nested_files.append(ignore_file)
+        if not os.path.isfile(ignore_file):
+            return None
+        return IgnoreRuleSet(read_ignore_file(ignore_file))
+
+    def _child(self, node: _DirNode, part: str, directory: str) -> _DirNode:
+        if self._decide(node.rulesets, directory, is_dir=True):
+            child = _DirNode(True, node.rulesets)
+        else:
+            nested = self._load_nested(directory)
+            rulesets = node.rulesets
+            if nested is not None:
+                rulesets = [*rulesets, (directory + "/", nested)]
+            child = _DirNode(False, rulesets)
+        node.children[part] = child
+        return child
+
+    def matches(self, file_path: str) -> bool:
+        file_path = file_path.strip("/")
+        parts = file_path.split("/")
+
+        node = self._root
+        end = -1
+        for part in parts[:-1]:
+            end += len(part) + 1
+            child = node.children.get(part)
+            if child is None:
+                child = self._child(node, part, file_path[:end])
+            if child.ignored:
+                return True
+            node = child
+
+        return self._decide(node.rulesets, file_path, is_dir=False)
@@ -0,0 +1,407 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, Optional
+
+from core import analyzer
+from core.analyzer import DiffSummary
+from core.entropy import EntropyDetector
+from core.filters import MAX_PATCH_TOKENS, DiffFilter
+from core.git import FileDiff, NumStat, StagedDiffStream
+from core.redaction import SecretRedactor, scan_file_diffs
+
+if TYPE_CHECKING:
+    from config import Config
+    from llm.base import BaseLLMProvider
+
+# File diffs buffered between consecutive stages
+PIPELINE_QUEUE_SIZE = 64
+
+# Below this many added lines, starting worker processes costs more than it saves
+REDACTION_POOL_MIN_LINES = 50_000
+MAX_REDACTION_WORKERS = 8
+# Files sent to a redaction worker at a time, to amortise pickling
+REDACTION_BATCH_FILES = 16
+
+_END = object()
+
+
+@dataclass
+class StageTiming:
+    name: str
+    start: float
+    end: float
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+
+class PipelineTimings:
+    """Wall-clock interval of each stage, relative to a common origin."""
+
+    def __init__(self, origin: Optional[float] = None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.stages: list[StageTiming] = []
+        self._lock = threading.Lock()
+
+    def record(self, name: str, start: float, end: float) -> None:
+        with self._lock:
+            self.stages.append(StageTiming(name, start - self.origin, end - self.origin))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    @property
+    def wall(self) -> float:
+        if not self.stages:
+            return 0.0
+        return max(s.end for s in self.stages) - min(s.start for s in self.stages)
+
+    @property
+    def overlap(self) -> float:
+        """Time saved by running stages concurrently: summed durations minus wall time."""
+        return max(0.0, sum(s.duration for s in self.stages) - self.wall)
+
+    def report(self) -> list[str]:
+        lines = [
+            f"{s.name:<10} {s.start * 1000:8.1f} → {s.end * 1000:8.1f} ms  ({s.duration * 1000:.1f} ms)"
+            for s in sorted(self.stages, key=lambda s: s.start)
+        ]
+        lines.append(f"{'wall':<10} {self.wall * 1000:8.1f} ms, {self.overlap * 1000:.1f} ms overlapped")
+        return lines
+
+
+@dataclass
+class PackedDiff:
+    text: str
+    # Values masked per file, for files where anything was found
+    redactions: dict[str, int] = field(default_factory=dict)
+
+
+def redaction_workers(numstats: list[NumStat]) -> int:
+    """Number of redaction processes worth starting for this change; 1 means in-process."""
+    added = sum(stat.added for stat in numstats)
+    if added < REDACTION_POOL_MIN_LINES:
+        return 1
+    return max(1, min(MAX_REDACTION_WORKERS, os.cpu_count() or 1))
+
+
+def _iter_queue(items: "queue.Queue[object]", stop: Optional[threading.Event] = None) -> Iterator[FileDiff]:
+    while True:
+        try:
+            item = items.get(timeout=0.05)
+        except queue.Empty:
+            # A middle stage must not wait forever once the stage after it is done
+            if stop is not None and stop.is_set():
+                return
+            continue
+        if item is _END:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+def _batches(file_diffs: Iterator[FileDiff], size: int) -> Iterator[list[FileDiff]]:
+    batch = []
+    for file_diff in file_diffs:
+        batch.append(file_diff)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class DiffPipeline:
+    """Read, redact, tokenize and pack the staged diff with the stages overlapped.
+
+    git's output is parsed on one thread and handed through bounded queues to
+    the redactor and then the packer, so files are redacted and tokenized
+    while git is still producing later ones.  Nothing reaches the packer, and
+    so the prompt, before it has been redacted.  Large changes are redacted by
+    a pool of worker processes.  With a blob cache on the filter, a file diff
+    scanned in an earlier run is masked from its stored spans instead.  The
+    BPE tables and the provider connection are warmed up on their own threads
+    at the same time.
+    """
+
+    def __init__(
+        self,
+        file_diffs: Iterable[FileDiff],
+        diff_filter: DiffFilter,
+        warm_up: Optional[Callable[[], None]] = None,
+        timings: Optional[PipelineTimings] = None,
+        redaction_workers: int = 1,
+        redactor: Optional[SecretRedactor] = None,
+    ):
+        self.file_diffs = file_diffs
+        self.diff_filter = diff_filter
+        self.warm_up = warm_up
+        self.timings = timings if timings is not None else PipelineTimings()
+        self.redaction_workers = redaction_workers
+        self.redactor = redactor if redactor is not None else SecretRedactor()
+        self.cache = diff_filter.cache
+        self.redactions: dict[str, int] = {}
+
+    def _read(self, items: "queue.Queue[object]", stop: threading.Event) -> None:
+        try:
+            with self.timings.stage("git"):
+                for file_diff in self.file_diffs:
+                    if not self._put(items, file_diff, stop):
+                        return
+        except Exception as e:
+            self._put(items, e, stop)
+            return
+        self._put(items, _END, stop)
+
+    @staticmethod
+    def _put(items: "queue.Queue[object]", item: object, stop: threading.Event) -> bool:
+        # The packer may stop early once every file it wants has arrived
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _redact(self, source: "queue.Queue[object]", items: "queue.Queue[object]", stop: threading.Event) -> None:
+        try:
+            with self.timings.stage("redact"):
+                if self.redaction_workers > 1:
+                    finished = self._redact_parallel(source, items, stop)
+                else:
+                    finished = all(
+                        self._emit(items, result, stop)
+                        for batch in _batches(_iter_queue(source, stop), 1)
+                        for result in self._finish(batch, *self._cached_spans(batch), None)
+                    )
+        except Exception as e:
+            self._put(items, e, stop)
+            return
+        if finished:
+            self._put(items, _END, stop)
+
+    def _redact_parallel(
+        self, source: "queue.Queue[object]", items: "queue.Queue[object]", stop: threading.Event
+    ) -> bool:
+        # spawn rather than fork: this process is running several threads
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(self.redaction_workers, mp_context=context) as pool:
+            pending = deque()
+            try:
+                for batch in _batches(_iter_queue(source, stop), REDACTION_BATCH_FILES):
+                    keys, cached = self._cached_spans(batch)
+                    unscanned = [file_diff for index, file_diff in enumerate(batch) if index not in cached]
+                    future = pool.submit(scan_file_diffs, unscanned, self.redactor) if unscanned else None
+                    pending.append((batch, keys, cached, future))
+                    # Results go out in submission order; keep every worker busy
+                    # without letting finished batches pile up behind a slow one.
+                    while pending and (
+                        pending[0][3] is None
+                        or pending[0][3].done()
+                        or len(pending) > 2 * self.redaction_workers
+                    ):
+                        if not all(self._emit(items, result, stop) for result in self._finish(*pending.popleft())):
+                            return False
+                while pending:
+                    if not all(self._emit(items, result, stop) for result in self._finish(*pending.popleft())):
+                        return False
+            finally:
+                for _, _, _, future in pending:
+                    if future is not None:
+                        future.cancel()
+        return not stop.is_set()
+
+    def _cached_spans(self, batch: list[FileDiff]) -> tuple[list[str], dict[int, list]]:
+        # Spans stored by an earlier run for the same file diff text, by position in batch
+        if self.cache is None:
+            return [], {}
+        keys = [hashlib.sha1(file_diff.text.encode('utf-8', 'surrogatepass')).hexdigest() for file_diff in batch]
+        stored = self.cache.get_many(self.redactor.cache_kind, keys)
+        return keys, {index: stored[key] for index, key in enumerate(keys) if key in stored}
+
+    def _finish(
+        self, batch: list[FileDiff], keys: list[str], cached: dict[int, list], scanned: Optional[Future]
+    ) -> list[tuple[FileDiff, int]]:
+        """Mask each file diff in batch, with spans from the cache or freshly scanned.
+
+        scanned is a worker's future, or None to scan here.
+        """
+        if scanned is None:
+            unscanned = [file_diff for index, file_diff in enumerate(batch) if index not in cached]
+            fresh = iter(scan_file_diffs(unscanned, self.redactor))
+        else:
+            fresh = iter(scanned.result())
+        results = []
+        found = {}
+        for index, file_diff in enumerate(batch):
+            spans = cached.get(index)
+            if spans is None:
+                spans = next(fresh)
+                if keys:
+                    found[keys[index]] = spans
+            results.append(self.redactor.apply_file_diff_spans(file_diff, spans))
+        if found:
+            self.cache.put_many(self.redactor.cache_kind, found)
+        return results
+
+    def _emit(self, items: "queue.Queue[object]", result: tuple[FileDiff, int], stop: threading.Event) -> bool:
+        file_diff, count = result
+        if count:
+            self.redactions[file_diff.path] = self.redactions.get(file_diff.path, 0) + count
+        return self._put(items, file_diff, stop)
+
+    def _pack(self, items: "queue.Queue[object]", numstats: list[NumStat], max_tokens: int) -> str:
+        with self.timings.stage("pack"):
+            return self.diff_filter.pack_file_diffs(_iter_queue(items), numstats, max_tokens)
+
+    def _load_encoder(self) -> None:
+        with self.timings.stage("tokenizer"):
+            self.diff_filter.encoder
+
+    def _connect(self) -> None:
+        with self.timings.stage("connect"):
+            self.warm_up()
+
+    async def run(self, numstats: list[NumStat], max_tokens: int = MAX_PATCH_TOKENS) -> PackedDiff:
+        if self.warm_up is not None:
+            # A plain daemon thread: asyncio.run() would otherwise wait for a
+            # slow handshake before the packed diff could be used.
+            threading.Thread(target=self._connect, daemon=True).start()
+
+        raw: "queue.Queue[object]" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        redacted: "queue.Queue[object]" = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        stop = threading.Event()
+        encoder = asyncio.create_task(asyncio.to_thread(self._load_encoder))
+        reader = asyncio.create_task(asyncio.to_thread(self._read, raw, stop))
+        redactor = asyncio.create_task(asyncio.to_thread(self._redact, raw, redacted, stop))
+
+        try:
+            text = await asyncio.to_thread(self._pack, redacted, numstats, max_tokens)
+        finally:
+            stop.set()
+            # Ends git early when the packer needed only part of the diff
+            close = getattr(self.file_diffs, "close", None)
+            if close is not None:
+                close()
+            await asyncio.gather(reader, redactor)
+            # pack re-raises a tokenizer failure itself, so only wait for the thread here
+            await asyncio.gather(encoder, return_exceptions=True)
+        return PackedDiff(text, self.redactions)
+
+
+def run_pipeline(
+    file_diffs: Iterable[FileDiff],
+    diff_filter: DiffFilter,
+    numstats: list[NumStat],
+    warm_up: Optional[Callable[[], None]] = None,
+    timings: Optional[PipelineTimings] = None,
+    max_tokens: int = MAX_PATCH_TOKENS,
+    workers: Optional[int] = None,
+    redactor: Optional[SecretRedactor] = None,
+) -> PackedDiff:
+    if workers is None:
+        workers = redaction_workers(numstats)
+    pipeline = DiffPipeline(file_diffs, diff_filter, warm_up, timings, workers, redactor)
+    return asyncio.run(pipeline.run(numstats, max_tokens))
+
+
+@dataclass
+class Generation:
+    # None when the filters drop every staged file
+    summary: Optional[DiffSummary]
+    # None when generation failed, with the reason in error
+    message: Optional[str] = None
+    heuristic: bool = False
+    error: Optional[Exception] = None
+
+
+def generate_message(
+    stream: StagedDiffStream,
+    config: "Config",
+    diff_filter: DiffFilter,
+    provider: Callable[[], "BaseLLMProvider"],
+    timings: Optional[PipelineTimings] = None,
+    cwd: Optional[Path] = None,
+    warm_up: bool = True,
+    on_generate: Optional[Callable[[], None]] = None,
+    on_update: Optional[Callable] = None,
+) -> Generation:
+    """Filter, summarize and pack the staged diff, then describe it by rule or by asking the model.
+
+    provider builds the model client; a ValueError from it, such as a missing
+    API key, is reported in the result like a failed request.  The symbol
+    tables and redaction spans are cached through the filter's blob cache.
+    on_generate is called just before the model is asked, and on_update with
+    each partial reply.
+    """
+    timings = timings if timings is not None else PipelineTimings()
+    with timings.stage("filter"):
+        numstats = [stat for stat in stream.numstats if not diff_filter.should_skip_file(stat.file_path)]
+        # Generated and minified files are left out like ignored ones
+        generated = diff_filter.find_generated_files(numstats, cwd)
+        numstats = [stat for stat in numstats if stat.file_path not in generated]
+    if not numstats:
+        return Generation(None)
+
+    stream.skip = lambda path: path in generated or diff_filter.should_skip_file(path)
+    stream.max_file_lines = MAX_PATCH_TOKENS
+    try:
+        llm = provider()
+    except ValueError as e:
+        llm, provider_error = None, e
+
+    symbols = {}
+    if config.semantic_diff:
+        with timings.stage("symbols"):
+            symbols = analyzer.summarize_python_changes(numstats, cwd, diff_filter.cache)
+        # Python files described by their symbols are not sent as hunks
+        stream.skip = lambda path: path in symbols or path in generated or diff_filter.should_skip_file(path)
+
+    # git, redaction, packing, the tokenizer and the API connection overlap here
+    packed = run_pipeline(
+        stream,
+        diff_filter,
+        [stat for stat in numstats if stat.file_path not in symbols],
+        warm_up=llm.warm_up if warm_up and llm is not None else None,
+        timings=timings,
+        redactor=SecretRedactor(EntropyDetector.from_config(config)),
+    )
+    summary = analyzer.analyze_changes(numstats, packed.text, packed.redactions, symbols)
+
+    if config.heuristic_threshold is not None:
+        with timings.stage("heuristic"):
+            guess = analyzer.heuristic_commit(summary, config.heuristic_threshold)
+        if guess is not None:
+            return Generation(summary, guess.message, heuristic=True)
+
+    try:
+        if llm is None:
+            raise provider_error
+        if on_generate is not None:
+            on_generate()
+        with timings.stage("generate"):
+            message = llm.generate_commit(summary, on_update=on_update)
+    except Exception as e:
+        return Generation(summary, error=e)
+    redactor = SecretRedactor()
+    if redactor.has_potential_secrets(message):
+        message = redactor.redact_diff(message)
+    return Generation(summary, message)
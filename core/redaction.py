@@ -1,104 +1,263 @@
 import re
-from typing import Set
+from functools import lru_cache
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from core.entropy import EntropyDetector
+from core.git import FileDiff, Hunk
+
+SECRET_KEYWORDS = frozenset({
+    'password', 'secret', 'token', 'key', 'api_key', 'apikey',
+    'auth', 'credential', 'private', 'priv', 'access_key',
+    'session', 'cookie', 'jwt', 'bearer', 'oauth',
+})
+
+# Shortest quoted value any rule can match (an AWS access key id)
+_MIN_VALUE_LENGTH = 20
+# Quoted values at least this long on a line mentioning a keyword are flagged
+_SUSPICIOUS_LENGTH = 30
+# Quoted values at least this long that contain a keyword are redacted
+_KEYWORD_VALUE_LENGTH = 40
+# Blob cache kind for the spans masked in a file diff; bump when the rules change
+REDACTION_KIND = "redactions:3"
+
+
+@lru_cache(maxsize=None)
+def _candidate_pattern(min_length: int) -> re.Pattern[str]:
+    # Every rule looks at a quoted value or the literal right of an assignment,
+    # so one pass finds all candidates.  The closing quote is a lookahead so it
+    # can also open the next candidate.
+    # Both kinds start from one character class, which re can skip to quickly.
+    return re.compile(
+        rf'(["\'=:])(?:'
+        rf'(?<=["\'])([^"\'\n]{{{min_length},}})(?=(["\']))'
+        rf'|(?<=[=:])[ \t]*([A-Za-z0-9+/_\-]{{{min_length},}}))'
+    )
+
+
+# Classifies a whole candidate value; the first alternative that fits names it
+_SECRET_VALUE = re.compile(
+    r'''
+    (?P<openai>sk-[a-z0-9]{48})
+    | (?P<github>gh[ps]_[a-z0-9]{36})
+    | (?P<aws>AKIA[0-9A-Z]{16})
+    | (?P<google>ya29\.[a-z0-9_-]{100,})
+    | (?P<hex>[a-f0-9]{32,})
+    | (?P<base64>[a-z0-9+/=]{40,})
+    | (?P<token>[a-z0-9_-]{50,})
+    ''',
+    re.IGNORECASE | re.VERBOSE,
+)
+
+
+def _keyword_pattern(keywords: frozenset[str]) -> re.Pattern[str]:
+    # Keywords containing a shorter one ("api_key" and "key") add nothing to a
+    # substring search; the pattern is applied to lowercased text because
+    # case-insensitive alternations are several times slower in re.
+    needed = [k for k in keywords if not any(other != k and other in k for other in keywords)]
+    return re.compile("|".join(sorted(map(re.escape, needed))))
+
+
+_KEYWORD = _keyword_pattern(SECRET_KEYWORDS)
+
+class SecretMatch(NamedTuple):
+    start: int
+    end: int
+    kind: str
+    added: bool
+
+
+def _redact_string(value: str) -> str:
+    if len(value) <= 8:
+        return value
+    return f"{value[:4]}...{value[-4:]}"
 
 
 class SecretRedactor:
+    """Finds and masks secrets in a diff with a single scan of the text.
+
+    Each quoted or assigned value of plausible length is found once and
+    classified once; the resulting spans drive both detection and redaction.
+    Values on added or removed lines that match no known shape are scored
+    for entropy together, in one batch.
+    """
+
+    def __init__(self, entropy: Optional[EntropyDetector] = None):
+        self.secret_keywords = SECRET_KEYWORDS
+        self.entropy = entropy if entropy is not None else EntropyDetector()
+
+    @property
+    def _candidates(self) -> re.Pattern[str]:
+        return _candidate_pattern(min(_MIN_VALUE_LENGTH, self.entropy.min_length))
+
+    def scan(
+        self,
+        text: str,
+        added_only: bool = False,
+        include_suspicious: bool = True,
+    ) -> list[SecretMatch]:
+        """Return the span of every secret-looking value in text, in order.
+
+        Redaction passes include_suspicious=False to skip the per-line keyword
+        check it has no use for; added_only=True skips other lines early, for
+        callers that only ask about what a change adds.
+        """
+        matches = list(self._iter_matches(text, added_only, include_suspicious))
+        entropic = {(m.start, m.end) for m in matches if m.kind == "entropy"}
+        if entropic:
+            # A suspicious value that is also random is reported once, for redaction
+            matches = [m for m in matches if m.kind == "entropy" or (m.start, m.end) not in entropic]
+            matches.sort()
+        return matches
+
+    def _iter_matches(self, text: str, added_only: bool, include_suspicious: bool) -> Iterator[SecretMatch]:
+        # Shape and keyword matches are yielded as they are found, so callers
+        # that only need one can stop early; entropy matches come last.
+        unknown: list[tuple[int, int, str]] = []
+        line_start = -1
+        line_end = -1
+        added = False
+        changed = False
+        line_has_keyword = None
+        classify_known = _SECRET_VALUE.fullmatch
+
+        for match in self._candidates.finditer(text):
+            opener, value, closer, assigned = match.groups()
+            if value is None:
+                value = assigned
+                start = match.start(4)
+            else:
+                start = match.start(2)
+            end = start + len(value)
+
+            if start > line_end:
+                line_start = text.rfind("\n", 0, start) + 1
+                line_end = text.find("\n", start)
+                if line_end == -1:
+                    line_end = len(text)
+                added = text.startswith("+", line_start) and not text.startswith("+++", line_start)
+                changed = added or (
+                    text.startswith("-", line_start) and not text.startswith("---", line_start)
+                )
+                line_has_keyword = None
+            if added_only and not added:
+                continue
+
+            length = len(value)
+            # Known shapes and keywords are for quoted literals; an unquoted
+            # value is as likely a path or a call, so it is only scored for entropy
+            if length >= _MIN_VALUE_LENGTH and closer is not None:
+                known = classify_known(value)
+                if known is not None:
+                    yield SecretMatch(start, end, known.lastgroup, added)
+                    continue
+                if (
+                    length >= _KEYWORD_VALUE_LENGTH
+                    and opener == closer
+                    and _KEYWORD.search(value.lower())
+                ):
+                    yield SecretMatch(start, end, "keyword", added)
+                    continue
+
+            if changed:
+                unknown.append((start, end, value, added))
+
+            if include_suspicious and closer is not None and length >= _SUSPICIOUS_LENGTH:
+                if line_has_keyword is None:
+                    line_has_keyword = _KEYWORD.search(text[line_start:line_end].lower()) is not None
+                if line_has_keyword:
+                    yield SecretMatch(start, end, "suspicious", added)
+
+        if unknown:
+            kinds = self.entropy.classify([value for _, _, value, _ in unknown])
+            for (start, end, _, added), kind in zip(unknown, kinds):
+                if kind is not None:
+                    yield SecretMatch(start, end, "entropy", added)
+
+    @property
+    def cache_kind(self) -> str:
+        """Names this redactor's settings, so spans found under other thresholds are not reused."""
+        entropy = self.entropy
+        return f"{REDACTION_KIND}:{entropy.min_length}:{entropy.base64_threshold}:{entropy.hex_threshold}"
     
-    def __init__(self):
-        
-        self.secret_keywords = {
-            'password', 'secret', 'token', 'key', 'api_key', 'apikey',
-            'auth', 'credential', 'private', 'priv', 'access_key',
-            'session', 'cookie', 'jwt', 'bearer', 'oauth',
-        }
-        
-        
-        self.secret_patterns = [
-            
-            r'["\']([a-zA-Z0-9+/=]{40,})["\']',  
-            r'["\']([a-fA-F0-9]{32,})["\']',     
-            r'["\']([a-zA-Z0-9_-]{50,})["\']',   
-            
-            
-            r'["\']sk-[a-zA-Z0-9]{48}["\']',     
-            r'["\']ghp_[a-zA-Z0-9]{36}["\']',    
-            r'["\']ghs_[a-zA-Z0-9]{36}["\']',    
-            r'["\']AKIA[0-9A-Z]{16}["\']',       
-            r'["\']ya29\.[a-zA-Z0-9_-]{100,}["\']', 
-        ]
-        
-        
-        self.compiled_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in self.secret_patterns]
-    
-    def _looks_like_secret(self, value: str) -> bool:
-        if len(value) < 40:
-            return False
-        
-        
-        
-        return any(keyword in value.lower() for keyword in self.secret_keywords)
-    
-    def _redact_string(self, value: str) -> str:
-        if len(value) <= 8:
-            return value
-        
-        
-        return f"{value[:4]}...{value[-4:]}"
-    
+    def _redact_spans(self, text: str, matches: Iterable[SecretMatch]) -> tuple[str, int]:
+        parts = []
+        position = 0
+        for match in matches:
+            parts.append(text[position:match.start])
+            parts.append(_redact_string(text[match.start:match.end]))
+            position = match.end
+        if not parts:
+            return text, 0
+        parts.append(text[position:])
+        return "".join(parts), len(parts) // 2
+
     def redact_line(self, line: str) -> str:
-        redacted_line = line
-        
-        
-        for pattern in self.compiled_patterns:
-            def replace_match(match):
-                secret = match.group(1)
-                redacted = self._redact_string(secret)
-                return match.group(0).replace(secret, redacted)
-            
-            redacted_line = pattern.sub(replace_match, redacted_line)
-        
-        
-        quote_pattern = r'(["\'])([^"\']{40,})\1'
-        def replace_long_string(match):
-            quote = match.group(1)
-            content = match.group(2)
-            
-            
-            if self._looks_like_secret(content):
-                redacted = self._redact_string(content)
-                return f"{quote}{redacted}{quote}"
-            return match.group(0)
-        
-        redacted_line = re.sub(quote_pattern, replace_long_string, redacted_line)
-        
-        return redacted_line
-    
+        return self._redact_spans(line, self.scan(line, include_suspicious=False))[0]
+
     def redact_diff(self, diff_content: str) -> str:
-        lines = diff_content.split('\n')
-        redacted_lines = []
-        
-        for line in lines:
-            
-            if line.startswith('+') and not line.startswith('+++'):
-                redacted_lines.append(self.redact_line(line))
-            else:
-                redacted_lines.append(line)
-        
-        return '\n'.join(redacted_lines)
+        """Mask secrets on every line; a removed secret is no less leaked than an added one."""
+        return self.redact_diff_counted(diff_content)[0]
+
+    def redact_diff_counted(self, diff_content: str) -> tuple[str, int]:
+        """Like redact_diff, also returning how many values were masked."""
+        return self._redact_spans(
+            diff_content, self.scan(diff_content, include_suspicious=False)
+        )
+
+    def file_diff_spans(self, file_diff: FileDiff) -> list[list[tuple[int, int]]]:
+        """The (start, end) of each value to mask, per hunk, in offsets into the hunk's text."""
+        return [
+            [(match.start, match.end) for match in self.scan(hunk.text, include_suspicious=False)]
+            for hunk in file_diff.hunks
+        ]
+    
+    def apply_file_diff_spans(
+        self, file_diff: FileDiff, spans: list[list[tuple[int, int]]]
+    ) -> tuple[FileDiff, int]:
+        """Mask the spans file_diff_spans found, e.g. in a worker or an earlier run."""
+        hunks = []
+        count = 0
+        for hunk, hunk_spans in zip(file_diff.hunks, spans):
+            # Only hunks that had something masked get a buffer of their own
+            if hunk_spans:
+                text, redacted = self._redact_spans(
+                    hunk.text, (SecretMatch(start, end, "", True) for start, end in hunk_spans)
+                )
+                hunk = Hunk.from_text(hunk.header, text)
+                count += redacted
+            hunks.append(hunk)
+        if not count:
+            return file_diff, 0
+        return file_diff.with_hunks(hunks), count
     
+    def redact_file_diff(self, file_diff: FileDiff) -> tuple[FileDiff, int]:
+        return self.apply_file_diff_spans(file_diff, self.file_diff_spans(file_diff))
+
     def has_potential_secrets(self, diff_content: str) -> bool:
-        
-        for pattern in self.compiled_patterns:
-            if pattern.search(diff_content):
+        # Known token shapes count anywhere, keyword and entropy heuristics only on added lines
+        for match in self._iter_matches(diff_content, added_only=False, include_suspicious=True):
+            if match.added or match.kind not in ("keyword", "suspicious", "entropy"):
                 return True
-        
-        
-        for line in diff_content.split('\n'):
-            if line.startswith('+') and not line.startswith('+++'):
-                line_lower = line.lower()
-                if any(keyword in line_lower for keyword in self.secret_keywords):
-                    
-                    if re.search(r'["\'][^"\']{30,}["\']', line):
-                        return True
-        
-        return False
\ No newline at end of file
+        return False
+
+
+def redact_file_diffs(
+    file_diffs: list[FileDiff], redactor: Optional[SecretRedactor] = None
+) -> list[tuple[FileDiff, int]]:
+    """Redact a batch of file diffs."""
+    if redactor is None:
+        redactor = SecretRedactor()
+    return [redactor.redact_file_diff(file_diff) for file_diff in file_diffs]
+
+
+def scan_file_diffs(
+    file_diffs: list[FileDiff], redactor: Optional[SecretRedactor] = None
+) -> list[list[list[tuple[int, int]]]]:
+    """Spans to mask in a batch of file diffs; the unit of work sent to a redaction worker.
+    
+    Only the spans travel back, and the caller applies them, so clean files
+    are never pickled twice.
+    """
+    if redactor is None:
+        redactor = SecretRedactor()
+    return [redactor.file_diff_spans(file_diff) for file_diff in file_diffs]
@@ -0,0 +1,200 @@
+import base64
+import marshal
+import mmap
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import tiktoken
+
+# Bump when the on-disk layout changes; old directories are simply ignored
+TOKENIZER_CACHE_VERSION = 1
+DEFAULT_ENCODING = "cl100k_base"
+
+_encodings: dict[str, "tiktoken.Encoding"] = {}
+_loaders: dict[str, threading.Thread] = {}
+_lock = threading.Lock()
+_params_lock = threading.Lock()
+
+
+class TokenizerError(Exception):
+    pass
+
+
+def cache_dir() -> Path:
+    root = os.getenv("EDGE_TOKENIZER_CACHE")
+    if root:
+        base = Path(root)
+    else:
+        base = Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "edgecommit" / "tokenizers"
+    return base / f"v{TOKENIZER_CACHE_VERSION}"
+
+
+def _compiled_path(directory: Path, name: str) -> Path:
+    # marshal's format is tied to the interpreter, so the cache tag is part of the name
+    return directory / f"{name}.{sys.implementation.cache_tag}.marshal"
+
+
+def parse_rank_file(path: Path) -> dict[bytes, int]:
+    ranks = {}
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        for line in iter(data.readline, b""):
+            if not line.strip():
+                continue
+            token, rank = line.split()
+            ranks[base64.b64decode(token)] = int(rank)
+    return ranks
+
+
+def load_compiled_ranks(path: Path) -> dict[bytes, int]:
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return marshal.loads(data)
+
+
+def write_compiled_ranks(path: Path, ranks: dict[bytes, int]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(marshal.dumps(ranks))
+    os.replace(tmp_path, path)
+
+
+def _encoding_params(name: str) -> Optional[tuple[dict, str, Optional[str]]]:
+    """Return tiktoken's constructor kwargs for name plus the rank file URL and hash.
+
+    The constructor is run with the rank loader swapped out so nothing is
+    downloaded; encodings that are not backed by a .tiktoken file return None.
+    """
+    from tiktoken_ext import openai_public
+
+    constructor = openai_public.ENCODING_CONSTRUCTORS.get(name)
+    if constructor is None:
+        return None
+
+    source: dict[str, Optional[str]] = {}
+
+    def capture(blobpath: str, expected_hash: Optional[str] = None) -> dict[bytes, int]:
+        source["url"] = blobpath
+        source["hash"] = expected_hash
+        return {}
+
+    with _params_lock:
+        original = openai_public.load_tiktoken_bpe
+        openai_public.load_tiktoken_bpe = capture
+        try:
+            params = constructor()
+        except Exception:
+            return None
+        finally:
+            openai_public.load_tiktoken_bpe = original
+
+    if "url" not in source:
+        return None
+    return params, source["url"], source["hash"]
+
+
+def _load_ranks(name: str, url: str, expected_hash: Optional[str]) -> dict[bytes, int]:
+    directory = cache_dir()
+    compiled = _compiled_path(directory, name)
+    if compiled.exists():
+        try:
+            return load_compiled_ranks(compiled)
+        except (OSError, ValueError, EOFError, TypeError):
+            pass
+
+    raw = directory / f"{name}.tiktoken"
+    if not raw.exists():
+        from tiktoken.load import read_file_cached
+
+        try:
+            contents = read_file_cached(url, expected_hash)
+        except Exception as e:
+            raise TokenizerError(
+                f"Tokenizer '{name}' is not cached and could not be downloaded ({e}). "
+                f"Copy {url} to {raw} to use it offline."
+            ) from e
+        raw.parent.mkdir(parents=True, exist_ok=True)
+        raw.write_bytes(contents)
+
+    ranks = parse_rank_file(raw)
+    try:
+        write_compiled_ranks(compiled, ranks)
+    except OSError:
+        pass
+    return ranks
+
+
+def _load_encoding(name: str) -> "tiktoken.Encoding":
+    import tiktoken
+
+    found = _encoding_params(name)
+    if found is None:
+        return tiktoken.get_encoding(name)
+
+    params, url, expected_hash = found
+    params["mergeable_ranks"] = _load_ranks(name, url, expected_hash)
+    return tiktoken.Encoding(**params)
+
+
+def register_encoding(name: str, encoding) -> None:
+    with _lock:
+        _encodings[name] = encoding
+
+
+def get_encoding(name: str = DEFAULT_ENCODING):
+    encoding = _encodings.get(name)
+    if encoding is not None:
+        return encoding
+
+    with _lock:
+        loader = _loaders.get(name)
+    if loader is not None:
+        loader.join()
+
+    with _lock:
+        encoding = _encodings.get(name)
+        if encoding is None:
+            encoding = _load_encoding(name)
+            _encodings[name] = encoding
+    return encoding
+
+
+def encoding_name_for_model(model: str) -> str:
+    import tiktoken
+
+    try:
+        return tiktoken.model.encoding_name_for_model(model)
+    except KeyError:
+        return DEFAULT_ENCODING
+    except AttributeError:
+        # tiktoken < 0.7 only exposes the lookup through encoding_for_model
+        return tiktoken.encoding_for_model(model).name
+
+
+def encoding_for_model(model: str):
+    return get_encoding(encoding_name_for_model(model))
+
+
+def preload(name: str = DEFAULT_ENCODING) -> None:
+    """Start loading an encoding in the background so it is ready when first used."""
+    with _lock:
+        if name in _encodings or name in _loaders:
+            return
+        thread = threading.Thread(target=_preload, args=(name,), daemon=True)
+        _loaders[name] = thread
+    thread.start()
+
+
+def _preload(name: str) -> None:
+    try:
+        encoding = _load_encoding(name)
+        with _lock:
+            _encodings.setdefault(name, encoding)
+    except Exception:
+        # get_encoding() retries in the foreground and reports the error there
+        pass
+    finally:
+        with _lock:
+            _loaders.pop(name, None)
@@ -0,0 +1,422 @@
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from importlib.util import find_spec
+from pathlib import Path
+from typing import Any, Optional
+
+from core import git
+from core.analyzer import DiffSummary, FileSummary, SymbolChange
+
+# Bump when requests or replies change shape; a mismatched daemon is not used
+DAEMON_PROTOCOL_VERSION = 1
+
+# Connecting to a live daemon takes microseconds; anything slower means it is wedged
+CONNECT_TIMEOUT = 0.5
+# Upper bound for one generation, model time included
+REQUEST_TIMEOUT = 120.0
+
+DAEMON_MAX_CONNECTIONS = 8
+# Kept well above httpx's 5 s default so the connection outlives the gap between commits
+DAEMON_KEEPALIVE_EXPIRY = 300.0
+
+
+class DaemonError(Exception):
+    pass
+
+
+def socket_path() -> Path:
+    path = os.getenv("EDGE_DAEMON_SOCKET")
+    if path:
+        return Path(path)
+    runtime = os.getenv("XDG_RUNTIME_DIR")
+    if runtime:
+        return Path(runtime) / "edgecommit" / "daemon.sock"
+    return Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "edgecommit" / "daemon.sock"
+
+
+def pooled_http_client():
+    """A keep-alive HTTP client shared by every provider in the daemon, using HTTP/2 if h2 is installed.
+
+    Returns None when openai does not expose its httpx client, in which case
+    each provider falls back to the OpenAI default.
+    """
+    try:
+        import httpx
+        from openai import DefaultHttpxClient
+    except ImportError:
+        return None
+    return DefaultHttpxClient(
+        http2=find_spec("h2") is not None,
+        limits=httpx.Limits(
+            max_connections=DAEMON_MAX_CONNECTIONS,
+            max_keepalive_connections=DAEMON_MAX_CONNECTIONS,
+            keepalive_expiry=DAEMON_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+
+def summary_to_dict(summary: DiffSummary) -> dict[str, Any]:
+    # The packed diff stays in the daemon; the client only displays the rest
+    data = asdict(summary)
+    data["contents"] = ""
+    return data
+
+
+def summary_from_dict(data: dict[str, Any]) -> DiffSummary:
+    return DiffSummary(
+        files=[FileSummary(**file) for file in data["files"]],
+        total_added=data["total_added"],
+        total_removed=data["total_removed"],
+        change_type=data["change_type"],
+        contents=data.get("contents", ""),
+        redactions=data.get("redactions", {}),
+        symbols={
+            path: [SymbolChange(**change) for change in changes]
+            for path, changes in data.get("symbols", {}).items()
+        },
+    )
+
+
+@dataclass
+class DaemonResult:
+    # None when every staged file is ignored
+    summary: Optional[DiffSummary]
+    message: Optional[str] = None
+    # Set when generation failed; the caller falls back to the editor
+    error: Optional[str] = None
+    # (stage, start, end) in seconds from when the daemon received the request
+    timings: list[tuple[str, float, float]] = field(default_factory=list)
+    # The message came from the rule-based generator, not the model
+    heuristic: bool = False
+
+
+class DaemonClient:
+    """One connection to a running `edgecommit daemon`, speaking JSON lines."""
+
+    def __init__(self, sock: socket.socket):
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+
+    @classmethod
+    def connect(cls, path: Optional[Path] = None, timeout: float = CONNECT_TIMEOUT) -> Optional["DaemonClient"]:
+        """Return a client for the daemon listening on path, or None if there is none."""
+        path = path if path is not None else socket_path()
+        if not path.exists():
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        try:
+            sock.connect(str(path))
+        except OSError:
+            sock.close()
+            return None
+        sock.settimeout(REQUEST_TIMEOUT)
+        client = cls(sock)
+        try:
+            reply = client.request("ping")
+        except DaemonError:
+            client.close()
+            return None
+        if reply.get("version") != DAEMON_PROTOCOL_VERSION:
+            client.close()
+            return None
+        return client
+
+    def request(self, op: str, **params: Any) -> dict[str, Any]:
+        try:
+            self._file.write(json.dumps({"op": op, **params}).encode() + b"\n")
+            self._file.flush()
+            line = self._file.readline()
+        except OSError as e:
+            raise DaemonError(f"Daemon connection failed: {e}") from e
+        if not line:
+            raise DaemonError("Daemon closed the connection")
+        try:
+            reply = json.loads(line)
+        except ValueError as e:
+            raise DaemonError(f"Malformed reply from daemon: {e}") from e
+
+        if not reply.get("ok"):
+            error = reply.get("error", "unknown error")
+            kind = reply.get("kind")
+            if kind == "config":
+                raise ValueError(error)
+            if kind == "git":
+                raise git.GitError(error)
+            raise DaemonError(error)
+        return reply
+
+    def generate(self, cwd: str | Path, config) -> DaemonResult:
+        """Filter, redact, pack and generate for the repository at cwd inside the daemon."""
+        reply = self.request(
+            "generate",
+            cwd=str(cwd),
+            # Credentials stay with the daemon's own environment
+            settings=config.model_dump(exclude={"openai_api_key"}),
+        )
+        summary = reply.get("summary")
+        return DaemonResult(
+            summary=summary_from_dict(summary) if summary is not None else None,
+            message=reply.get("message"),
+            error=reply.get("error"),
+            timings=[tuple(stage) for stage in reply.get("timings", [])],
+            heuristic=reply.get("heuristic", False),
+        )
+
+    def shutdown(self) -> None:
+        self.request("shutdown")
+
+    def close(self) -> None:
+        try:
+            self._file.close()
+        finally:
+            self._sock.close()
+
+    def __enter__(self) -> "DaemonClient":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def _stat_key(path: Path) -> Optional[tuple[int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class _CachedFilter:
+    def __init__(self, diff_filter):
+        self.diff_filter = diff_filter
+        self._stats = {diff_filter.ignore_file: _stat_key(diff_filter.ignore_file)}
+
+    def is_current(self) -> bool:
+        # The root ignore file plus every nested one the matcher has looked for.
+        # A nested file is recorded the first time it is checked here, right
+        # after the request in which the matcher read it.
+        matcher = self.diff_filter._matcher
+        nested = matcher.nested_files if matcher is not None else []
+        for path in [self.diff_filter.ignore_file, *nested]:
+            key = _stat_key(path)
+            if self._stats.setdefault(path, key) != key:
+                return False
+        return True
+
+
+class CommitDaemon:
+    """Serves commit message generation with the expensive state kept warm.
+
+    The pooled HTTP client, the provider's tokenizer, the diff tokenizer and
+    each repository's compiled ignore rules survive between requests, so a
+    request from the CLI costs git, packing and model time only.  Ignore
+    rules are rebuilt when any ignore file they were read from changes.
+    """
+
+    def __init__(self, config, idle_timeout: Optional[float] = None):
+        self.config = config
+        self.idle_timeout = idle_timeout if idle_timeout is not None else config.daemon_idle_timeout
+        self.http_client = pooled_http_client()
+        self._providers: dict[tuple, object] = {}
+        self._latency = None
+        self._filters: dict[tuple, _CachedFilter] = {}
+        self._blob_caches: dict[str, object] = {}
+        self._lock = threading.Lock()
+        self._last_request = time.monotonic()
+        self._server: Optional[socketserver.BaseServer] = None
+
+    def _backend(self, name: str, config):
+        from llm import get_provider, load_provider
+        from llm.openai import OpenAIProvider
+
+        options = {}
+        if issubclass(load_provider(name), OpenAIProvider):
+            options["http_client"] = self.http_client
+        return get_provider(name, config, **options)
+
+    def _provider(self, config):
+        from llm.router import build_provider
+
+        key = (
+            config.llm_provider,
+            config.cache_model,
+            config.max_prompt_tokens,
+            config.openai_base_url,
+            config.commit_candidates,
+            config.candidate_timeout,
+            config.fallback_providers,
+            config.hedge_delay,
+        )
+        with self._lock:
+            provider = self._providers.get(key)
+            if provider is None:
+                provider = build_provider(
+                    config, factory=lambda name: self._backend(name, config), stats=self._latency_stats()
+                )
+                self._providers[key] = provider
+        return provider
+
+    def _latency_stats(self):
+        # Shared by every routed provider, so they all learn from each request
+        from llm.router import LatencyStats
+
+        if self._latency is None:
+            self._latency = LatencyStats()
+        return self._latency
+
+    def _diff_filter(self, config, cwd: Path):
+        from core.filters import DiffFilter
+        from core.ignore import IGNORE_FILE_NAME
+
+        key = (str(cwd), config.filter_extra_ignore, config.blob_cache, config.detect_generated)
+        with self._lock:
+            cached = self._filters.get(key)
+            if cached is None or not cached.is_current():
+                blob_cache = self._blob_cache(config, cwd) if config.blob_cache else None
+                cached = _CachedFilter(DiffFilter(config, cwd / IGNORE_FILE_NAME, cache=blob_cache))
+                self._filters[key] = cached
+        return cached.diff_filter
+
+    def _blob_cache(self, config, cwd: Path):
+        # One connection per repository, kept across rebuilt filters; callers hold self._lock
+        from core.blobcache import BlobCache
+
+        blob_cache = self._blob_caches.get(str(cwd))
+        if blob_cache is None:
+            blob_cache = BlobCache(cwd=cwd, max_entries=config.blob_cache_max_entries)
+            self._blob_caches[str(cwd)] = blob_cache
+        return blob_cache
+
+    def warm_up(self) -> None:
+        """Load the tokenizers and connect to the API before the first request arrives."""
+        from core import tokenizer
+
+        tokenizer.preload()
+        try:
+            self._provider(self.config).warm_up()
+        except ValueError:
+            # No API key yet; every generate request reports it
+            pass
+
+    def handle(self, request: dict[str, Any]) -> dict[str, Any]:
+        self._last_request = time.monotonic()
+        op = request.get("op")
+        try:
+            if op == "ping":
+                return {"ok": True, "version": DAEMON_PROTOCOL_VERSION, "pid": os.getpid()}
+            if op == "generate":
+                return self.generate(Path(request["cwd"]), request.get("settings", {}))
+            if op == "shutdown":
+                self.shutdown()
+                return {"ok": True}
+            return {"ok": False, "kind": "protocol", "error": f"Unknown request: {op!r}"}
+        except git.GitError as e:
+            return {"ok": False, "kind": "git", "error": str(e)}
+        except ValueError as e:
+            return {"ok": False, "kind": "config", "error": str(e)}
+        except Exception as e:
+            return {"ok": False, "kind": "internal", "error": f"{type(e).__name__}: {e}"}
+
+    def generate(self, cwd: Path, settings: dict[str, Any]) -> dict[str, Any]:
+        from core.pipeline import PipelineTimings, generate_message
+
+        config = self.config.model_copy(update=settings)
+        timings = PipelineTimings()
+        diff_filter = self._diff_filter(config, cwd)
+
+        with git.StagedDiffStream(cwd=cwd) as stream:
+            # The pooled connection is already warm
+            generation = generate_message(
+                stream, config, diff_filter, lambda: self._provider(config), timings, cwd, warm_up=False
+            )
+        if generation.summary is None:
+            return {"ok": True, "summary": None}
+
+        summary = generation.summary
+        reply: dict[str, Any] = {"ok": True}
+        if generation.message is None:
+            reply["error"] = str(generation.error)
+        else:
+            reply["message"] = generation.message
+            if generation.heuristic:
+                reply["heuristic"] = True
+
+        reply["summary"] = summary_to_dict(summary)
+        reply["timings"] = [(s.name, s.start, s.end) for s in timings.stages]
+        return reply
+
+    def _watch_idle(self, server: socketserver.BaseServer) -> None:
+        while self._server is server:
+            time.sleep(min(1.0, self.idle_timeout))
+            if time.monotonic() - self._last_request > self.idle_timeout:
+                self.shutdown()
+                return
+
+    def shutdown(self) -> None:
+        server = self._server
+        if server is not None:
+            self._server = None
+            # shutdown() waits for serve_forever(), so it must not run on its thread
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+    def serve(self, path: Optional[Path] = None, ready: Optional[threading.Event] = None) -> None:
+        """Listen on path until shut down or idle for idle_timeout seconds."""
+        path = path if path is not None else socket_path()
+        server = _bind(path, self)
+        self._server = server
+        threading.Thread(target=self.warm_up, daemon=True).start()
+        if self.idle_timeout > 0:
+            threading.Thread(target=self._watch_idle, args=(server,), daemon=True).start()
+        if ready is not None:
+            ready.set()
+        try:
+            server.serve_forever(poll_interval=0.1)
+        finally:
+            server.server_close()
+            try:
+                path.unlink()
+            except OSError:
+                pass
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                reply = {"ok": False, "kind": "protocol", "error": "Malformed request"}
+            else:
+                reply = self.server.commit_daemon.handle(request)
+            self.wfile.write(json.dumps(reply).encode() + b"\n")
+            self.wfile.flush()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def _bind(path: Path, commit_daemon: CommitDaemon) -> _Server:
+    if path.exists():
+        client = DaemonClient.connect(path)
+        if client is not None:
+            client.close()
+            raise DaemonError(f"A daemon is already listening on {path}")
+        # Left behind by a daemon that did not exit cleanly
+        path.unlink()
+
+    path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    # Only the owner may connect: requests run git in any directory they name
+    umask = os.umask(0o177)
+    try:
+        server = _Server(str(path), _Handler)
+    finally:
+        os.umask(umask)
+    server.commit_daemon = commit_daemon
+    return server
@@ -1,16 +1,47 @@
-from typing import Protocol
+from functools import lru_cache
+from importlib import import_module
+from importlib.metadata import entry_points
 
 from config import Config
-from llm.openai import OpenAIProvider
+from llm.base import BaseLLMProvider
 
+ENTRY_POINT_GROUP = "edgecommit.providers"
 
-class LLMProvider(Protocol):
-    def generate_commit(self, diff_summary: dict) -> str:
-        ...
+# Shipped providers, as "module:class"; imported only when selected
+BUILTIN_PROVIDERS = {
+    "openai": "llm.openai:OpenAIProvider",
+    "local": "llm.local:LocalProvider",
+}
 
+# Kept for callers that typed against the old protocol
+LLMProvider = BaseLLMProvider
 
-def get_provider(provider_name: str, config: Config) -> LLMProvider:
-    if provider_name == "openai":
-        return OpenAIProvider(config)
-    else:
-        raise ValueError(f"Unknown provider: {provider_name}")
\ No newline at end of file
+
+@lru_cache(maxsize=None)
+def available_providers() -> dict[str, str]:
+    """Every provider name mapped to its "module:class", built-ins first."""
+    providers = dict(BUILTIN_PROVIDERS)
+    for entry_point in entry_points(group=ENTRY_POINT_GROUP):
+        # A plugin cannot replace a built-in under the same name
+        providers.setdefault(entry_point.name, entry_point.value)
+    return providers
+
+
+def load_provider(provider_name: str) -> type[BaseLLMProvider]:
+    target = available_providers().get(provider_name)
+    if target is None:
+        known = ", ".join(sorted(available_providers()))
+        raise ValueError(f"Unknown provider: {provider_name} (available: {known})")
+
+    module_name, _, attribute = target.partition(":")
+    provider_class = import_module(module_name)
+    for part in attribute.split("."):
+        provider_class = getattr(provider_class, part)
+
+    if not (isinstance(provider_class, type) and issubclass(provider_class, BaseLLMProvider)):
+        raise ValueError(f"Provider {provider_name} ({target}) is not a BaseLLMProvider subclass")
+    return provider_class
+
+
+def get_provider(provider_name: str, config: Config, **options) -> BaseLLMProvider:
+    return load_provider(provider_name)(config, **options)
@@ -1,35 +1,27 @@
 from abc import ABC, abstractmethod
+from typing import Callable, Optional
 
-from core.analyzer import DiffSummary
+from core.analyzer import DiffSummary, build_prompt
 
 
 class BaseLLMProvider(ABC):
-    def __init__(self, config):
-        self.config = config
-    
-    @abstractmethod
-    def generate_commit(self, diff_summary: DiffSummary) -> str:
-        pass
-    
-    def _create_prompt(self, diff_summary: DiffSummary) -> str:
-        return f"""Generate a conventional commit message for the following changes:
+    """Contract every commit message provider implements.
 
-Change Type: {diff_summary.change_type}
-Files Changed: {diff_summary.stats.files_changed}
-Insertions: {diff_summary.stats.insertions}
-Deletions: {diff_summary.stats.deletions}
+    Providers are constructed with the Config only, may raise ValueError
+    there when they are not configured, and are looked up by name through
+    llm.get_provider.  Third-party providers register a subclass under the
+    "edgecommit.providers" entry point group.
+    """
 
-Primary Changes:
-{chr(10).join(f"- {change}" for change in diff_summary.primary_changes)}
+    def __init__(self, config):
+        self.config = config
 
-Modified Files:
-{chr(10).join(f"- {f.path} (+{f.additions}/-{f.deletions})" for f in diff_summary.files[:10])}
+    @abstractmethod
+    def generate_commit(self, diff_summary: DiffSummary, on_update: Optional[Callable] = None) -> str:
+        """Return a commit message; on_update, if the provider streams, gets the partial reply."""
 
-Generate a commit message following the Conventional Commits specification:
-- Format: <type>(<scope>): <subject>
-- Body: 2-3 lines explaining what and why (not how)
-- Types: feat, fix, docs, style, refactor, perf, test, chore
-- Keep subject under 50 characters
-- Use imperative mood
+    def warm_up(self) -> None:
+        """Prepare anything slow (tokenizers, connections) before the prompt is ready."""
 
-Return ONLY the commit message, no explanations."""
\ No newline at end of file
+    def _create_prompt(self, diff_summary: DiffSummary) -> str:
+        return build_prompt(diff_summary)
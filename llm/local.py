@@ -0,0 +1,21 @@
+from typing import Optional
+
+from config import Config
+from llm.openai import OpenAIProvider
+
+
+class LocalProvider(OpenAIProvider):
+    """An OpenAI-compatible server on this machine, such as llama.cpp's llama-server.
+
+    Requests never leave the host, so there is no WAN round-trip and no API
+    key; EDGE_LOCAL_API_KEY is only sent if the server was started with one.
+    """
+
+    def __init__(self, config: Config, http_client: Optional[object] = None):
+        super().__init__(
+            config,
+            http_client,
+            api_key=config.local_api_key or "local",
+            model=config.local_model,
+            base_url=config.local_base_url,
+        )
@@ -1,20 +1,130 @@
 import os
-from typing import Optional
+import queue
+import re
+import threading
+import time
+from typing import Callable, Optional
 
 from config import Config
-from core.analyzer import DiffSummary, build_prompt
-import tiktoken
+from core import tokenizer
+from core.analyzer import (
+    MAX_PROMPT_FILES,
+    PROMPT_FOOTER,
+    DiffSummary,
+    FileSummary,
+    build_prompt,
+    prompt_body,
+    prompt_file_line,
+    prompt_header,
+    prompt_other_files_line,
+    prompt_symbols,
+)
+from llm.base import BaseLLMProvider
 
-class OpenAIProvider:
+MAX_SUBJECT_LENGTH = 72
+MAX_MESSAGE_LINES = 4
+
+# <type>[(scope)][!]: <description>, with the types the prompt asks for
+_CONVENTIONAL_SUBJECT = re.compile(
+    r"(?:feat|fix|docs|style|refactor|perf|test|build|ci|chore|revert)"
+    r"(?:\([\w$.\-/* ]+\))?!?: \S.*"
+)
+
+SYSTEM_PROMPT = (
+    "You are a git commit message generator. Generate concise, "
+    "clear commit messages following Conventional Commits specification. "
+    "Return only the commit message, no explanations or markdown."
+)
+
+
+def _message_lines(message: str) -> list[str]:
+    lines = [line.strip('`').strip() for line in message.split('\n')]
+    while lines and not lines[0]:
+        lines.pop(0)
+    return lines
+
+
+def _truncate_subject(subject: str) -> str:
+    if len(subject) > MAX_SUBJECT_LENGTH:
+        return subject[:MAX_SUBJECT_LENGTH - 3] + "..."
+    return subject
+
+
+def clean_commit_message(message: str) -> str:
+    lines = _message_lines(message)
+    while lines and not lines[-1]:
+        lines.pop()
+    
+    if not lines:
+        return "chore: update files"
+    
+    lines[0] = _truncate_subject(lines[0])
+    return '\n'.join(lines[:MAX_MESSAGE_LINES])
+
+
+def is_conventional_commit(message: str) -> bool:
+    """Whether message follows the Conventional Commits layout and our subject limit."""
+    lines = _message_lines(message)
+    while lines and not lines[-1]:
+        lines.pop()
+    if not lines or len(lines[0]) > MAX_SUBJECT_LENGTH:
+        return False
+    if not _CONVENTIONAL_SUBJECT.fullmatch(lines[0]):
+        return False
+    # A body must be separated from the subject by a blank line
+    return len(lines) == 1 or not lines[1]
+
+
+class StreamedMessage:
+    """A commit message assembled from streamed deltas.
     
-    def __init__(self, config: Config):
-        self.config = config
-        self.api_key = config.openai_api_key or os.getenv("OPENAI_API_KEY")
+    The cleaning rules are applied to the text received so far, so the
+    subject can be shown while it is still arriving and the stream can be
+    dropped as soon as the line cap makes the rest of the reply irrelevant.
+    """
+    
+    def __init__(self):
+        self.text = ""
+    
+    def feed(self, delta: str) -> bool:
+        """Add delta; return False once later text can no longer change the message."""
+        self.text += delta
+        # A line after the last kept one has started, so every kept line is final
+        return len(_message_lines(self.text)) <= MAX_MESSAGE_LINES
+    
+    @property
+    def subject(self) -> str:
+        lines = _message_lines(self.text)
+        return _truncate_subject(lines[0]) if lines else ""
+    
+    @property
+    def message(self) -> str:
+        return clean_commit_message(self.text)
+
+
+class OpenAIProvider(BaseLLMProvider):
+    
+    def __init__(
+        self,
+        config: Config,
+        http_client: Optional[object] = None,
+        *,
+        api_key: Optional[str] = None,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+    ):
+        super().__init__(config)
+        # A shared, pooled HTTP client; the OpenAI default is used when None
+        self.http_client = http_client
+        self.model = model or config.openai_model
+        self.base_url = base_url or config.openai_base_url
+        self.api_key = api_key or config.openai_api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OpenAI API key not found. Set OPENAI_API_KEY environment variable.")
         
         self._client: Optional[object] = None
         self._encoder: Optional[object] = None
+        self._segment_tokens: dict[str, int] = {}
     
     @property
     def client(self):
@@ -24,94 +134,135 @@ class OpenAIProvider:
             except ImportError as e:
                 raise ImportError("OpenAI package not installed. Run: pip install openai") from e
             
-            self._client = OpenAI(api_key=self.api_key)
+            options = {}
+            if self.base_url:
+                options["base_url"] = self.base_url
+            if self.http_client is not None:
+                options["http_client"] = self.http_client
+            self._client = OpenAI(api_key=self.api_key, **options)
         return self._client
     
     @property
     def encoder(self):
         if self._encoder is None:            
-            self._encoder = tiktoken.encoding_for_model(self.config.openai_model)
+            self._encoder = tokenizer.encoding_for_model(self.model)
         return self._encoder
     
+    def warm_up(self) -> None:
+        """Load the encoder and open the API connection before the prompt is ready."""
+        self.encoder
+        try:
+            # A cheap authenticated request; the connection stays in the client's pool
+            self.client.models.retrieve(self.model)
+        except Exception:
+            # Any real problem is reported by the completion request itself
+            pass
+    
     def count_tokens(self, text: str) -> int:
         return len(self.encoder.encode(text))
     
+    def count_segment_tokens(self, segment: str) -> int:
+        count = self._segment_tokens.get(segment)
+        if count is None:
+            count = self.count_tokens(segment)
+            self._segment_tokens[segment] = count
+        return count
+    
     def _trim_files_for_token_limit(self, summary: DiffSummary) -> DiffSummary:
-        prompt = build_prompt(summary)
-        
-        if self.count_tokens(prompt) <= self.config.max_prompt_tokens:
+        limit = self.config.max_prompt_tokens
+        if self.count_tokens(build_prompt(summary)) <= limit:
             return summary
         
-        
         sorted_files = sorted(
             summary.files, 
             key=lambda f: f.added + f.removed, 
             reverse=True
         )
         
+        # The prompt is header + diff body + one line per listed file + footer.
+        # With each segment's tokens counted once, the cost of keeping the top k
+        # files is a prefix sum, so the fit is a single linear pass.
+        fixed = (
+            self.count_segment_tokens(prompt_symbols(summary.symbols))
+            + self.count_segment_tokens(prompt_body(summary.contents))
+            + self.count_segment_tokens(PROMPT_FOOTER)
+        )
+        significant_count = 0
+        listed_tokens = 0
+        added = removed = 0
+        fitting = []
         
-        left, right = 1, len(sorted_files)
-        best_files = sorted_files[:1]  
-        
-        while left <= right:
-            mid = (left + right) // 2
-            test_files = sorted_files[:mid]
+        for k, file in enumerate(sorted_files, start=1):
+            added += file.added
+            removed += file.removed
+            if file.added + file.removed > 5:
+                significant_count += 1
+                if significant_count <= MAX_PROMPT_FILES:
+                    listed_tokens += self.count_segment_tokens(prompt_file_line(file))
             
-            test_summary = DiffSummary(
-                files=test_files,
-                total_added=sum(f.added for f in test_files),
-                total_removed=sum(f.removed for f in test_files),
-                change_type=summary.change_type
+            total = (
+                fixed
+                + listed_tokens
+                + self.count_tokens(prompt_header(summary.change_type, k, added, removed))
+                + self.count_tokens(prompt_other_files_line(k - significant_count))
             )
-            
-            test_prompt = build_prompt(test_summary)
-            
-            if self.count_tokens(test_prompt) <= self.config.max_prompt_tokens:
-                best_files = test_files
-                left = mid + 1
-            else:
-                right = mid - 1
+            if total <= limit:
+                fitting.append(k)
         
+        # Segment sums can differ from encoding the joined prompt by a token at the
+        # boundaries, so confirm the best candidates against the real prompt.
+        for k in reversed(fitting):
+            trimmed = self._summary_with_files(summary, sorted_files[:k])
+            if self.count_tokens(build_prompt(trimmed)) <= limit:
+                return trimmed
         
+        return self._summary_with_files(summary, sorted_files[:1])
+    
+    @staticmethod
+    def _summary_with_files(summary: DiffSummary, files: list[FileSummary]) -> DiffSummary:
         return DiffSummary(
-            files=best_files,
-            total_added=sum(f.added for f in best_files),
-            total_removed=sum(f.removed for f in best_files),
-            change_type=summary.change_type
+            files=files,
+            total_added=sum(f.added for f in files),
+            total_removed=sum(f.removed for f in files),
+            change_type=summary.change_type,
+            contents=summary.contents,
+            redactions=summary.redactions,
+            symbols=summary.symbols,
         )
     
-    def generate_commit(self, summary: DiffSummary) -> str:
+    def _messages(self, prompt: str) -> list[dict[str, str]]:
+        return [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt},
+        ]
+    
+    def generate_commit(
+        self,
+        summary: DiffSummary,
+        on_update: Optional[Callable[[StreamedMessage], None]] = None,
+    ) -> str:
+        """Generate a message; with on_update, stream the reply and report it as it grows."""
         
         trimmed_summary = self._trim_files_for_token_limit(summary)
         
         
-        prompt = build_prompt(trimmed_summary)
+        prompt = self._create_prompt(trimmed_summary)
         
         
         token_count = self.count_tokens(prompt)
         if token_count > self.config.max_prompt_tokens:
             raise RuntimeError(f"Prompt still too long: {token_count} tokens > {self.config.max_prompt_tokens}")
         
-        # Print the prompt before submitting to LLM
-        print("\n" + "="*50)
-        print("PROMPT BEING SENT TO LLM:")
-        print("="*50)
-        print(prompt)
-        print("="*50 + "\n")
-        os._exit(1)
-        
         try:
+            if self.config.commit_candidates > 1:
+                return self._race_commits(prompt, self.config.commit_candidates, self.config.candidate_timeout)
+            
+            if on_update is not None:
+                return self._stream_commit(prompt, on_update)
+            
             response = self.client.chat.completions.create(
-                model=self.config.openai_model,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "You are a git commit message generator. Generate concise, "
-                        "clear commit messages following Conventional Commits specification. "
-                        "Return only the commit message, no explanations or markdown."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
+                model=self.model,
+                messages=self._messages(prompt),
                 temperature=0.7,
                 max_tokens=300,  
             )
@@ -129,27 +280,92 @@ class OpenAIProvider:
         except Exception as e:
             raise RuntimeError(f"Failed to generate commit message: {str(e)}") from e
     
-    def _clean_commit_message(self, message: str) -> str:
-        lines = message.split('\n')
-        
-        
-        lines = [line.strip('`').strip() for line in lines]
-        
-        
-        while lines and not lines[0].strip():
-            lines.pop(0)
-        while lines and not lines[-1].strip():
-            lines.pop()
-        
-        if not lines:
-            return "chore: update files"
-        
-        
-        if len(lines[0]) > 72:
-            lines[0] = lines[0][:69] + "..."
+    def _stream_completion(
+        self,
+        prompt: str,
+        on_update: Optional[Callable[[StreamedMessage], None]] = None,
+        stop: Optional[threading.Event] = None,
+        timeout: Optional[float] = None,
+    ) -> StreamedMessage:
+        streamed = StreamedMessage()
+        options = {"timeout": timeout} if timeout is not None else {}
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(prompt),
+            temperature=0.7,
+            max_tokens=300,
+            stream=True,
+            **options,
+        )
+        try:
+            for chunk in stream:
+                if stop is not None and stop.is_set():
+                    break
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                wanted = streamed.feed(delta)
+                if on_update is not None:
+                    on_update(streamed)
+                if not wanted:
+                    break
+        finally:
+            # Closing the response mid-stream stops the generation server-side
+            stream.close()
+        return streamed
+    
+    def _stream_commit(self, prompt: str, on_update: Callable[[StreamedMessage], None]) -> str:
+        streamed = self._stream_completion(prompt, on_update)
+        if not streamed.text.strip():
+            raise ValueError("Empty response from OpenAI")
+        return streamed.message
+    
+    def _candidate(self, prompt: str, stop: threading.Event, timeout: float, results: "queue.Queue") -> None:
+        try:
+            streamed = self._stream_completion(prompt, stop=stop, timeout=timeout)
+            if not streamed.text.strip():
+                raise ValueError("Empty response from OpenAI")
+            results.put((streamed.message, is_conventional_commit(streamed.text), None))
+        except Exception as e:
+            results.put((None, False, e))
+    
+    def _race_commits(self, prompt: str, count: int, timeout: float) -> str:
+        """Request count candidates at once and return the first valid Conventional Commit.
         
+        The remaining requests are dropped as soon as one is accepted.  If every
+        candidate that finishes in time is invalid, the first of them is used.
+        """
+        results: "queue.Queue[tuple[Optional[str], bool, Optional[Exception]]]" = queue.Queue()
+        stop = threading.Event()
+        for _ in range(count):
+            # Daemon threads: losing requests must not hold up the process
+            threading.Thread(target=self._candidate, args=(prompt, stop, timeout, results), daemon=True).start()
         
-        if len(lines) > 4:  
-            lines = lines[:4]
+        deadline = time.monotonic() + timeout
+        first_invalid = None
+        first_error = None
+        try:
+            for _ in range(count):
+                try:
+                    message, valid, error = results.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if valid:
+                    return message
+                if message is not None and first_invalid is None:
+                    first_invalid = message
+                if error is not None and first_error is None:
+                    first_error = error
+        finally:
+            stop.set()
         
-        return '\n'.join(lines)
\ No newline at end of file
+        if first_invalid is not None:
+            return first_invalid
+        if first_error is not None:
+            raise first_error
+        raise TimeoutError(f"No candidate commit message within {timeout:g}s")
+    
+    def _clean_commit_message(self, message: str) -> str:
+        return clean_commit_message(message)
@@ -0,0 +1,269 @@
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from config import Config
+from core.analyzer import DiffSummary
+from llm import get_provider
+from llm.base import BaseLLMProvider
+
+STATE_VERSION = 1
+# Completions remembered per backend; the percentiles move with this window
+LATENCY_WINDOW = 50
+# Fewer samples than this and a backend's percentiles are not trusted
+MIN_SAMPLES = 5
+# Seconds a backend that just failed is tried only after the healthy ones
+FAILURE_COOLDOWN = 5 * 60
+
+
+def state_path() -> Path:
+    path = os.getenv("EDGE_LATENCY_STATE")
+    if path:
+        return Path(path)
+    return Path(os.getenv("XDG_CACHE_HOME", Path.home() / ".cache")) / "edgecommit" / "latency.json"
+
+
+def _percentile(samples: list[float], fraction: float) -> float:
+    # Nearest rank, so the result is always a latency that was observed
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class LatencyStats:
+    """Recent completion latencies and failures per backend, kept in a small JSON file.
+
+    Backends are named "provider:model".  Each keeps its last LATENCY_WINDOW
+    successful latencies, from which p50 and p95 are read, and the time and
+    number of its consecutive failures.  Saving is best effort: the file only
+    makes the next run's routing better informed.
+    """
+
+    def __init__(self, path: Optional[str | Path] = None, window: int = LATENCY_WINDOW):
+        self.path = Path(path) if path is not None else state_path()
+        self.window = window
+        self._backends: dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self.load()
+
+    def load(self) -> None:
+        try:
+            state = json.loads(self.path.read_text())
+            backends = state["backends"] if state.get("version") == STATE_VERSION else {}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            backends = {}
+
+        loaded = {}
+        for name, entry in backends.items():
+            try:
+                loaded[name] = {
+                    "samples": [float(s) for s in entry.get("samples", [])][-self.window:],
+                    "failures": int(entry.get("failures", 0)),
+                    "failed_at": float(entry.get("failed_at", 0.0)),
+                }
+            except (ValueError, TypeError, AttributeError):
+                continue
+        with self._lock:
+            self._backends = loaded
+
+    def save(self) -> None:
+        with self._lock:
+            data = json.dumps({"version": STATE_VERSION, "backends": self._backends})
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(data)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+    def _entry(self, backend: str) -> dict:
+        return self._backends.setdefault(backend, {"samples": [], "failures": 0, "failed_at": 0.0})
+
+    def record_success(self, backend: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._entry(backend)
+            entry["samples"] = (entry["samples"] + [round(seconds, 4)])[-self.window:]
+            entry["failures"] = 0
+
+    def record_failure(self, backend: str) -> None:
+        with self._lock:
+            entry = self._entry(backend)
+            entry["failures"] += 1
+            entry["failed_at"] = time.time()
+
+    def samples(self, backend: str) -> list[float]:
+        with self._lock:
+            return list(self._backends.get(backend, {}).get("samples", ()))
+
+    def percentile(self, backend: str, fraction: float) -> Optional[float]:
+        """The latency below which fraction of recent completions finished; None without enough samples."""
+        samples = self.samples(backend)
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return _percentile(samples, fraction)
+
+    def p50(self, backend: str) -> Optional[float]:
+        return self.percentile(backend, 0.50)
+
+    def p95(self, backend: str) -> Optional[float]:
+        return self.percentile(backend, 0.95)
+
+    def healthy(self, backend: str) -> bool:
+        with self._lock:
+            entry = self._backends.get(backend)
+            if entry is None or not entry["failures"]:
+                return True
+            return time.time() - entry["failed_at"] >= FAILURE_COOLDOWN
+
+
+class RoutingProvider(BaseLLMProvider):
+    """Sends each request to the fastest healthy backend and hedges slow ones.
+
+    Backends are ranked healthy first, then by p50 latency; backends without
+    enough samples keep their configured order after the measured ones.  The
+    first backend gets the request alone.  If it fails, or is still running
+    when its p95 (config.hedge_delay before there are enough samples) has
+    passed, the next backend gets a duplicate, and so on down the chain.  The
+    first message to arrive is returned and the requests still running are
+    abandoned.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        names: list[str],
+        factory: Optional[Callable[[str], BaseLLMProvider]] = None,
+        stats: Optional[LatencyStats] = None,
+    ):
+        super().__init__(config)
+        if factory is None:
+            factory = lambda name: get_provider(name, config)
+        self.stats = stats if stats is not None else LatencyStats()
+
+        # A backend that is not configured (no API key, say) is left out of the chain
+        self.backends: list[tuple[str, BaseLLMProvider]] = []
+        error = None
+        for name in names:
+            try:
+                provider = factory(name)
+            except ValueError as e:
+                error = error or e
+                continue
+            self.backends.append((backend_name(name, provider), provider))
+        if not self.backends:
+            raise error or ValueError("No LLM providers configured")
+
+    def ranked(self) -> list[tuple[str, BaseLLMProvider]]:
+        """The backends in the order they will be tried."""
+        def rank(backend):
+            name = backend[0]
+            p50 = self.stats.p50(name)
+            return (not self.stats.healthy(name), p50 is None, p50 or 0.0)
+
+        # sorted is stable, so unmeasured backends stay in configured order
+        return sorted(self.backends, key=rank)
+
+    def hedge_delay(self, backend: str) -> float:
+        p95 = self.stats.p95(backend)
+        return p95 if p95 is not None else self.config.hedge_delay
+
+    def warm_up(self) -> None:
+        for name, provider in self.ranked():
+            if self.stats.healthy(name):
+                provider.warm_up()
+
+    def _attempt(self, name, provider, summary, on_update, results: "queue.Queue") -> None:
+        start = time.monotonic()
+        try:
+            message = provider.generate_commit(summary, on_update=on_update)
+        except Exception as e:
+            self.stats.record_failure(name)
+            results.put((name, None, e))
+            return
+        self.stats.record_success(name, time.monotonic() - start)
+        results.put((name, message, None))
+
+    def generate_commit(self, diff_summary: DiffSummary, on_update: Optional[Callable] = None) -> str:
+        backends = self.ranked()
+        results: "queue.Queue[tuple[str, Optional[str], Optional[Exception]]]" = queue.Queue()
+        # Only one backend at a time reports progress, so hedges do not interleave
+        shown: list[str] = []
+        shown_lock = threading.Lock()
+        done = threading.Event()
+
+        def reporter(name):
+            if on_update is None:
+                return None
+
+            def report(streamed):
+                with shown_lock:
+                    if done.is_set():
+                        return
+                    if not shown:
+                        shown.append(name)
+                    if shown[0] == name:
+                        on_update(streamed)
+            return report
+
+        def launch(index):
+            name, provider = backends[index]
+            # Daemon threads: abandoned requests must not hold up the process
+            threading.Thread(
+                target=self._attempt,
+                args=(name, provider, diff_summary, reporter(name), results),
+                daemon=True,
+            ).start()
+
+        launch(0)
+        launched = 1
+        pending = 1
+        errors = []
+        try:
+            while pending:
+                wait = self.hedge_delay(backends[launched - 1][0]) if launched < len(backends) else None
+                try:
+                    name, message, error = results.get(timeout=wait)
+                except queue.Empty:
+                    # The latest backend is slower than it usually is; hedge with the next one
+                    launch(launched)
+                    launched += 1
+                    pending += 1
+                    continue
+
+                pending -= 1
+                if error is None:
+                    return message
+                errors.append(f"{name}: {error}")
+                with shown_lock:
+                    if shown and shown[0] == name:
+                        shown.clear()
+                if launched < len(backends):
+                    launch(launched)
+                    launched += 1
+                    pending += 1
+        finally:
+            done.set()
+            self.stats.save()
+
+        raise RuntimeError("Every provider failed: " + "; ".join(errors))
+
+
+def backend_name(provider_name: str, provider: BaseLLMProvider) -> str:
+    model = getattr(provider, "model", None)
+    return f"{provider_name}:{model}" if model else provider_name
+
+
+def build_provider(
+    config: Config,
+    factory: Optional[Callable[[str], BaseLLMProvider]] = None,
+    stats: Optional[LatencyStats] = None,
+) -> BaseLLMProvider:
+    """The configured provider, behind a RoutingProvider when fallbacks are configured."""
+    names = config.provider_chain
+    if len(names) == 1:
+        return factory(names[0]) if factory is not None else get_provider(names[0], config)
+    return RoutingProvider(config, names, factory=factory, stats=stats)
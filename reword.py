@@ -0,0 +1,285 @@
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, Optional
+
+from core import git
+from core.analyzer import DiffSummary
+
+# Commits analyzed at once; git, the tokenizer and the parser pools do the heavy lifting
+MAX_ANALYSIS_WORKERS = 8
+# First pause after a rate-limited call, doubled for each refusal in a row
+RATE_LIMIT_BASE_DELAY = 1.0
+RATE_LIMIT_MAX_DELAY = 60.0
+
+
+class RewordError(Exception):
+    pass
+
+
+def resolve_range(revision_range: str) -> str:
+    """A single revision means every commit after it up to HEAD, as with `git rebase -i`."""
+    return revision_range if ".." in revision_range else f"{revision_range}..HEAD"
+
+
+def _error_chain(error: Optional[BaseException]) -> Iterable[BaseException]:
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether error, or one it was raised from, is the API refusing a call over its rate limit."""
+    for cause in _error_chain(error):
+        if getattr(cause, "status_code", None) == 429 or type(cause).__name__ == "RateLimitError":
+            return True
+        if "rate limit" in str(cause).lower():
+            return True
+    return False
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the API asked to wait in its Retry-After header, if it did."""
+    for cause in _error_chain(error):
+        headers = getattr(getattr(cause, "response", None), "headers", None)
+        if headers is None:
+            continue
+        try:
+            return max(0.0, float(headers.get("retry-after")))
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+class RateLimitBackoff:
+    """Retries rate-limited calls that share one API quota.
+
+    A refusal pauses every caller, not only the one refused, since the others
+    would be refused too.  The pause is what the API asked for or, without a
+    Retry-After header, doubles with each refusal in a row; a success resets it.
+    """
+
+    def __init__(
+        self,
+        max_retries: int,
+        base_delay: float = RATE_LIMIT_BASE_DELAY,
+        max_delay: float = RATE_LIMIT_MAX_DELAY,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+        self._refusals = 0
+
+    def wait(self) -> None:
+        while True:
+            with self._lock:
+                delay = self._resume_at - self._clock()
+            if delay <= 0:
+                return
+            self._sleep(delay)
+
+    def refused(self, error: BaseException) -> float:
+        with self._lock:
+            self._refusals += 1
+            delay = retry_after(error)
+            if delay is None:
+                delay = min(self.max_delay, self.base_delay * 2 ** (self._refusals - 1))
+                # Jitter, so paused callers do not all retry at the same instant
+                delay *= random.uniform(1.0, 1.25)
+            self._resume_at = max(self._resume_at, self._clock() + delay)
+            return delay
+
+    def succeeded(self) -> None:
+        with self._lock:
+            self._refusals = 0
+
+    def call(self, function: Callable[..., Any], *args: Any) -> Any:
+        for attempt in range(self.max_retries + 1):
+            self.wait()
+            try:
+                result = function(*args)
+            except Exception as e:
+                if attempt == self.max_retries or not is_rate_limited(e):
+                    raise
+                self.refused(e)
+                continue
+            self.succeeded()
+            return result
+
+
+@dataclass
+class RewordResult:
+    commit: git.CommitDiff
+    summary: Optional[DiffSummary] = None
+    # None keeps the commit's own message
+    message: Optional[str] = None
+    heuristic: bool = False
+    error: Optional[str] = None
+
+
+class CommitReworder:
+    """Generates a message for every commit of a range in one pass.
+
+    Commits are read from one `git log` stream, and the whole range is
+    checked to be a chain before any work starts.  Each commit is then
+    analyzed in a pool of threads and handed straight to a second pool that
+    calls the model, at most config.reword_concurrency calls at a time and
+    backing off together when the API rate-limits them.
+    """
+
+    def __init__(
+        self,
+        config,
+        llm,
+        diff_filter,
+        cwd: Optional[Path] = None,
+        backoff: Optional[RateLimitBackoff] = None,
+        on_result: Optional[Callable[[RewordResult], None]] = None,
+    ):
+        from core.entropy import EntropyDetector
+        from core.redaction import SecretRedactor
+
+        self.config = config
+        self.llm = llm
+        self.diff_filter = diff_filter
+        self.cwd = cwd
+        self.backoff = backoff if backoff is not None else RateLimitBackoff(config.reword_max_retries)
+        self.on_result = on_result
+        self.redactor = SecretRedactor(EntropyDetector.from_config(config))
+
+    def _heuristic(self, summary: DiffSummary) -> Optional[str]:
+        from core import analyzer
+
+        threshold = self.config.heuristic_threshold
+        if threshold is None:
+            return None
+        guess = analyzer.heuristic_commit(summary, threshold)
+        return guess.message if guess is not None else None
+
+    def analyze(self, commit: git.CommitDiff) -> RewordResult:
+        """Filter, redact and pack one commit's diff; a rule-based message if one is confident enough."""
+        from core import analyzer
+        from core.filters import MAX_PATCH_TOKENS
+        from core.pipeline import run_pipeline
+
+        result = RewordResult(commit)
+        diff_filter = self.diff_filter
+        filtered = [stat for stat in commit.numstats if not diff_filter.should_skip_file(stat.file_path)]
+        generated = diff_filter.find_generated_files(filtered, self.cwd, commit.oid) if filtered else {}
+        filtered = [stat for stat in filtered if stat.file_path not in generated]
+
+        if not filtered:
+            # Nothing to send the model; a lockfile refresh and the like still has a rule
+            try:
+                summary = analyzer.analyze_changes(commit.numstats, "")
+            except ValueError:
+                result.error = "no text changes to describe"
+                return result
+            result.summary = summary
+            result.message = self._heuristic(summary)
+            result.heuristic = result.message is not None
+            if result.message is None:
+                result.error = "all changed files are ignored"
+            return result
+
+        symbols = {}
+        if self.config.semantic_diff:
+            symbols = analyzer.summarize_python_changes(filtered, self.cwd, diff_filter.cache, commit.oid)
+        file_diffs = commit.file_diffs(
+            lambda path: path in symbols or path in generated or diff_filter.should_skip_file(path),
+            MAX_PATCH_TOKENS,
+        )
+        # Parsed; the raw patch is not needed again
+        commit.patch = b""
+        packed = run_pipeline(
+            file_diffs,
+            diff_filter,
+            [stat for stat in filtered if stat.file_path not in symbols],
+            redactor=self.redactor,
+        )
+
+        result.summary = analyzer.analyze_changes(filtered, packed.text, packed.redactions, symbols)
+        result.message = self._heuristic(result.summary)
+        result.heuristic = result.message is not None
+        return result
+
+    def generate(self, result: RewordResult) -> RewordResult:
+        from core.redaction import SecretRedactor
+
+        if result.message is None and result.error is None:
+            try:
+                message = self.backoff.call(self.llm.generate_commit, result.summary)
+                redactor = SecretRedactor()
+                if redactor.has_potential_secrets(message):
+                    message = redactor.redact_diff(message)
+                result.message = message
+            except Exception as e:
+                result.error = str(e)
+        if self.on_result is not None:
+            self.on_result(result)
+        return result
+
+    def run(self, commits: Iterable[git.CommitDiff]) -> list[RewordResult]:
+        """A result per commit, oldest first; raises RewordError if the range cannot be rewritten."""
+        # A merge late in the range must fail the run before any model call is spent
+        commits = list(commits)
+        previous = None
+        for commit in commits:
+            check_linear(commit, previous)
+            previous = commit
+
+        generation = ThreadPoolExecutor(self.config.reword_concurrency, thread_name_prefix="reword-generate")
+        analysis = ThreadPoolExecutor(MAX_ANALYSIS_WORKERS, thread_name_prefix="reword-analyze")
+
+        def analyze_then_generate(commit: git.CommitDiff) -> "Future[RewordResult]":
+            result = self.analyze(commit)
+            return generation.submit(self.generate, result)
+
+        try:
+            pending = [analysis.submit(analyze_then_generate, commit) for commit in commits]
+            return [analyzed.result().result() for analyzed in pending]
+        finally:
+            # After a failure, commits not yet started are dropped rather than sent
+            analysis.shutdown(cancel_futures=True)
+            generation.shutdown(cancel_futures=True)
+
+
+def check_linear(commit: git.CommitDiff, previous: Optional[git.CommitDiff]) -> None:
+    """Messages are rewritten by replaying commits onto each other, which only works for a chain."""
+    if len(commit.parents) > 1:
+        raise RewordError(f"{commit.oid[:12]} is a merge commit; only linear ranges can be reworded")
+    if previous is not None and commit.parents != [previous.oid]:
+        raise RewordError(f"{commit.oid[:12]} does not follow {previous.oid[:12]}; the range is not linear")
+
+
+def reword_range(revision_range: str, reworder: CommitReworder, cwd: Optional[Path] = None) -> list[RewordResult]:
+    """Generate messages for every commit in a range that ends at HEAD."""
+    revision_range = resolve_range(revision_range)
+    if "..." in revision_range:
+        raise RewordError(f"{revision_range} is a symmetric difference; give a range such as main..HEAD")
+    # Checked before any model call: only the current branch can be rewritten
+    tip = revision_range.split("..", 1)[1] or "HEAD"
+    if git.resolve_commit(tip, cwd) != git.resolve_commit("HEAD", cwd):
+        raise RewordError(f"{revision_range} does not end at HEAD; only the current branch's tip can be reworded")
+    with git.CommitLogStream(revision_range, cwd) as stream:
+        results = reworder.run(stream)
+    if not results:
+        raise RewordError(f"No commits in {revision_range}")
+    return results
+
+
+def apply_results(results: list[RewordResult], cwd: Optional[Path] = None) -> str:
+    """Rewrite the range with the new messages in one pass; returns the new HEAD."""
+    messages = {result.commit.oid: result.message for result in results if result.message is not None}
+    return git.rewrite_messages([result.commit for result in results], messages, cwd)
@@ -9,11 +9,15 @@ setup(
     install_requires=[
         "typer[all]>=0.9.0",
         "openai>=1.12.0",
+        "tiktoken>=0.6.0",
         "pydantic>=2.5.0",
         "pydantic-settings>=2.1.0",
         "rich>=13.7.0",
     ],
     extras_require={
+        "fast": [
+            "numpy>=1.24",
+        ],
         "dev": [
             "pytest>=8.0.0",
             "pytest-cov>=4.1.0",
@@ -25,6 +29,10 @@ setup(
         "console_scripts": [
             "edgecommit=cli:app",
         ],
+        "edgecommit.providers": [
+            "openai=llm.openai:OpenAIProvider",
+            "local=llm.local:LocalProvider",
+        ],
     },
     python_requires=">=3.11",
 )
\ No newline at end of file
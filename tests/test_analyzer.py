@@ -1,7 +1,24 @@
+import os
+import subprocess
+import tempfile
+import textwrap
 import unittest
+from pathlib import Path
+from typing import get_args
+from unittest.mock import patch
 
-from core.analyzer import analyze_changes, build_prompt
-from core.git import NumStat
+from core import analyzer
+from core.analyzer import (
+    ChangeType,
+    SymbolChange,
+    analyze_changes,
+    build_prompt,
+    heuristic_commit,
+    summarize_python_changes,
+    symbol_changes,
+)
+from core.git import NumStat, StagedDiffStream
+from llm.openai import is_conventional_commit
 
 
 class TestAnalyzer(unittest.TestCase):
@@ -35,4 +52,294 @@ class TestAnalyzer(unittest.TestCase):
     
     def test_empty_changes_error(self):
         with self.assertRaises(ValueError):
-            analyze_changes([], "diff content")
\ No newline at end of file
+            analyze_changes([], "diff content")
+
+
+def version_diff(path: str, key: str, old: str, new: str) -> str:
+    return (
+        f"diff --git a/{path} b/{path}\n"
+        "@@ -1,3 +1,3 @@\n"
+        " [project]\n"
+        f"-{key} = \"{old}\"\n"
+        f"+{key} = \"{new}\"\n"
+    )
+
+
+class TestHeuristicCommit(unittest.TestCase):
+    def guess(self, numstats, contents=""):
+        guess = heuristic_commit(analyze_changes(numstats, contents))
+        if guess is not None:
+            self.assertTrue(is_conventional_commit(guess.message), guess.message)
+        return guess
+    
+    def test_lockfile_only(self):
+        guess = self.guess([NumStat(added=120, removed=80, file_path="yarn.lock")])
+        self.assertEqual(guess.message, "chore(deps): update yarn.lock")
+        self.assertGreaterEqual(guess.confidence, 0.9)
+        
+        guess = self.guess([
+            NumStat(added=12, removed=8, file_path="poetry.lock"),
+            NumStat(added=3, removed=3, file_path="web/package-lock.json"),
+        ])
+        self.assertEqual(guess.message, "chore(deps): update 2 lockfiles")
+    
+    def test_rename_only(self):
+        guess = self.guess([
+            NumStat(added=0, removed=0, file_path="src/api/client.py", is_renamed=True, old_path="src/api/http.py"),
+        ])
+        self.assertEqual(guess.message, "refactor(api): rename http.py to client.py")
+    
+    def test_version_bump(self):
+        guess = self.guess(
+            [NumStat(added=1, removed=1, file_path="pyproject.toml")],
+            version_diff("pyproject.toml", "version", "0.1.0", "0.2.0"),
+        )
+        self.assertEqual(guess.message, "chore(release): bump version to 0.2.0")
+        self.assertGreaterEqual(guess.confidence, 0.9)
+    
+    def test_version_bump_across_files(self):
+        guess = self.guess(
+            [
+                NumStat(added=1, removed=1, file_path="pyproject.toml"),
+                NumStat(added=1, removed=1, file_path="edgecommit/__init__.py"),
+            ],
+            version_diff("pyproject.toml", "version", "0.1.0", "0.2.0")
+            + version_diff("edgecommit/__init__.py", "__version__", "0.1.0", "0.2.0"),
+        )
+        self.assertEqual(guess.message, "chore(release): bump version to 0.2.0")
+    
+    def test_dependency_bump(self):
+        guess = self.guess(
+            [NumStat(added=1, removed=1, file_path="requirements.txt")],
+            "-requests==2.31.0\n+requests==2.32.0\n",
+        )
+        self.assertEqual(guess.message, "build(deps): bump requests from 2.31.0 to 2.32.0")
+        self.assertIn("build", get_args(ChangeType))
+    
+    def test_manifest_with_other_changes_is_not_a_bump(self):
+        guess = self.guess(
+            [NumStat(added=2, removed=1, file_path="pyproject.toml")],
+            version_diff("pyproject.toml", "version", "0.1.0", "0.2.0") + "+[tool.black]\n",
+        )
+        # Falls through to the small-change rule, which does not skip the model
+        self.assertLess(guess.confidence, 0.8)
+    
+    def test_docs_only(self):
+        guess = self.guess([NumStat(added=40, removed=12, file_path="README.md")])
+        self.assertEqual(guess.message, "docs: update README.md")
+        
+        guess = self.guess([
+            NumStat(added=40, removed=12, file_path="docs/api/index.rst"),
+            NumStat(added=4, removed=0, file_path="docs/api/usage.rst"),
+        ])
+        self.assertEqual(guess.message, "docs(api): update 2 docs")
+    
+    def test_text_files_outside_docs_are_not_docs(self):
+        for path in ("CMakeLists.txt", "requirements.txt", "public/robots.txt", "notes.md"):
+            with self.subTest(path=path):
+                self.assertIsNone(self.guess([NumStat(added=40, removed=12, file_path=path)]))
+        
+        guess = self.guess([NumStat(added=40, removed=12, file_path="packages/web/docs/setup.txt")])
+        self.assertEqual(guess.message, "docs(web): update setup.txt")
+    
+    def test_small_change_has_low_confidence(self):
+        guess = self.guess([NumStat(added=2, removed=1, file_path="src/core/parser.py")])
+        self.assertEqual(guess.message, "chore(core): update parser.py")
+        self.assertLess(guess.confidence, 0.8)
+        self.assertIsNone(heuristic_commit(
+            analyze_changes([NumStat(added=2, removed=1, file_path="src/core/parser.py")], ""), min_confidence=0.8
+        ))
+    
+    def test_large_change_left_to_the_model(self):
+        self.assertIsNone(self.guess([NumStat(added=80, removed=20, file_path="src/core/parser.py")]))
+
+
+OLD_MODULE = textwrap.dedent("""
+    import os
+
+    TIMEOUT = 5
+
+
+    def load(path):
+        return open(path).read()
+
+
+    def unused():
+        pass
+
+
+    class Store:
+        kind = "file"
+
+        def get(self, key):
+            return self.data[key]
+""")
+
+
+class TestSymbolChanges(unittest.TestCase):
+    def test_added_removed_and_modified(self):
+        new = OLD_MODULE.replace("def unused():\n    pass\n", "def save(path, data):\n    open(path, 'w').write(data)\n")
+        new = new.replace("return self.data[key]", "return self.data.get(key)")
+        new += "\n    def put(self, key, value):\n        self.data[key] = value\n"
+
+        self.assertEqual(symbol_changes(OLD_MODULE, new), [
+            SymbolChange("function", "save", "added"),
+            SymbolChange("function", "Store.get", "modified"),
+            SymbolChange("function", "Store.put", "added"),
+            SymbolChange("function", "unused", "removed"),
+        ])
+
+    def test_formatting_and_comments_are_not_changes(self):
+        new = OLD_MODULE.replace("def load(path):", "def load(path):  # reads it all\n    # text mode")
+        self.assertIsNone(symbol_changes(OLD_MODULE, new))
+
+    def test_class_body_outside_methods(self):
+        new = OLD_MODULE.replace('kind = "file"', 'kind = "memory"')
+        self.assertEqual(symbol_changes(OLD_MODULE, new), [SymbolChange("class", "Store", "modified")])
+
+    def test_top_level_code_alongside_definitions(self):
+        new = OLD_MODULE.replace("TIMEOUT = 5", "TIMEOUT = 10").replace("def unused", "def spare")
+        self.assertIn(SymbolChange("module", "top-level code", "modified"), symbol_changes(OLD_MODULE, new))
+        # Only top-level code changed: the hunks say more than a symbol list would
+        self.assertIsNone(symbol_changes(OLD_MODULE, OLD_MODULE.replace("TIMEOUT = 5", "TIMEOUT = 10")))
+
+    def test_new_file_and_syntax_errors(self):
+        self.assertEqual(symbol_changes("", "def main():\n    pass\n"), [SymbolChange("function", "main", "added")])
+        self.assertIsNone(symbol_changes(OLD_MODULE, "def broken(:\n"))
+
+    def test_property_getter_and_setter_are_separate(self):
+        old = textwrap.dedent("""
+            class Config:
+                @property
+                def port(self):
+                    return self._port
+
+                @port.setter
+                def port(self, value):
+                    self._port = value
+        """)
+        new = old.replace("self._port = value", "self._port = int(value)")
+
+        self.assertEqual(symbol_changes(old, new), [SymbolChange("function", "Config.port", "modified", "setter")])
+        self.assertEqual(
+            symbol_changes(old, old.replace("return self._port", "return self._port or 80")),
+            [SymbolChange("function", "Config.port", "modified")],
+        )
+
+    def test_overloads_and_redefinitions_are_kept(self):
+        old = textwrap.dedent("""
+            from typing import overload
+
+            @overload
+            def parse(value: str) -> int: ...
+            @overload
+            def parse(value: bytes) -> int: ...
+            def parse(value):
+                return int(value)
+
+            def handler():
+                return 1
+
+            def handler():
+                return 2
+        """)
+        new = old.replace("def parse(value: bytes) -> int: ...", "def parse(value: bytearray) -> int: ...")
+        new = new.replace("return 2", "return 3")
+
+        self.assertEqual(symbol_changes(old, new), [
+            SymbolChange("function", "parse", "modified", "overload #2"),
+            SymbolChange("function", "handler", "modified", "#2"),
+        ])
+
+    def test_prompt_lists_symbols(self):
+        summary = analyze_changes(
+            [NumStat(added=4, removed=2, file_path="src/store.py")],
+            "",
+            symbols={"src/store.py": [
+                SymbolChange("function", "Store.put", "added"),
+                SymbolChange("class", "Cache", "added"),
+                SymbolChange("function", "load", "removed"),
+                SymbolChange("function", "Store.size", "modified", "setter"),
+            ]},
+        )
+        self.assertIn(
+            "- src/store.py: added Store.put(), class Cache; modified Store.size() (setter); removed load()\n",
+            build_prompt(summary),
+        )
+
+
+def git_repo(path: str, files: dict[str, str]) -> None:
+    subprocess.run(["git", "init", "-q", path], check=True)
+    for name, text in files.items():
+        Path(path, name).parent.mkdir(parents=True, exist_ok=True)
+        Path(path, name).write_text(text)
+    subprocess.run(["git", "add", "."], cwd=path, check=True)
+    subprocess.run(
+        ["git", "-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-qm", "init"],
+        cwd=path,
+        check=True,
+    )
+
+
+class TestSummarizePythonChanges(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.repo = self.tmpdir.name
+
+    def stage(self, files: dict[str, str]) -> list[NumStat]:
+        for name, text in files.items():
+            Path(self.repo, name).parent.mkdir(parents=True, exist_ok=True)
+            Path(self.repo, name).write_text(text)
+        subprocess.run(["git", "add", "-A"], cwd=self.repo, check=True)
+        with StagedDiffStream(cwd=self.repo) as stream:
+            return stream.numstats
+
+    def test_staged_against_head(self):
+        git_repo(self.repo, {"store.py": OLD_MODULE, "notes.txt": "todo\n"})
+        numstats = self.stage({
+            "store.py": OLD_MODULE.replace("def unused():\n    pass\n", ""),
+            "cli.py": "def main():\n    pass\n",
+            "notes.txt": "done\n",
+        })
+
+        self.assertEqual(summarize_python_changes(numstats, self.repo), {
+            "cli.py": [SymbolChange("function", "main", "added")],
+            "store.py": [SymbolChange("function", "unused", "removed")],
+        })
+
+    def test_renamed_file_compared_with_its_old_path(self):
+        git_repo(self.repo, {"old.py": OLD_MODULE})
+        os.unlink(Path(self.repo, "old.py"))
+        numstats = self.stage({"new.py": OLD_MODULE + "\n\ndef extra():\n    pass\n"})
+        self.assertEqual(numstats[0].old_path, "old.py")
+        self.assertEqual(summarize_python_changes(numstats, self.repo), {
+            "new.py": [SymbolChange("function", "extra", "added")],
+        })
+
+    def test_files_parsed_in_worker_processes(self):
+        modules = {f"pkg/mod{i}.py": OLD_MODULE for i in range(4)}
+        git_repo(self.repo, modules)
+        numstats = self.stage({name: text + "\n\ndef extra():\n    pass\n" for name, text in modules.items()})
+
+        with patch.object(analyzer, "SEMANTIC_POOL_MIN_FILES", 2), patch("os.cpu_count", return_value=2):
+            self.assertEqual(analyzer.semantic_workers(len(numstats)), 2)
+            symbols = summarize_python_changes(numstats, self.repo)
+
+        self.assertEqual(sorted(symbols), sorted(modules))
+        self.assertTrue(all(changes == [SymbolChange("function", "extra", "added")] for changes in symbols.values()))
+
+    def test_symbols_are_shorter_than_hunks(self):
+        body = "".join(f"    total += {i}\n" for i in range(40))
+        git_repo(self.repo, {"calc.py": f"def total():\n    total = 0\n{body}    return total\n"})
+        numstats = self.stage({
+            "calc.py": f"def total():\n    total = 1\n{body}    return total\n\n\ndef mean():\n{body}    return total / 40\n",
+        })
+        hunks = subprocess.run(["git", "diff", "--cached"], cwd=self.repo, capture_output=True, text=True).stdout
+
+        symbols = summarize_python_changes(numstats, self.repo)
+        semantic = build_prompt(analyze_changes(numstats, "", symbols=symbols))
+        raw = build_prompt(analyze_changes(numstats, hunks))
+
+        self.assertIn("- calc.py: added mean(); modified total()", semantic)
+        self.assertLess(len(semantic), len(raw) / 2)
@@ -1,12 +1,22 @@
+import math
+import os
+import re
+import tempfile
 import time
-from unittest.mock import Mock
+import tracemalloc
+from pathlib import Path
+from unittest.mock import Mock, patch
 
 import unittest
 
 from config import Config
+from core import tokenizer
 from core.analyzer import analyze_changes
 from core.filters import DiffFilter
-from core.git import NumStat
+from core.git import FileDiff, Hunk, NumStat, parse_patch
+from core.ignore import _glob_to_regex, parse_rule
+from core.entropy import EntropyDetector
+from core.redaction import SecretRedactor
 
 
 def generate_large_numstat(num_files: int = 100) -> list[NumStat]:
@@ -23,6 +33,201 @@ def generate_large_numstat(num_files: int = 100) -> list[NumStat]:
     return stats
 
 
+def generate_ignore_rules(num_rules: int = 500) -> list[str]:
+    rules = []
+    for i in range(num_rules):
+        kind = i % 5
+        if kind == 0:
+            rules.append(f"generated_{i}.json")
+        elif kind == 1:
+            rules.append(f"*.ext{i}")
+        elif kind == 2:
+            rules.append(f"vendor_{i}/")
+        elif kind == 3:
+            rules.append(f"packages/pkg_{i}/dist/")
+        else:
+            rules.append(f"snapshot_{i}_*.snap")
+    return rules
+
+
+def generate_secret_diff(num_lines: int = 50000) -> str:
+    lines = []
+    for i in range(num_lines):
+        kind = i % 10
+        if kind == 0:
+            lines.append(f'+    api_key = "sk-proj-{i:08d}abcdef1234567890abcdef1234567890abcdef12"')
+        elif kind == 1:
+            lines.append(f'+    checksum = "{i:08x}0123456789abcdef0123456789abcdef"')
+        elif kind == 2:
+            lines.append(f'-    old_value = "{i:08d}" + other_{i}')
+        elif kind == 3:
+            lines.append(f'+    password = "very_long_password_{i:08d}_that_looks_suspicious"')
+        elif kind == 4:
+            lines.append(f'+    message = "Processing item {i} of the queue, please wait for it"')
+        else:
+            lines.append(f"+    result_{i} = compute(value_{i}, factor={i % 7})")
+    return "\n".join(lines)
+
+
+def generate_code_diff(num_lines: int = 10000) -> str:
+    # A quarter of the lines carry a literal long enough to be scored, which is
+    # already denser than typical source
+    lines = []
+    for i in range(num_lines):
+        kind = i % 16
+        if kind == 0:
+            lines.append(f'+    url = "https://api.example.com/v1/items/{i}"')
+        elif kind == 1:
+            lines.append(f'+    from components.module_{i}.index import render_component_{i}')
+        elif kind == 2:
+            lines.append(f'+    request_id = "{i:08x}-4a5b-6c7d-8e9f-{i:012x}"')
+        elif kind == 3:
+            lines.append(f'+    logger.info("Processing item {i} of the queue, please wait")')
+        elif kind == 4:
+            lines.append(f"+SERVICE_TOKEN_{i}=q8Xv2LpZ7mN4cR1tY9wB6kJ3hF5d{i:06d}")
+        else:
+            lines.append(f"+    result_{i} = compute_the_thing(value_{i}, factor={i % 7})")
+    return "\n".join(lines)
+
+
+def generate_patch(num_files: int = 2000, lines_per_file: int = 100) -> bytes:
+    parts = []
+    for i in range(num_files):
+        path = f"src/pkg_{i % 50}/module_{i:04d}.py"
+        parts.append(f"diff --git a/{path} b/{path}\n--- a/{path}\n+++ b/{path}\n")
+        parts.append(f"@@ -1,{lines_per_file // 2} +1,{lines_per_file // 2} @@\n")
+        for j in range(lines_per_file // 2):
+            parts.append(f"-    value_{j} = compute(value_{j - 1}, {i})\n")
+            parts.append(f"+    value_{j} = compute(value_{j - 1}, {i + 1})\n")
+    return "".join(parts).encode()
+
+
+class PerCharacterEntropyDetector(EntropyDetector):
+    """Scores each value with a Python loop over its characters, the approach batching replaces."""
+    
+    def classify(self, values):
+        results = []
+        for value in values:
+            kind = None
+            if len(value) >= self.min_length and re.fullmatch(r"[A-Za-z0-9+/=_\-]+", value):
+                counts = {}
+                for char in value:
+                    counts[char] = counts.get(char, 0) + 1
+                entropy = -sum(c / len(value) * math.log2(c / len(value)) for c in counts.values())
+                if not value.strip("0123456789abcdefABCDEF"):
+                    kind = "hex" if entropy > self.hex_threshold else None
+                else:
+                    kind = "base64" if entropy > self.base64_threshold else None
+            results.append(kind)
+        return results
+
+
+class LinearIgnoreMatcher:
+    """Tries every rule against a path and each of its parent directories, kept as a benchmark baseline."""
+    
+    def __init__(self, patterns):
+        self.rules = [
+            (rule, re.compile(_glob_to_regex(rule.pattern), re.DOTALL))
+            for rule in map(parse_rule, patterns)
+            if rule is not None
+        ]
+    
+    def matches(self, file_path):
+        parts = file_path.strip("/").split("/")
+        for end in range(1, len(parts) + 1):
+            is_dir = end < len(parts)
+            path = "/".join(parts[:end])
+            ignored = False
+            for rule, regex in self.rules:
+                if rule.dir_only and not is_dir:
+                    continue
+                if regex.fullmatch(path if rule.anchored else parts[end - 1]):
+                    ignored = not rule.negated
+            if ignored or not is_dir:
+                return ignored
+        return False
+
+
+class LegacySecretRedactor:
+    """The redactor before the single-pass scanner, kept as a benchmark baseline.
+    
+    Its provider-specific patterns have no capture group, so the benchmark
+    input avoids GitHub, AWS and Google token shapes.
+    """
+    
+    secret_keywords = SecretRedactor().secret_keywords
+    secret_patterns = [
+        r'["\']([a-zA-Z0-9+/=]{40,})["\']',
+        r'["\']([a-fA-F0-9]{32,})["\']',
+        r'["\']([a-zA-Z0-9_-]{50,})["\']',
+        r'["\']sk-[a-zA-Z0-9]{48}["\']',
+        r'["\']ghp_[a-zA-Z0-9]{36}["\']',
+        r'["\']ghs_[a-zA-Z0-9]{36}["\']',
+        r'["\']AKIA[0-9A-Z]{16}["\']',
+        r'["\']ya29\.[a-zA-Z0-9_-]{100,}["\']',
+    ]
+    
+    def __init__(self):
+        self.compiled_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in self.secret_patterns]
+    
+    def _redact_string(self, value):
+        if len(value) <= 8:
+            return value
+        return f"{value[:4]}...{value[-4:]}"
+    
+    def redact_line(self, line):
+        for pattern in self.compiled_patterns:
+            def replace_match(match):
+                secret = match.group(1)
+                return match.group(0).replace(secret, self._redact_string(secret))
+            line = pattern.sub(replace_match, line)
+        
+        def replace_long_string(match):
+            quote, content = match.group(1), match.group(2)
+            if len(content) >= 40 and any(k in content.lower() for k in self.secret_keywords):
+                return f"{quote}{self._redact_string(content)}{quote}"
+            return match.group(0)
+        
+        return re.sub(r'(["\'])([^"\']{40,})\1', replace_long_string, line)
+    
+    def redact_diff(self, diff_content):
+        return "\n".join(
+            self.redact_line(line) if line.startswith("+") and not line.startswith("+++") else line
+            for line in diff_content.split("\n")
+        )
+    
+    def has_potential_secrets(self, diff_content):
+        for pattern in self.compiled_patterns:
+            if pattern.search(diff_content):
+                return True
+        for line in diff_content.split("\n"):
+            if line.startswith("+") and not line.startswith("+++"):
+                if any(k in line.lower() for k in self.secret_keywords):
+                    if re.search(r'["\'][^"\']{30,}["\']', line):
+                        return True
+        return False
+
+
+def write_code_ranks(directory: Path, diff_text: str) -> None:
+    """Store cl100k_base ranks in the tokenizer disk cache, so the real encoding loads offline.
+    
+    Every byte is a token, and so is each prefix of the words and symbol
+    runs in diff_text, so BPE merges its way up to them as it would with
+    the published table.  Filler tokens bring it to the published size.
+    """
+    ranks = {bytes([b]): b for b in range(256)}
+    pieces = set(re.findall(r" ?[A-Za-z_]+| ?[^\w\s]+|\s+", diff_text))
+    for piece in sorted(pieces, key=len):
+        data = piece.encode()
+        for end in range(2, len(data) + 1):
+            ranks.setdefault(data[:end], len(ranks))
+    i = 0
+    while len(ranks) < 100_000:
+        ranks[f"tok{i}".encode()] = len(ranks)
+        i += 1
+    tokenizer.write_compiled_ranks(tokenizer._compiled_path(directory, "cl100k_base"), ranks)
+
+
 class TestPerformanceBenchmark(unittest.TestCase):
     
     def test_filter_performance(self):
@@ -43,6 +248,50 @@ class TestPerformanceBenchmark(unittest.TestCase):
         
         self.assertLess(duration, 0.05, f"Filtering too slow: {duration:.3f}s")
         self.assertEqual(len(filtered), 1000)  
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            ignore_file = os.path.join(tmpdir, ".commitpilotignore")
+            with open(ignore_file, "w") as f:
+                f.write("\n".join(generate_ignore_rules(500)))
+            
+            file_paths = []
+            for i in range(100_000):
+                kind = i % 4
+                if kind == 0:
+                    file_paths.append(f"src/pkg_{i % 97}/module_{i}.py")
+                elif kind == 1:
+                    file_paths.append(f"lib/vendor_{(i % 100) * 5 + 2}/file_{i}.js")
+                elif kind == 2:
+                    file_paths.append(f"tests/snapshot_{(i % 100) * 5 + 4}_{i}.snap")
+                else:
+                    file_paths.append(f"assets/data_{i}.ext{(i % 100) * 5 + 1}")
+            
+            diff_filter = DiffFilter(config, ignore_file=ignore_file)
+            filtered = [path for path in file_paths if not diff_filter.should_skip_file(path)]
+            self.assertEqual(len(filtered), 25_000)
+            
+            # Timed on a sample against the same rules tried one by one, in
+            # the same process.  Each run gets a fresh filter so the
+            # directory trie starts cold, and the best run is kept.
+            sample = file_paths[:2000]
+            baseline = LinearIgnoreMatcher(generate_ignore_rules(500))
+            start_time = time.perf_counter()
+            expected = [path for path in sample if not baseline.matches(path)]
+            baseline_time = time.perf_counter() - start_time
+            
+            duration = float("inf")
+            for _ in range(5):
+                diff_filter = DiffFilter(config, ignore_file=ignore_file)
+                start_time = time.perf_counter()
+                filtered = [path for path in sample if not diff_filter.should_skip_file(path)]
+                duration = min(duration, time.perf_counter() - start_time)
+            
+            self.assertEqual(filtered, expected)
+            self.assertLess(
+                duration,
+                baseline_time / 10,
+                f"Filtering took {duration * 1000:.1f}ms against {baseline_time * 1000:.1f}ms rule by rule",
+            )
     
     def test_analyze_large_changeset(self):
         numstats = generate_large_numstat(100)
@@ -111,6 +360,22 @@ class TestPerformanceBenchmark(unittest.TestCase):
         self.assertGreater(len(sig_files), 0)
         self.assertTrue(all(f.added + f.removed > 5 for f in sig_files))
     
+    def test_parsed_patch_memory(self):
+        patch = generate_patch()
+        
+        tracemalloc.start()
+        try:
+            file_diffs = parse_patch(patch)
+            retained, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        
+        self.assertEqual(len(file_diffs), 2000)
+        # Hunk bodies are spans of one buffer per file rather than a str per
+        # line, which cost more than twice the patch size
+        self.assertLess(retained, 1.3 * len(patch), f"{retained / len(patch):.2f}x the patch size")
+        self.assertLess(peak, 1.5 * len(patch), f"peak {peak / len(patch):.2f}x the patch size")
+    
     def test_scalability(self):
         for num_files in [10, 50, 100, 500]:
             with self.subTest(num_files=num_files):
@@ -123,4 +388,102 @@ class TestPerformanceBenchmark(unittest.TestCase):
                 
                 max_expected_duration = num_files * 0.001  
                 self.assertLess(duration, max_expected_duration, f"Processing {num_files} files took {duration:.3f}s")
-                self.assertEqual(summary.total_files, num_files)
\ No newline at end of file
+                self.assertEqual(summary.total_files, num_files)
+    
+    def test_pack_file_diffs_performance(self):
+        file_diffs = []
+        numstats = []
+        for i in range(5000):
+            path = f"src/pkg_{i % 50}/module_{i:04d}.py"
+            lines = [f"+    value_{j} = compute(value_{j - 1}, {i})" for j in range(i % 40 + 1)]
+            file_diffs.append(FileDiff(
+                path=path,
+                header=[f"diff --git a/{path} b/{path}", "--- a/" + path, "+++ b/" + path],
+                hunks=[Hunk(header=f"@@ -1 +1,{len(lines)} @@", lines=lines)],
+            ))
+            numstats.append(NumStat(added=len(lines), removed=0, file_path=path))
+        
+        saved = dict(tokenizer._encodings)
+        tokenizer._encodings.pop("cl100k_base", None)
+        with tempfile.TemporaryDirectory() as tmpdir, patch.dict(os.environ, {"EDGE_TOKENIZER_CACHE": tmpdir}):
+            write_code_ranks(tokenizer.cache_dir(), "\n".join(file_diff.text for file_diff in file_diffs[:40]))
+            try:
+                # The BPE encoding the CLI uses, loaded through the registry
+                encoding = tokenizer.get_encoding("cl100k_base")
+                self.assertEqual(type(encoding).__module__, "tiktoken.core")
+                
+                duration = float("inf")
+                for _ in range(3):
+                    diff_filter = DiffFilter(Config())
+                    start_time = time.perf_counter()
+                    packed = diff_filter.pack_file_diffs(file_diffs, numstats)
+                    duration = min(duration, time.perf_counter() - start_time)
+            finally:
+                tokenizer._encodings.clear()
+                tokenizer._encodings.update(saved)
+        
+        self.assertLess(duration, 0.2, f"Packing 5k files too slow: {duration:.3f}s")
+        self.assertLessEqual(len(encoding.encode(packed)), 6000)
+    
+    def test_tokenizer_cached_ranks_load_speed(self):
+        ranks = {bytes([b]): b for b in range(256)}
+        i = 0
+        while len(ranks) < 100_000:
+            ranks[f"tok{i}".encode()] = len(ranks)
+            i += 1
+        
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "cl100k_base.marshal"
+            tokenizer.write_compiled_ranks(path, ranks)
+            
+            start_time = time.time()
+            loaded = tokenizer.load_compiled_ranks(path)
+            duration = time.time() - start_time
+        
+        self.assertLess(duration, 0.05, f"Loading cached BPE ranks too slow: {duration:.3f}s")
+        self.assertEqual(len(loaded), 100_000)
+    
+    def test_secret_redaction_performance(self):
+        diff = generate_secret_diff(50000)
+        legacy = LegacySecretRedactor()
+        redactor = SecretRedactor()
+        
+        start = time.perf_counter()
+        expected = legacy.redact_diff(diff)
+        legacy.has_potential_secrets(diff)
+        legacy_time = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        redacted = redactor.redact_diff(diff)
+        self.assertTrue(redactor.has_potential_secrets(diff))
+        scan_time = time.perf_counter() - start
+        
+        self.assertEqual(redacted, expected)
+        self.assertLess(
+            scan_time, legacy_time / 2, f"Single pass took {scan_time:.3f}s against {legacy_time:.3f}s for the legacy scan"
+        )
+    
+    def test_entropy_scan_performance(self):
+        diff = generate_code_diff(10000)
+        redactor = SecretRedactor(EntropyDetector())
+        baseline = SecretRedactor(PerCharacterEntropyDetector())
+        
+        # The whole redaction scan is timed, against the same scan scoring
+        # each literal character by character.  Runs alternate and the best
+        # of each is kept, so a busy machine slows both alike.
+        scan_time = baseline_time = float("inf")
+        for _ in range(10):
+            start = time.perf_counter()
+            matches = redactor.scan(diff, include_suspicious=False)
+            scan_time = min(scan_time, time.perf_counter() - start)
+            start = time.perf_counter()
+            expected = baseline.scan(diff, include_suspicious=False)
+            baseline_time = min(baseline_time, time.perf_counter() - start)
+        
+        self.assertEqual([m.kind for m in matches], ["entropy"] * 625)
+        self.assertEqual(matches, expected)
+        self.assertLess(
+            scan_time,
+            baseline_time,
+            f"Batched scan took {scan_time * 1000:.1f}ms against {baseline_time * 1000:.1f}ms per character",
+        )
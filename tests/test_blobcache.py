@@ -0,0 +1,154 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from config import Config
+from core import analyzer
+from core.blobcache import BlobCache, repo_cache_path
+from core.entropy import EntropyDetector
+from core.filters import DiffFilter
+from core.generated import GeneratedFileDetector
+from core.git import NumStat
+from core.pipeline import run_pipeline
+from core.redaction import SecretRedactor
+from tests.test_analyzer import OLD_MODULE, TestSummarizePythonChanges, git_repo
+from tests.test_filters import CharEncoder
+from tests.test_generated import MINIFIED
+from tests.test_pipeline import SECRET, make_file_diff, make_secret_diff
+
+
+class TestBlobCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.path = Path(self.tmpdir.name, "edgecommit", "blobs.sqlite")
+
+    def test_round_trip(self):
+        with BlobCache(self.path) as cache:
+            cache.put_many("symbols:1", {"a" * 40: {"symbols": {}, "rest": "x"}, "b" * 40: None})
+            self.assertEqual(cache.get_many("symbols:1", ["a" * 40, "b" * 40, "c" * 40]), {
+                "a" * 40: {"symbols": {}, "rest": "x"},
+                "b" * 40: None,
+            })
+            # Kinds do not share keys
+            self.assertEqual(cache.get_many("generated:1", ["a" * 40]), {})
+
+        # Kept for the next run
+        with BlobCache(self.path) as cache:
+            self.assertEqual(cache.get("symbols:1", "a" * 40), {"symbols": {}, "rest": "x"})
+
+    def test_least_recently_used_evicted(self):
+        with BlobCache(self.path, max_entries=3) as cache:
+            cache.put_many("tokens", {"old": 1, "used": 2})
+            time.sleep(0.01)
+            cache.put("tokens", "new", 3)
+            time.sleep(0.01)
+            cache.get("tokens", "used")
+            time.sleep(0.01)
+            cache.put("tokens", "newest", 4)
+
+            self.assertEqual(cache.count(), 3)
+            self.assertEqual(cache.get_many("tokens", ["old", "used", "new", "newest"]), {
+                "used": 2, "new": 3, "newest": 4,
+            })
+
+    def test_unusable_location_is_an_empty_cache(self):
+        Path(self.tmpdir.name, "edgecommit").write_text("not a directory")
+        with BlobCache(self.path) as cache:
+            cache.put("tokens", "key", 1)
+            self.assertIsNone(cache.get("tokens", "key"))
+            self.assertEqual(cache.count(), 0)
+
+    def test_lives_in_the_git_directory(self):
+        repo = Path(self.tmpdir.name, "repo")
+        git_repo(str(repo), {"app.py": "x = 1\n"})
+        self.assertEqual(repo_cache_path(repo), repo.resolve() / ".git" / "edgecommit" / "blobs.sqlite")
+        self.assertIsNone(repo_cache_path(self.tmpdir.name))
+
+
+class TestCachedAnalysis(unittest.TestCase):
+    """Each consumer skips work for content the cache has seen."""
+
+    stage = TestSummarizePythonChanges.stage
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.repo = os.path.join(self.tmpdir.name, "repo")
+        self.cache = BlobCache(Path(self.tmpdir.name, "cache.sqlite"))
+        self.addCleanup(self.cache.close)
+
+    def test_symbol_tables_reused(self):
+        git_repo(self.repo, {"store.py": OLD_MODULE})
+        numstats = self.stage({"store.py": OLD_MODULE + "\n\ndef extra():\n    pass\n"})
+        first = analyzer.summarize_python_changes(numstats, self.repo, self.cache)
+
+        with patch.object(analyzer, "module_symbols", wraps=analyzer.module_symbols) as parse:
+            second = analyzer.summarize_python_changes(numstats, self.repo, self.cache)
+
+        self.assertEqual(first, second)
+        self.assertEqual(first, analyzer.summarize_python_changes(numstats, self.repo))
+        # Only the empty module used for missing versions is parsed
+        self.assertEqual([call.args for call in parse.call_args_list], [("",)])
+
+    def test_generated_verdicts_survive_the_detector(self):
+        git_repo(self.repo, {"app.py": "x = 1\n"})
+        numstats = self.stage({"static/app.js": MINIFIED.decode()})
+        GeneratedFileDetector(cache=self.cache).classify(numstats, self.repo)
+
+        with patch("core.generated.classify_sample") as classify:
+            verdicts = GeneratedFileDetector(cache=self.cache).classify(numstats, self.repo)
+        self.assertEqual(verdicts, {"static/app.js": "minified"})
+        classify.assert_not_called()
+
+    def test_token_counts_reused(self):
+        file_diffs = [make_file_diff(f"src/module_{i}.py") for i in range(5)]
+        numstats = [NumStat(3, 0, file_diff.path) for file_diff in file_diffs]
+        diff_filter = DiffFilter(Config(_env_file=None), cache=self.cache)
+        diff_filter._encoder = CharEncoder()
+        packed = diff_filter.pack_file_diffs(file_diffs, numstats)
+
+        with patch.object(CharEncoder, "encode", side_effect=AssertionError("encoded again")):
+            # The omitted-line markers are short and counted directly; nothing here needs one
+            self.assertEqual(diff_filter.pack_file_diffs(file_diffs, numstats), packed)
+
+    def test_redaction_spans_reused(self):
+        file_diffs = [make_secret_diff("config.py"), make_file_diff("app.py")]
+        numstats = [NumStat(3, 1, "config.py"), NumStat(3, 0, "app.py")]
+        diff_filter = DiffFilter(Config(_env_file=None), cache=self.cache)
+        diff_filter._encoder = CharEncoder()
+        first = run_pipeline(file_diffs, diff_filter, numstats, workers=1)
+
+        with patch.object(SecretRedactor, "scan", side_effect=AssertionError("scanned again")):
+            second = run_pipeline(file_diffs, diff_filter, numstats, workers=1)
+
+        self.assertEqual(second.text, first.text)
+        self.assertEqual(second.redactions, first.redactions)
+        self.assertEqual(second.redactions, {"config.py": 3})
+        self.assertIn('+backup = "ghp_...abcd"', second.text)
+        self.assertNotIn(SECRET, second.text)
+
+    def test_parallel_redaction_mixes_cached_and_new_files(self):
+        file_diffs = [make_secret_diff(f"config_{i}.py") for i in range(20)]
+        numstats = [NumStat(3, 1, file_diff.path) for file_diff in file_diffs]
+        diff_filter = DiffFilter(Config(_env_file=None), cache=self.cache)
+        diff_filter._encoder = CharEncoder()
+        # Every other file was seen before
+        run_pipeline(file_diffs[::2], diff_filter, numstats[::2], workers=1)
+
+        packed = run_pipeline(file_diffs, diff_filter, numstats, workers=2)
+
+        uncached = DiffFilter(Config(_env_file=None))
+        uncached._encoder = CharEncoder()
+        self.assertEqual(packed.text, run_pipeline(file_diffs, uncached, numstats, workers=1).text)
+        self.assertEqual(sum(packed.redactions.values()), 60)
+
+    def test_redaction_spans_depend_on_thresholds(self):
+        self.assertNotEqual(SecretRedactor().cache_kind, SecretRedactor(EntropyDetector(min_length=30)).cache_kind)
+
+
+if __name__ == "__main__":
+    unittest.main()
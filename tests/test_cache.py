@@ -0,0 +1,68 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from core.cache import ResponseCache, cache_key
+
+
+class TestResponseCache(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.cache = ResponseCache(self.tmpdir.name, ttl=60, max_entries=3)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_cache_key_covers_tree_model_and_prompt_version(self):
+        key = cache_key("4b825dc", "gpt-4", 1)
+        self.assertEqual(key, cache_key("4b825dc", "gpt-4", 1))
+        self.assertNotEqual(key, cache_key("4b825dd", "gpt-4", 1))
+        self.assertNotEqual(key, cache_key("4b825dc", "gpt-4o", 1))
+        self.assertNotEqual(key, cache_key("4b825dc", "gpt-4", 2))
+
+    def test_put_then_get(self):
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.put("a", "feat: add login")
+        self.assertEqual(self.cache.get("a"), "feat: add login")
+
+    def test_expired_entry_is_a_miss(self):
+        self.cache.put("a", "feat: add login")
+        path = Path(self.tmpdir.name) / "a.json"
+        entry = json.loads(path.read_text())
+        entry["created"] -= 120
+        path.write_text(json.dumps(entry))
+
+        self.assertIsNone(self.cache.get("a"))
+        self.assertFalse(path.exists())
+
+    def test_evicts_least_recently_used(self):
+        now = time.time()
+        for i, key in enumerate("abc"):
+            self.cache.put(key, f"fix: {key}")
+            os.utime(Path(self.tmpdir.name) / f"{key}.json", (now - 30 + i, now - 30 + i))
+
+        # Reading "a" makes "b" the least recently used entry
+        self.assertEqual(self.cache.get("a"), "fix: a")
+        self.cache.put("d", "fix: d")
+
+        self.assertIsNone(self.cache.get("b"))
+        for key in "acd":
+            self.assertEqual(self.cache.get(key), f"fix: {key}")
+
+    def test_corrupt_entry_is_a_miss(self):
+        (Path(self.tmpdir.name) / "a.json").write_text("{not json")
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_unwritable_directory_is_ignored(self):
+        with tempfile.NamedTemporaryFile() as f:
+            cache = ResponseCache(Path(f.name) / "responses")
+            cache.put("a", "feat: add login")
+            self.assertIsNone(cache.get("a"))
+
+    def test_clear(self):
+        self.cache.put("a", "feat: add login")
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("a"))
@@ -1,3 +1,8 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
 import unittest
 from typer.testing import CliRunner
 
@@ -5,6 +10,44 @@ from cli import app
 
 runner = CliRunner()
 
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Import time allowed for the "nothing staged" exit, which runs on every hook call
+STARTUP_IMPORT_BUDGET = 0.25
+
+NOTHING_STAGED_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import cli
+import_time = time.perf_counter() - start
+from typer.testing import CliRunner
+result = CliRunner().invoke(cli.app, ["main"])
+print(json.dumps({
+    "exit_code": result.exit_code,
+    "output": result.output,
+    "import_time": import_time,
+    "loaded": [name for name in cli.DEFERRED_MODULES if name in sys.modules],
+}))
+"""
+
+CACHED_RUN_SCRIPT = """
+import json, subprocess, sys
+import cli
+from typer.testing import CliRunner
+started = []
+popen = subprocess.Popen
+def record(args, *rest, **kwargs):
+    started.append(args[1] if args[0] == "git" else args[0])
+    return popen(args, *rest, **kwargs)
+subprocess.Popen = record
+result = CliRunner().invoke(cli.app, ["main", "--dry-run"])
+print(json.dumps({
+    "exit_code": result.exit_code,
+    "output": result.output,
+    "loaded": [name for name in ("llm.openai", "tiktoken") if name in sys.modules],
+    "git": started,
+}))
+"""
+
 
 class TestCLI(unittest.TestCase):
     
@@ -40,4 +83,112 @@ class TestCLI(unittest.TestCase):
         """Test dry-run mode when not in git repo"""
         result = runner.invoke(app, ["main", "--dry-run"])
         # Should exit with error code but not crash
-        self.assertIn(result.exit_code, [1, 2])
\ No newline at end of file
+        self.assertIn(result.exit_code, [1, 2])
+    
+    def test_nothing_staged_fast_path(self):
+        """The nothing-staged exit must not import the heavy pipeline modules"""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            subprocess.run(["git", "init", "-q", tmpdir], check=True)
+            completed = subprocess.run(
+                [sys.executable, "-c", NOTHING_STAGED_SCRIPT],
+                cwd=tmpdir,
+                capture_output=True,
+                text=True,
+                env={**os.environ, "PYTHONPATH": PACKAGE_DIR},
+                check=True,
+            )
+        
+        report = json.loads(completed.stdout.strip().splitlines()[-1])
+        self.assertEqual(report["exit_code"], 1)
+        self.assertIn("No staged changes found", report["output"])
+        self.assertEqual(report["loaded"], [])
+        self.assertLess(
+            report["import_time"],
+            STARTUP_IMPORT_BUDGET,
+            f"Startup imports too slow: {report['import_time']:.3f}s",
+        )
+    
+    def test_profile_startup(self):
+        """Test that --profile-startup reports per-module import times"""
+        result = runner.invoke(app, ["main", "--profile-startup"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("total", result.stdout)
+        self.assertIn("fast path", result.stdout)
+        self.assertIn("config", result.stdout)
+    
+    def test_cached_message_skips_generation(self):
+        """A cached message for the staged tree is reused without loading the LLM client"""
+        from core.analyzer import PROMPT_VERSION
+        from core.cache import ResponseCache, cache_key
+        
+        with tempfile.TemporaryDirectory() as tmpdir, tempfile.TemporaryDirectory() as cache_dir:
+            subprocess.run(["git", "init", "-q", tmpdir], check=True)
+            with open(os.path.join(tmpdir, "app.py"), "w") as f:
+                f.write("print('hello')\n" * 10)
+            with open(os.path.join(tmpdir, ".commitpilotignore"), "w") as f:
+                f.write("*.lock\n")
+            subprocess.run(["git", "add", "app.py"], cwd=tmpdir, check=True)
+            tree = subprocess.run(
+                ["git", "write-tree"], cwd=tmpdir, capture_output=True, text=True, check=True
+            ).stdout.strip()
+            
+            env = {
+                **os.environ,
+                "PYTHONPATH": PACKAGE_DIR,
+                "EDGE_RESPONSE_CACHE": cache_dir,
+                "OPENAI_MODEL": "gpt-4",
+            }
+            ResponseCache(cache_dir).put(cache_key(tree, "gpt-4", PROMPT_VERSION), "feat: add app")
+            
+            completed = subprocess.run(
+                [sys.executable, "-c", CACHED_RUN_SCRIPT],
+                cwd=tmpdir,
+                capture_output=True,
+                text=True,
+                env=env,
+                check=True,
+            )
+        
+        report = json.loads(completed.stdout.strip().splitlines()[-1])
+        self.assertEqual(report["exit_code"], 0, report["output"])
+        self.assertIn("feat: add app", report["output"])
+        self.assertIn("cached", report["output"])
+        self.assertEqual(report["loaded"], [])
+        # A cache hit never samples staged content to look for generated files
+        self.assertNotIn("cat-file", report["git"])
+    
+    def test_lockfile_only_commit_skips_the_model(self):
+        """Staged files the filters drop are still described when a rule covers them"""
+        with tempfile.TemporaryDirectory() as tmpdir, tempfile.TemporaryDirectory() as cache_dir:
+            subprocess.run(["git", "init", "-q", tmpdir], check=True)
+            with open(os.path.join(tmpdir, "yarn.lock"), "w") as f:
+                f.write("lock\n")
+            with open(os.path.join(tmpdir, ".commitpilotignore"), "w") as f:
+                f.write("*.lock\n")
+            subprocess.run(["git", "add", "yarn.lock"], cwd=tmpdir, check=True)
+            
+            env = {
+                **os.environ,
+                "PYTHONPATH": PACKAGE_DIR,
+                "EDGE_RESPONSE_CACHE": cache_dir,
+                "EDGE_DAEMON_SOCKET": os.path.join(cache_dir, "daemon.sock"),
+            }
+            completed = subprocess.run(
+                [sys.executable, "-c", CACHED_RUN_SCRIPT],
+                cwd=tmpdir,
+                capture_output=True,
+                text=True,
+                env=env,
+                check=True,
+            )
+        
+        report = json.loads(completed.stdout.strip().splitlines()[-1])
+        self.assertEqual(report["exit_code"], 0, report["output"])
+        self.assertIn("chore(deps): add yarn.lock", report["output"])
+        self.assertIn("no model needed", report["output"])
+        self.assertNotIn("llm.openai", report["loaded"])
+    
+    def test_no_cache_option_exists(self):
+        """Test that --no-cache option is recognized"""
+        result = runner.invoke(app, ["main", "--help"])
+        self.assertIn("--no-cache", result.stdout)
@@ -0,0 +1,311 @@
+import http.server
+import json
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from config import Config
+from core import tokenizer
+from core.analyzer import DiffSummary, FileSummary, SymbolChange
+from daemon import CommitDaemon, DaemonClient, summary_from_dict, summary_to_dict
+from tests.test_filters import CharEncoder
+
+
+class StubAPIHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def _reply(self, body: dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        self.server.requests.append(("GET", self.path))
+        model = self.path.rsplit("/", 1)[-1]
+        self._reply({"id": model, "object": "model", "created": 0, "owned_by": "stub"})
+
+    def _stream(self, model: str) -> None:
+        with self.server.lock:
+            index = self.server.streams
+            self.server.streams += 1
+        tokens, delay = self.server.tokens, self.server.token_delay
+        if self.server.replies:
+            tokens, delay = self.server.replies[index % len(self.server.replies)]
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for token in tokens:
+                event = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": 0,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                }
+                self._write_chunk(f"data: {json.dumps(event)}\n\n".encode())
+                self.server.streamed += 1
+                time.sleep(delay)
+            self._write_chunk(b"data: [DONE]\n\n")
+            self._write_chunk(b"")
+        except OSError:
+            # The client hung up mid-stream
+            self.server.cancelled.set()
+            self.close_connection = True
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(("POST", self.path))
+        self.server.bodies.append(body)
+        if body.get("stream"):
+            self._stream(body["model"])
+            return
+        self._reply({
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.server.message},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    def log_message(self, *args):
+        pass
+
+
+class StubAPI(http.server.ThreadingHTTPServer):
+    """Stands in for the OpenAI API and counts the TCP connections it accepts.
+
+    Streamed completions send tokens one server-sent event at a time.  With
+    replies set, the nth streamed request gets the nth (tokens, delay) pair.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        message: str = "feat: add app",
+        tokens: tuple[str, ...] = (),
+        token_delay: float = 0.0,
+        replies: tuple[tuple[tuple[str, ...], float], ...] = (),
+    ):
+        super().__init__(("127.0.0.1", 0), StubAPIHandler)
+        self.message = message
+        self.tokens = tokens or (message,)
+        self.token_delay = token_delay
+        self.replies = replies
+        self.streams = 0
+        self.streamed = 0
+        self.cancelled = threading.Event()
+        self.connections = 0
+        self.requests: list[tuple[str, str]] = []
+        self.bodies: list[dict] = []
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+
+def make_repo(path: str) -> None:
+    subprocess.run(["git", "init", "-q", path], check=True)
+    Path(path, "app.py").write_text("print('hello')\n" * 10)
+    Path(path, "yarn.lock").write_text("lock\n")
+    Path(path, ".commitpilotignore").write_text("*.lock\n")
+
+
+def stage(repo: str, *paths: str) -> None:
+    subprocess.run(["git", "add", *paths], cwd=repo, check=True)
+
+
+class TestCommitDaemon(unittest.TestCase):
+    def setUp(self):
+        self.api = StubAPI()
+        threading.Thread(target=self.api.serve_forever, daemon=True).start()
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.repo = os.path.join(self.tmpdir.name, "repo")
+        make_repo(self.repo)
+        self.socket = Path(self.tmpdir.name, "daemon.sock")
+
+        self._saved = dict(tokenizer._encodings)
+        tokenizer.register_encoding("cl100k_base", CharEncoder())
+        self.env = patch.dict(os.environ, {
+            "OPENAI_API_KEY": "test-key",
+            "OPENAI_MODEL": "gpt-4",
+            "OPENAI_BASE_URL": self.api.base_url,
+        })
+        self.env.start()
+
+        self.config = Config()
+        self.daemon = CommitDaemon(self.config, idle_timeout=0)
+        ready = threading.Event()
+        self.server = threading.Thread(target=self.daemon.serve, args=(self.socket, ready), daemon=True)
+        self.server.start()
+        ready.wait(5)
+
+    def tearDown(self):
+        self.daemon.shutdown()
+        self.server.join(5)
+        self.env.stop()
+        tokenizer._encodings.clear()
+        tokenizer._encodings.update(self._saved)
+        self.api.shutdown()
+        self.api.server_close()
+        self.tmpdir.cleanup()
+
+    def generate(self):
+        client = DaemonClient.connect(self.socket)
+        self.assertIsNotNone(client)
+        with client:
+            return client.generate(self.repo, self.config)
+
+    def wait_for_warm_up(self):
+        deadline = time.monotonic() + 5
+        while ("GET", "/v1/models/gpt-4") not in self.api.requests:
+            self.assertLess(time.monotonic(), deadline, "daemon never connected to the API")
+            time.sleep(0.01)
+
+    def test_generate_reuses_api_connection(self):
+        stage(self.repo, "app.py")
+        self.wait_for_warm_up()
+
+        first = self.generate()
+        second = self.generate()
+
+        self.assertEqual(first.message, "feat: add app")
+        self.assertEqual(second.message, "feat: add app")
+        self.assertEqual([f.path for f in first.summary.files], ["app.py"])
+        self.assertIn("generate", {name for name, _, _ in first.timings})
+        # Warm-up and both completions went over the one pooled connection
+        self.assertEqual(self.api.connections, 1)
+        self.assertEqual(self.api.requests.count(("POST", "/v1/chat/completions")), 2)
+
+    def test_keeps_serving_after_generate(self):
+        stage(self.repo, "app.py")
+        self.assertEqual(self.generate().message, "feat: add app")
+
+        self.assertTrue(self.server.is_alive())
+        client = DaemonClient.connect(self.socket)
+        self.assertIsNotNone(client)
+        with client:
+            self.assertTrue(client.request("ping")["ok"])
+        self.assertEqual(self.generate().message, "feat: add app")
+
+    def test_all_files_ignored(self):
+        stage(self.repo, "yarn.lock")
+        result = self.generate()
+        self.assertIsNone(result.summary)
+        self.assertNotIn(("POST", "/v1/chat/completions"), self.api.requests)
+
+    def test_trivial_change_skips_the_model(self):
+        Path(self.repo, "README.md").write_text("# App\n")
+        stage(self.repo, "README.md")
+        result = self.generate()
+        self.assertEqual(result.message, "docs: add README.md")
+        self.assertTrue(result.heuristic)
+        self.assertNotIn(("POST", "/v1/chat/completions"), self.api.requests)
+
+    def test_generated_files_left_out(self):
+        Path(self.repo, "bundle.js").write_text("!function(){var a={};a.b=function(c){return c&&c.d?c:{e:c}};}();" * 100)
+        stage(self.repo, "app.py", "bundle.js")
+        result = self.generate()
+        self.assertEqual([f.path for f in result.summary.files], ["app.py"])
+        prompt = self.api.bodies[-1]["messages"][-1]["content"]
+        self.assertNotIn("bundle.js", prompt)
+
+    def test_generated_detection_setting_not_shared(self):
+        Path(self.repo, "bundle.js").write_text("!function(){var a={};a.b=function(c){return c&&c.d?c:{e:c}};}();" * 100)
+        stage(self.repo, "app.py", "bundle.js")
+        self.assertEqual([f.path for f in self.generate().summary.files], ["app.py"])
+
+        # A client that turned detection off must not get the filter built for one that had it on
+        self.config = self.config.model_copy(update={"detect_generated": False})
+        self.assertEqual([f.path for f in self.generate().summary.files], ["app.py", "bundle.js"])
+
+    def test_ignore_rules_reloaded_when_changed(self):
+        stage(self.repo, "app.py")
+        self.assertIsNotNone(self.generate().summary)
+
+        Path(self.repo, ".commitpilotignore").write_text("*.lock\n*.py\n")
+        self.assertIsNone(self.generate().summary)
+
+    def test_ignore_rules_kept_between_requests(self):
+        Path(self.repo, "src").mkdir()
+        Path(self.repo, "src", "main.py").write_text("x = 1\n")
+        stage(self.repo, "src/main.py")
+        self.generate()
+        diff_filter = self.daemon._diff_filter(self.config, Path(self.repo))
+        self.generate()
+        self.assertIs(self.daemon._diff_filter(self.config, Path(self.repo)), diff_filter)
+
+        # A nested ignore file appearing in a directory already looked at
+        Path(self.repo, "src", ".commitpilotignore").write_text("*.py\n")
+        self.assertIsNone(self.generate().summary)
+
+    def test_missing_ignore_file_is_a_config_error(self):
+        stage(self.repo, "app.py")
+        os.unlink(os.path.join(self.repo, ".commitpilotignore"))
+        with self.assertRaises(ValueError):
+            self.generate()
+
+    def test_shutdown_removes_socket(self):
+        with DaemonClient.connect(self.socket) as client:
+            client.shutdown()
+        self.server.join(5)
+        self.assertFalse(self.server.is_alive())
+        self.assertFalse(self.socket.exists())
+
+
+class TestDaemonClient(unittest.TestCase):
+    def test_connect_without_daemon(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir, "daemon.sock")
+            self.assertIsNone(DaemonClient.connect(path))
+            # A socket file left behind by a daemon that was killed
+            path.touch()
+            self.assertIsNone(DaemonClient.connect(path))
+
+    def test_summary_round_trip(self):
+        summary = DiffSummary(
+            files=[FileSummary("src/app.py", 3, 1, "modified")],
+            total_added=3,
+            total_removed=1,
+            change_type="feat",
+            contents="diff --git a/src/app.py b/src/app.py",
+            redactions={"src/app.py": 1},
+            symbols={"src/app.py": [SymbolChange("function", "main", "modified")]},
+        )
+        restored = summary_from_dict(json.loads(json.dumps(summary_to_dict(summary))))
+        self.assertEqual(restored.files, summary.files)
+        self.assertEqual(restored.redactions, {"src/app.py": 1})
+        self.assertEqual(restored.symbols, summary.symbols)
+        # The packed diff never leaves the daemon
+        self.assertEqual(restored.contents, "")
+
+
+if __name__ == "__main__":
+    unittest.main()
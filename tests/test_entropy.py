@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import patch
+
+from core import entropy
+from core.entropy import EntropyDetector, shannon_entropy
+from core.redaction import SecretRedactor
+
+RANDOM_TOKEN = "q8Xv2LpZ7mN4cR1tY9wB6kJ3hF5dG0sA"
+RANDOM_HEX = "9f86d081884c7d659a2f"
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+class TestShannonEntropy(unittest.TestCase):
+    def test_known_values(self):
+        self.assertEqual(shannon_entropy(["aaaa", "abcd", "aabb"]), [0.0, 2.0, 1.0])
+    
+    def test_empty_batch(self):
+        self.assertEqual(shannon_entropy([]), [])
+    
+    def test_large_batch_without_numpy_uses_python(self):
+        values = [RANDOM_TOKEN, "aaaa"] * entropy.NUMPY_MIN_BATCH
+        with patch("core.entropy._load_numpy", return_value=None):
+            self.assertEqual(shannon_entropy(values), entropy._entropy_python(values))
+    
+    @unittest.skipUnless(numpy, "numpy not installed")
+    def test_numpy_matches_python(self):
+        values = [RANDOM_TOKEN, RANDOM_HEX, "aaaa", "abcd", "snake_case_identifier"] * 100
+        batched = entropy._entropy_numpy(numpy, values)
+        for got, expected in zip(batched, entropy._entropy_python(values)):
+            self.assertAlmostEqual(got, expected)
+
+
+class TestEntropyDetector(unittest.TestCase):
+    def setUp(self):
+        self.detector = EntropyDetector()
+    
+    def test_flags_random_values_by_charset(self):
+        self.assertEqual(
+            self.detector.classify([RANDOM_TOKEN, RANDOM_HEX, "src/components/button.tsx"]),
+            ["base64", "hex", None],
+        )
+    
+    def test_skips_short_and_whitespace_values(self):
+        self.assertEqual(
+            self.detector.classify(["q8Xv2LpZ7m", "q8Xv2LpZ7m N4cR1tY9wB6kJ3hF5dG0sA"]),
+            [None, None],
+        )
+    
+    def test_thresholds_are_configurable(self):
+        strict = EntropyDetector(base64_threshold=5.5, hex_threshold=4.5)
+        self.assertEqual(strict.classify([RANDOM_TOKEN, RANDOM_HEX]), [None, None])
+        
+        short = EntropyDetector(min_length=12)
+        self.assertEqual(short.classify(["q8Xv2LpZ7mN4"]), [None])
+        self.assertEqual(EntropyDetector(min_length=12, base64_threshold=3.5).classify(["q8Xv2LpZ7mN4"]), ["base64"])
+    
+    def test_from_config(self):
+        class Settings:
+            entropy_min_length = 16
+            entropy_base64_threshold = 4.0
+            entropy_hex_threshold = 2.5
+        
+        detector = EntropyDetector.from_config(Settings())
+        self.assertEqual(
+            (detector.min_length, detector.base64_threshold, detector.hex_threshold),
+            (16, 4.0, 2.5),
+        )
+
+
+class TestRedactorEntropy(unittest.TestCase):
+    def setUp(self):
+        self.redactor = SecretRedactor()
+    
+    def test_redacts_random_quoted_value(self):
+        redacted = self.redactor.redact_diff(f'+    client = Client("{RANDOM_TOKEN}")')
+        self.assertEqual(redacted, '+    client = Client("q8Xv...G0sA")')
+    
+    def test_redacts_unquoted_assignment(self):
+        diff = f"+STRIPE_LIVE={RANDOM_TOKEN}\n+DEBUG=1\n"
+        self.assertEqual(self.redactor.redact_diff(diff), "+STRIPE_LIVE=q8Xv...G0sA\n+DEBUG=1\n")
+        self.assertTrue(self.redactor.has_potential_secrets(diff))
+    
+    def test_only_changed_lines_are_scored(self):
+        diff = f"-STRIPE_LIVE={RANDOM_TOKEN}\n STRIPE_TEST={RANDOM_TOKEN}"
+        self.assertEqual(
+            self.redactor.redact_diff(diff), f"-STRIPE_LIVE=q8Xv...G0sA\n STRIPE_TEST={RANDOM_TOKEN}"
+        )
+        # A removed value is masked but does not flag the change
+        self.assertFalse(self.redactor.has_potential_secrets(diff))
+    
+    def test_ordinary_code_is_untouched(self):
+        diff = (
+            '+    url = "https://api.example.com/v1/items"\n'
+            "+    path = os.path.join(base_directory, relative_name)\n"
+            '+    label = "Processing item of the queue please wait"\n'
+        )
+        self.assertEqual(self.redactor.redact_diff(diff), diff)
@@ -1,7 +1,18 @@
 import unittest
 
 from config import Config
-from core.filters import DiffFilter
+from core.filters import DiffFilter, allocate_token_budget
+from core.git import FileDiff, Hunk, NumStat
+
+
+class CharEncoder:
+    """One token per character, so budgets are easy to reason about."""
+    
+    def encode(self, text):
+        return list(text)
+    
+    def decode(self, tokens):
+        return "".join(tokens)
 
 
 class TestDiffFilter(unittest.TestCase):
@@ -60,4 +71,95 @@ index 1234567..abcdefg 100644
         # Should contain main.py and README.md but not package-lock.json
         self.assertIn("src/main.py", filtered)
         self.assertIn("README.md", filtered)
-        self.assertNotIn("package-lock.json", filtered)
\ No newline at end of file
+        self.assertNotIn("package-lock.json", filtered)
+    
+    def test_clamp_large_file_diff(self):
+        diff_content = (
+            "diff --git a/big.sql b/big.sql\n"
+            "@@ -0,0 +1,5 @@\n"
+            + "".join(f"+INSERT {i};\n" for i in range(5))
+            + "diff --git a/app.py b/app.py\n"
+            "@@ -1 +1 @@\n"
+            "-a\n"
+            "+b"
+        )
+        
+        clamped = self.diff_filter.clamp_large_file_diff(diff_content, max_lines=4)
+        
+        self.assertEqual(clamped, (
+            "diff --git a/big.sql b/big.sql\n"
+            "@@ -0,0 +1,5 @@\n"
+            "+INSERT 0;\n"
+            "+INSERT 1;\n"
+            "diff --git a/app.py b/app.py\n"
+            "@@ -1 +1 @@\n"
+            "-a\n"
+            "+b"
+        ))
+    
+    def test_pack_file_diffs_skips_ignored_files(self):
+        self.diff_filter._encoder = CharEncoder()
+        file_diffs = [
+            FileDiff(path="package-lock.json", header=["diff --git a/package-lock.json b/package-lock.json"]),
+            FileDiff(path="src/main.py", header=["diff --git a/src/main.py b/src/main.py"]),
+        ]
+        
+        result = self.diff_filter.pack_file_diffs(file_diffs)
+        
+        self.assertNotIn("package-lock.json", result)
+        self.assertIn("src/main.py", result)
+    
+    def test_allocate_token_budget_is_fair(self):
+        self.assertEqual(allocate_token_budget([10, 20, 30], [1, 1, 1], 1000), [10, 20, 30])
+        
+        allocations = allocate_token_budget([10, 5000, 5000], [1, 1, 1], 1000)
+        self.assertEqual(allocations[0], 10)
+        self.assertEqual(allocations[1], allocations[2])
+        self.assertLessEqual(sum(allocations), 1000)
+        
+        allocations = allocate_token_budget([5000, 5000], [1, 3], 1000)
+        self.assertEqual(allocations, [250, 750])
+    
+    def test_pack_file_diffs_huge_first_file_does_not_starve_others(self):
+        self.diff_filter._encoder = CharEncoder()
+        dump = FileDiff(
+            path="db/dump.sql",
+            header=["diff --git a/db/dump.sql b/db/dump.sql", "new file mode 100644"],
+            hunks=[
+                Hunk(header="@@ -0,0 +1,5000 @@", lines=[f"+INSERT INTO t VALUES ({i});" for i in range(5000)]),
+            ],
+        )
+        small = [
+            FileDiff(
+                path=f"src/module_{i}.py",
+                header=[f"diff --git a/src/module_{i}.py b/src/module_{i}.py"],
+                hunks=[Hunk(header="@@ -1 +1 @@", lines=["-old", f"+new_{i}"])],
+            )
+            for i in range(5)
+        ]
+        numstats = [NumStat(added=5000, removed=0, file_path="db/dump.sql")] + [
+            NumStat(added=1, removed=1, file_path=f"src/module_{i}.py") for i in range(5)
+        ]
+        
+        packed = self.diff_filter.pack_file_diffs([dump, *small], numstats, max_tokens=2000)
+        
+        self.assertLessEqual(len(packed), 2000)
+        for i in range(5):
+            self.assertIn(f"+new_{i}", packed)
+        self.assertIn("diff --git a/db/dump.sql b/db/dump.sql", packed)
+        self.assertIn("new file mode 100644", packed)
+        self.assertIn("@@ -0,0 +1,5000 @@", packed)
+        self.assertIn("+INSERT INTO t VALUES (0);", packed)
+        self.assertIn("lines omitted by CommitPilot", packed)
+    
+    def test_pack_file_diffs_keeps_everything_that_fits(self):
+        self.diff_filter._encoder = CharEncoder()
+        file_diff = FileDiff(
+            path="src/main.py",
+            header=["diff --git a/src/main.py b/src/main.py", "--- a/src/main.py", "+++ b/src/main.py"],
+            hunks=[Hunk(header="@@ -1 +1 @@", lines=["-a", "+b"])],
+        )
+        
+        packed = self.diff_filter.pack_file_diffs([file_diff], [NumStat(1, 1, "src/main.py")])
+        
+        self.assertEqual(packed, file_diff.text + "\n")
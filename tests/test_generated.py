@@ -0,0 +1,139 @@
+import os
+import subprocess
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from config import Config
+from core.filters import DiffFilter
+from core.generated import SAMPLE_BYTES, GeneratedFileDetector, classify_sample
+from core.git import StagedDiffStream
+from tests.test_analyzer import git_repo
+
+SOURCE = b"".join(b"def handler_%d(request):\n    return respond(request, %d)\n\n" % (i, i) for i in range(40))
+MINIFIED = b"!function(e,t){'use strict';var n={};" + b"n[e]=function(t){return t&&t.a?t:{b:t}};" * 200 + b"}();\n"
+PROTOBUF = (
+    b"# -*- coding: utf-8 -*-\n"
+    b"# Generated by the protocol buffer compiler.  DO NOT EDIT!\n"
+    b"# source: api.proto\n"
+) + SOURCE
+
+
+class TestClassifySample(unittest.TestCase):
+    def test_generator_markers(self):
+        self.assertEqual(classify_sample(PROTOBUF, "api_pb2.py"), "generated")
+        self.assertEqual(
+            classify_sample(b"// Code generated by protoc-gen-go. DO NOT EDIT.\npackage api\n", "api.pb.go"), "generated"
+        )
+        self.assertEqual(classify_sample(b"/**\n * @generated\n */\nexport const a = 1;\n", "schema.ts"), "generated")
+        self.assertEqual(
+            classify_sample(b"// Jest Snapshot v1, https://goo.gl/fbAQLP\n\nexports[`a`] = `1`;\n", "a.test.js.snap"),
+            "generated",
+        )
+        self.assertEqual(classify_sample(b"-- Generated by sqlc. DO NOT EDIT.\nSELECT 1;\n", "query.sql"), "generated")
+
+    def test_marker_outside_a_comment(self):
+        self.assertIsNone(classify_sample(b'NOTICE = "DO NOT EDIT"\n' + SOURCE, "app.py"))
+
+    def test_marker_in_another_languages_comment(self):
+        readme = b"# Schema\n\n* Do not edit the files under gen/ by hand.\n* Run `make gen` instead.\n"
+        self.assertIsNone(classify_sample(readme, "README.md"))
+        self.assertIsNone(classify_sample(b"; DO NOT EDIT\nx = 1\n", "app.py"))
+        self.assertEqual(classify_sample(b"<!-- DO NOT EDIT: generated by mkdocs -->\n", "index.md"), "generated")
+
+    def test_marker_far_from_the_top(self):
+        self.assertIsNone(classify_sample(SOURCE + b"# DO NOT EDIT below this line\n", "app.py"))
+
+    def test_minified(self):
+        self.assertEqual(classify_sample(MINIFIED, "static/app.js"), "minified")
+
+    def test_ordinary_source(self):
+        self.assertIsNone(classify_sample(SOURCE, "app.py"))
+        # One long line of prose does not make a file minified
+        self.assertIsNone(classify_sample(SOURCE + b"# " + b"words and more words " * 60 + b"\n", "app.py"))
+
+    def test_unwrapped_prose(self):
+        paragraph = b"This guide explains how the service is deployed, which settings matter and why. " * 5
+        document = b"# Deploying\n\n" + b"\n\n".join([paragraph] * 6) + b"\n"
+        self.assertIsNone(classify_sample(document, "docs/deploy.md"))
+        self.assertIsNone(classify_sample(document, "NOTES.txt"))
+
+    def test_cut_line_not_measured(self):
+        sample = SOURCE + b"a(){};" * 700
+        self.assertEqual(classify_sample(sample, "app.js"), "minified")
+        self.assertIsNone(classify_sample(sample, "app.js", complete=False))
+
+
+class TestGeneratedFileDetector(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.repo = self.tmpdir.name
+        git_repo(self.repo, {"old.py": "x = 1\n"})
+
+    def stage(self, files: dict[str, bytes]):
+        for name, data in files.items():
+            Path(self.repo, name).parent.mkdir(parents=True, exist_ok=True)
+            Path(self.repo, name).write_bytes(data)
+        subprocess.run(["git", "add", "-A"], cwd=self.repo, check=True)
+        with StagedDiffStream(cwd=self.repo) as stream:
+            return stream.numstats
+
+    def test_classifies_staged_blobs(self):
+        os.unlink(Path(self.repo, "old.py"))
+        numstats = self.stage({
+            "api/api_pb2.py": PROTOBUF,
+            "static/app.js": MINIFIED * 10,
+            "app.py": SOURCE,
+        })
+        self.assertEqual(GeneratedFileDetector().classify(numstats, self.repo), {
+            "api/api_pb2.py": "generated",
+            "static/app.js": "minified",
+        })
+
+    def test_only_the_head_is_read(self):
+        numstats = self.stage({"big.py": SOURCE * 100})
+        with patch("core.generated.classify_sample", return_value=None) as classify:
+            GeneratedFileDetector().classify(numstats, self.repo)
+        sample = classify.call_args.args[0]
+        self.assertEqual(len(sample), SAMPLE_BYTES)
+        self.assertFalse(classify.call_args.kwargs["complete"])
+
+    def test_known_blobs_not_sampled_again(self):
+        detector = GeneratedFileDetector()
+        numstats = self.stage({"static/app.js": MINIFIED, "app.py": SOURCE})
+        detector.classify(numstats, self.repo)
+
+        numstats = self.stage({"static/app.js": MINIFIED, "app.py": SOURCE + b"x = 2\n"})
+        with patch("core.generated.classify_sample", wraps=classify_sample) as classify:
+            self.assertEqual(detector.classify(numstats, self.repo), {"static/app.js": "minified"})
+        # Only the changed blob was read
+        self.assertEqual(classify.call_count, 1)
+
+    def test_same_blob_judged_per_extension(self):
+        notice = b"/*\n * DO NOT EDIT: written by tools/gen.py\n */\n"
+        numstats = self.stage({"gen/table.c": notice, "NOTES.md": notice})
+        detector = GeneratedFileDetector()
+        self.assertEqual(detector.classify(numstats, self.repo), {"gen/table.c": "generated"})
+        # Remembered verdicts are not shared between the two names either
+        self.assertEqual(detector.classify(numstats, self.repo), {"gen/table.c": "generated"})
+
+    def test_verdicts_bounded(self):
+        detector = GeneratedFileDetector(max_entries=2)
+        numstats = self.stage({f"mod{i}.py": SOURCE + b"x = %d\n" % i for i in range(3)})
+        detector.classify(numstats, self.repo)
+        self.assertEqual(len(detector._verdicts), 2)
+
+    def test_diff_filter_setting(self):
+        numstats = self.stage({"static/app.js": MINIFIED})
+        Path(self.repo, ".commitpilotignore").write_text("")
+        enabled = DiffFilter(Config(_env_file=None), Path(self.repo, ".commitpilotignore"))
+        disabled = DiffFilter(Config(_env_file=None, EDGE_DETECT_GENERATED=False), Path(self.repo, ".commitpilotignore"))
+
+        self.assertEqual(enabled.find_generated_files(numstats, self.repo), {"static/app.js": "minified"})
+        self.assertEqual(disabled.find_generated_files(numstats, self.repo), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,46 @@
+import io
+import pickle
 import subprocess
+import tempfile
 from pathlib import Path
 from unittest.mock import Mock, patch
 
 import unittest
 
-from core.git import GitError, create_commit, get_staged_diff, has_staged_changes
+from core.git import (
+    FileDiff,
+    GitError,
+    GitObjectReader,
+    Hunk,
+    StagedDiffStream,
+    create_commit,
+    get_staged_diff,
+    has_staged_changes,
+    parse_patch,
+)
+from tests.test_analyzer import git_repo
+
+COMBINED_DIFF_OUTPUT = (
+    "0\t0\t\0d/old.txt\0d/new.txt\0"
+    "2\t1\tf.txt\0"
+    "-\t-\tlogo.png\0"
+    "\0"
+    "diff --git a/d/old.txt b/d/new.txt\n"
+    "similarity index 100%\n"
+    "rename from d/old.txt\n"
+    "rename to d/new.txt\n"
+    "diff --git a/f.txt b/f.txt\n"
+    "index 422c2b7..6372083 100644\n"
+    "--- a/f.txt\n"
+    "+++ b/f.txt\n"
+    "@@ -2 +2,2 @@ a\n"
+    "-b\n"
+    "+c\n"
+    "+d\n"
+    "diff --git a/logo.png b/logo.png\n"
+    "index 1234567..abcdefg 100644\n"
+    "Binary files a/logo.png and b/logo.png differ\n"
+)
 
 
 class TestGitFunctions(unittest.TestCase):
@@ -75,6 +111,15 @@ class TestGitFunctions(unittest.TestCase):
         with self.assertRaises(ValueError):
             create_commit("")
 
+    @patch("core.git.has_staged_changes")
+    @patch("subprocess.run")
+    def test_create_commit_skips_staged_check(self, mock_run, mock_has_staged):
+        mock_run.return_value = Mock(stdout="", stderr="", returncode=0)
+        
+        create_commit("feat: add new feature", check_staged=False)
+        mock_has_staged.assert_not_called()
+        mock_run.assert_called_once()
+
     @patch("core.git.has_staged_changes")
     def test_create_commit_no_staged_changes(self, mock_has_staged):
         mock_has_staged.return_value = False
@@ -89,4 +134,247 @@ class TestGitFunctions(unittest.TestCase):
         
         has_staged_changes(cwd=test_path)
         mock_run.assert_called_once()
-        self.assertEqual(mock_run.call_args[1]["cwd"], test_path)
\ No newline at end of file
+        self.assertEqual(mock_run.call_args[1]["cwd"], test_path)
+
+
+def mock_popen_process(output: bytes, returncode=None, stderr: bytes = b""):
+    process = Mock()
+    process.stdout = io.BufferedReader(io.BytesIO(output))
+    process.stderr = io.BytesIO(stderr)
+    process.poll.return_value = returncode
+    return process
+
+
+class TestStagedDiffStream(unittest.TestCase):
+    @patch("subprocess.Popen")
+    def test_streams_numstats_and_files(self, mock_popen):
+        mock_popen.return_value = mock_popen_process(COMBINED_DIFF_OUTPUT.encode())
+        
+        with StagedDiffStream(chunk_size=16) as stream:
+            self.assertEqual(
+                [s.file_path for s in stream.numstats], ["d/new.txt", "f.txt", "logo.png"]
+            )
+            renamed, modified, binary = stream.numstats
+            files = list(stream)
+        
+        self.assertTrue(renamed.is_renamed)
+        self.assertEqual(renamed.old_path, "d/old.txt")
+        self.assertEqual((modified.added, modified.removed), (2, 1))
+        self.assertTrue(binary.is_binary)
+        
+        self.assertEqual([f.path for f in files], ["d/new.txt", "f.txt", "logo.png"])
+        self.assertEqual(files[0].hunks, [])
+        self.assertEqual(files[1].hunks[0].header, "@@ -2 +2,2 @@ a")
+        self.assertEqual(files[1].hunks[0].lines, ["-b", "+c", "+d"])
+        self.assertIn("+++ b/f.txt", files[1].text)
+        self.assertIn("Binary files", files[2].text)
+        self.assertEqual(mock_popen.call_args[0][0][:3], ["git", "diff", "--cached"])
+
+    @patch("subprocess.Popen")
+    def test_skips_ignored_paths_as_they_arrive(self, mock_popen):
+        mock_popen.return_value = mock_popen_process(COMBINED_DIFF_OUTPUT.encode())
+        
+        with StagedDiffStream(skip=lambda path: path.endswith(".png")) as stream:
+            files = list(stream)
+        
+        self.assertEqual([f.path for f in files], ["d/new.txt", "f.txt"])
+
+    @patch("subprocess.Popen")
+    def test_max_file_lines(self, mock_popen):
+        mock_popen.return_value = mock_popen_process(COMBINED_DIFF_OUTPUT.encode())
+        
+        with StagedDiffStream(max_file_lines=5) as stream:
+            files = list(stream)
+        
+        self.assertEqual(files[1].hunks[0].lines, [])
+        self.assertEqual(files[1].omitted_lines, 3)
+
+    @patch("subprocess.Popen")
+    def test_stops_reading_once_last_file_is_full(self, mock_popen):
+        output = (
+            "100000\t0\tdump.sql\0\0"
+            "diff --git a/dump.sql b/dump.sql\n"
+            "new file mode 100644\n"
+            "--- /dev/null\n"
+            "+++ b/dump.sql\n"
+            "@@ -0,0 +1,100000 @@\n"
+        ).encode() + b"+INSERT INTO t VALUES (1);\n" * 100_000
+        process = mock_popen_process(output)
+        mock_popen.return_value = process
+        
+        with StagedDiffStream(max_file_lines=50) as stream:
+            files = list(stream)
+            read = process.stdout.raw.tell()
+        
+        self.assertEqual([f.path for f in files], ["dump.sql"])
+        self.assertEqual(len(files[0].hunks[0].lines), 45)
+        self.assertEqual(files[0].omitted_lines, 100_000 - 45)
+        # Nothing past the budget was needed, so the rest of git's output was left unread
+        self.assertLess(read, len(output) // 10)
+        process.terminate.assert_called_once()
+
+    @patch("subprocess.Popen")
+    def test_close_terminates_running_git(self, mock_popen):
+        process = mock_popen_process(COMBINED_DIFF_OUTPUT.encode())
+        mock_popen.return_value = process
+        
+        with StagedDiffStream() as stream:
+            next(iter(stream))
+        
+        process.terminate.assert_called_once()
+        process.wait.assert_called_once()
+
+    @patch("subprocess.Popen")
+    def test_git_failure_raises(self, mock_popen):
+        mock_popen.return_value = mock_popen_process(
+            b"", returncode=128, stderr=b"fatal: not a git repository"
+        )
+        
+        with self.assertRaises(GitError):
+            StagedDiffStream()
+
+    def test_typechange_keeps_later_paths(self):
+        with tempfile.TemporaryDirectory() as repo:
+            git_repo(repo, {"a.txt": "a\n", "b.txt": "b\n", "c.txt": "c\n"})
+            Path(repo, "b.txt").unlink()
+            Path(repo, "b.txt").symlink_to("a.txt")
+            Path(repo, "c.txt").write_text("cc\n")
+            Path(repo, "d.txt").write_text("d\n")
+            subprocess.run(["git", "add", "-A"], cwd=repo, check=True)
+
+            with StagedDiffStream(cwd=repo) as stream:
+                files = list(stream)
+
+        # A file replaced by a symlink is two patch sections but one numstat record
+        self.assertEqual([f.path for f in files], ["b.txt", "c.txt", "d.txt"])
+        self.assertIn("deleted file mode 100644", files[0].header)
+        self.assertIn("new file mode 120000", files[0].header)
+        self.assertEqual(len(files[0].hunks), 2)
+        self.assertEqual(files[1].hunks[0].lines, ["-c", "+cc"])
+        self.assertEqual(files[2].hunks[0].lines, ["+d"])
+
+    def test_quoted_paths_match_numstats(self):
+        with tempfile.TemporaryDirectory() as repo:
+            git_repo(repo, {"café.txt": "a\n", "plain.txt": "b\n"})
+            Path(repo, "café.txt").write_text("aa\n")
+            Path(repo, "plain.txt").write_text("bb\n")
+            subprocess.run(["git", "add", "-A"], cwd=repo, check=True)
+
+            with StagedDiffStream(cwd=repo) as stream:
+                files = list(stream)
+
+        self.assertEqual([f.path for f in files], ["café.txt", "plain.txt"])
+        self.assertEqual(files[0].hunks[0].lines, ["-a", "+aa"])
+
+
+TWO_HUNK_PATCH = (
+    "diff --git a/app.py b/app.py\n"
+    "--- a/app.py\n"
+    "+++ b/app.py\n"
+    "@@ -1 +1 @@\n"
+    "-a = 1\n"
+    "+a = 2\n"
+    "@@ -9,0 +10,2 @@ def main():\n"
+    "+    print('h\u00e9llo')\n"
+    "+    return a\n"
+)
+
+
+class TestDiffModel(unittest.TestCase):
+    def test_hunks_share_the_file_buffer(self):
+        file_diff, = parse_patch(TWO_HUNK_PATCH)
+        first, second = file_diff.hunks
+        
+        self.assertIs(first.buffer, second.buffer)
+        self.assertEqual(first.lines, ["-a = 1", "+a = 2"])
+        self.assertEqual(second.lines, ["+    print('h\u00e9llo')", "+    return a"])
+        self.assertEqual(second.header, "@@ -9,0 +10,2 @@ def main():")
+        self.assertIsInstance(second.view, memoryview)
+        self.assertEqual(bytes(second.view), "+    print('h\u00e9llo')\n+    return a\n".encode())
+        self.assertEqual(file_diff.line_count, 4)
+        self.assertEqual(file_diff.text, TWO_HUNK_PATCH.rstrip("\n"))
+    
+    def test_records_use_slots(self):
+        file_diff, = parse_patch(TWO_HUNK_PATCH)
+        self.assertFalse(hasattr(file_diff, "__dict__"))
+        self.assertFalse(hasattr(file_diff.hunks[0], "__dict__"))
+    
+    def test_hunk_from_lines_matches_parsed_hunk(self):
+        file_diff, = parse_patch(TWO_HUNK_PATCH)
+        self.assertEqual(file_diff.hunks[0], Hunk(header="@@ -1 +1 @@", lines=["-a = 1", "+a = 2"]))
+        self.assertEqual(Hunk(header="@@ -1 +1 @@", lines=[]).lines, [])
+        self.assertEqual(Hunk.from_text("@@ -1 +1 @@", "+x\n+y").lines, ["+x", "+y"])
+    
+    def test_invalid_utf8_is_replaced_when_decoded(self):
+        file_diff, = parse_patch(b"diff --git a/a.txt b/a.txt\n@@ -0,0 +1 @@\n+caf\xe9\n")
+        self.assertEqual(file_diff.hunks[0].lines, ["+caf\ufffd"])
+    
+    def test_pickles_with_one_shared_buffer(self):
+        # File diffs cross to redaction workers by pickle
+        file_diff, = parse_patch(TWO_HUNK_PATCH)
+        restored = pickle.loads(pickle.dumps(file_diff))
+        self.assertEqual(restored, file_diff)
+        self.assertIs(restored.hunks[0].buffer, restored.hunks[1].buffer)
+    
+    def test_with_hunks_keeps_header(self):
+        file_diff = FileDiff(path="a.py", header=["diff --git a/a.py b/a.py"], omitted_lines=3)
+        changed = file_diff.with_hunks([Hunk(header="@@ -0,0 +1 @@", lines=["+x"])])
+        self.assertEqual(changed.header, file_diff.header)
+        self.assertEqual(changed.omitted_lines, 3)
+        self.assertEqual(file_diff.hunks, [])
+
+
+class TestGitObjectReader(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.repo = self.tmpdir.name
+        git_repo(self.repo, {"app.py": "print('hello')\n", "docs/read me.md": "# App\n"})
+        Path(self.repo, "app.py").write_text("print('goodbye')\n")
+        subprocess.run(["git", "add", "app.py"], cwd=self.repo, check=True)
+
+    def test_staged_and_committed_versions(self):
+        with GitObjectReader(self.repo) as reader:
+            self.assertEqual(reader.read(":app.py"), b"print('goodbye')\n")
+            self.assertEqual(reader.read("HEAD:app.py"), b"print('hello')\n")
+            self.assertEqual(reader.read("HEAD:docs/read me.md"), b"# App\n")
+            self.assertIsNone(reader.read("HEAD:missing.py"))
+
+    def test_objects_carry_id_and_type(self):
+        oid = subprocess.run(
+            ["git", "rev-parse", ":app.py"], cwd=self.repo, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        with GitObjectReader(self.repo) as reader:
+            (spec, obj), = reader.iter_objects([":app.py"])
+        self.assertEqual((spec, obj.oid, obj.type), (":app.py", oid, "blob"))
+
+    def test_batch_costs_one_process(self):
+        # Far more request and response bytes than a pipe buffer holds
+        big = "x = 1\n" * 20_000
+        Path(self.repo, "big.py").write_text(big)
+        subprocess.run(["git", "add", "big.py"], cwd=self.repo, check=True)
+        specs = [":big.py", "HEAD:app.py", ":nope"] * 300
+
+        with patch("subprocess.Popen", wraps=subprocess.Popen) as popen, GitObjectReader(self.repo) as reader:
+            results = [(spec, obj and bytes(obj.data)) for spec, obj in reader.iter_objects(specs)]
+            self.assertEqual(reader.read(":app.py"), b"print('goodbye')\n")
+
+        self.assertEqual(popen.call_count, 1)
+        self.assertEqual([spec for spec, _ in results], specs)
+        self.assertEqual(results[:3], [(":big.py", big.encode()), ("HEAD:app.py", b"print('hello')\n"), (":nope", None)])
+        self.assertEqual(results[-3:], results[:3])
+
+    def test_abandoned_batch_does_not_leak_into_the_next(self):
+        with GitObjectReader(self.repo) as reader:
+            for spec, obj in reader.iter_objects(["HEAD:app.py", ":app.py", "HEAD:docs/read me.md"]):
+                break
+            self.assertEqual(reader.read(":app.py"), b"print('goodbye')\n")
+
+    def test_spec_with_newline_rejected(self):
+        with GitObjectReader(self.repo) as reader, self.assertRaises(ValueError):
+            reader.read("HEAD:app.py\nHEAD:other")
+
+    def test_outside_a_repository(self):
+        with tempfile.TemporaryDirectory() as elsewhere, GitObjectReader(elsewhere) as reader:
+            with self.assertRaises(GitError):
+                reader.read("HEAD:app.py")
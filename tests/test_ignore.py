@@ -0,0 +1,127 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from config import Config
+from core.filters import DiffFilter
+from core.ignore import IgnoreMatcher, read_ignore_file
+
+
+class TestIgnoreMatcher(unittest.TestCase):
+    def test_literal_names_match_at_any_depth(self):
+        matcher = IgnoreMatcher(["package-lock.json"])
+        self.assertTrue(matcher.matches("package-lock.json"))
+        self.assertTrue(matcher.matches("web/package-lock.json"))
+        self.assertFalse(matcher.matches("package.json"))
+
+    def test_extension_suffixes(self):
+        matcher = IgnoreMatcher(["*.png", "*.min.js"])
+        self.assertTrue(matcher.matches("assets/logo.png"))
+        self.assertTrue(matcher.matches("static/app.min.js"))
+        self.assertFalse(matcher.matches("static/app.js"))
+
+    def test_directory_patterns(self):
+        matcher = IgnoreMatcher(["node_modules/", "docs/build/"])
+        self.assertTrue(matcher.matches("node_modules/lib/index.js"))
+        self.assertTrue(matcher.matches("web/node_modules/lib/index.js"))
+        self.assertTrue(matcher.matches("docs/build/index.html"))
+        self.assertFalse(matcher.matches("src/docs/build/index.html"))
+        self.assertFalse(matcher.matches("node_modules.txt"))
+
+    def test_anchored_and_glob_patterns(self):
+        matcher = IgnoreMatcher(["/config/*.local", "snapshot_*.snap", "file?.tmp"])
+        self.assertTrue(matcher.matches("config/dev.local"))
+        self.assertFalse(matcher.matches("config/nested/dev.local"))
+        self.assertTrue(matcher.matches("tests/snapshot_login.snap"))
+        self.assertTrue(matcher.matches("file1.tmp"))
+        self.assertFalse(matcher.matches("file10.tmp"))
+
+    def test_negation_last_rule_wins(self):
+        matcher = IgnoreMatcher(["*.log", "!keep.log", "debug/keep.log"])
+        self.assertTrue(matcher.matches("app.log"))
+        self.assertFalse(matcher.matches("keep.log"))
+        self.assertFalse(matcher.matches("logs/keep.log"))
+        self.assertTrue(matcher.matches("debug/keep.log"))
+
+    def test_negation_cannot_reinclude_inside_ignored_dir(self):
+        matcher = IgnoreMatcher(["build/", "!build/keep.txt"])
+        self.assertTrue(matcher.matches("build/keep.txt"))
+
+    def test_double_star_patterns(self):
+        matcher = IgnoreMatcher(["**/fixtures/*.json", "logs/**", "a/**/z.txt"])
+        self.assertTrue(matcher.matches("fixtures/data.json"))
+        self.assertTrue(matcher.matches("tests/unit/fixtures/data.json"))
+        self.assertTrue(matcher.matches("logs/2024/01/app.txt"))
+        self.assertFalse(matcher.matches("src/logs/app.txt"))
+        self.assertTrue(matcher.matches("a/z.txt"))
+        self.assertTrue(matcher.matches("a/b/c/z.txt"))
+
+    def test_dir_only_pattern_does_not_match_files(self):
+        matcher = IgnoreMatcher(["dist/"])
+        self.assertTrue(matcher.matches("packages/web/dist/bundle.js"))
+        self.assertFalse(matcher.matches("scripts/dist"))
+
+    def test_escaped_patterns(self):
+        matcher = IgnoreMatcher(["\\#notes.txt", "\\!important.txt"])
+        self.assertTrue(matcher.matches("#notes.txt"))
+        self.assertTrue(matcher.matches("!important.txt"))
+
+    def test_nested_ignore_files(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            os.makedirs(os.path.join(tmpdir, "web", "static"))
+            with open(os.path.join(tmpdir, "web", ".commitpilotignore"), "w") as f:
+                f.write("*.map\n/generated/\n!vendor.js\n")
+
+            matcher = IgnoreMatcher(["*.js"], root=tmpdir)
+
+            self.assertTrue(matcher.matches("app.js"))
+            self.assertFalse(matcher.matches("app.map"))
+            self.assertTrue(matcher.matches("web/static/app.map"))
+            self.assertTrue(matcher.matches("web/generated/schema.py"))
+            self.assertFalse(matcher.matches("web/src/generated/schema.py"))
+            self.assertFalse(matcher.matches("web/vendor.js"))
+            self.assertTrue(matcher.matches("web/app.js"))
+
+    def test_ignored_subtree_decided_once(self):
+        matcher = IgnoreMatcher(["node_modules/"])
+
+        with patch.object(IgnoreMatcher, "_decide", wraps=IgnoreMatcher._decide) as mock_decide:
+            for i in range(50):
+                self.assertTrue(matcher.matches(f"web/node_modules/pkg_{i}/index.js"))
+
+        # One decision each for "web" and "web/node_modules", the subtree is then cached
+        self.assertEqual(mock_decide.call_count, 2)
+
+    def test_read_ignore_file_skips_comments(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, ".commitpilotignore")
+            with open(path, "w") as f:
+                f.write("# comment\n\n*.png\ndist/  \n")
+
+            self.assertEqual(read_ignore_file(path), ["*.png", "dist/"])
+
+
+class TestDiffFilterIgnoreFile(unittest.TestCase):
+    def test_ignore_file_read_once(self):
+        diff_filter = DiffFilter(Config())
+
+        with patch("core.filters.read_ignore_file", wraps=read_ignore_file) as mock_read:
+            for i in range(100):
+                diff_filter.should_skip_file(f"src/file_{i}.py")
+
+        mock_read.assert_called_once()
+
+    def test_extra_ignore_patterns_merged(self):
+        with patch.dict(os.environ, {"FILTER_EXTRA_IGNORE": "*.tmp,custom/"}):
+            diff_filter = DiffFilter(Config())
+
+        self.assertTrue(diff_filter.should_skip_file("notes.tmp"))
+        self.assertTrue(diff_filter.should_skip_file("custom/data.py"))
+        self.assertTrue(diff_filter.should_skip_file("image.png"))
+        self.assertFalse(diff_filter.should_skip_file("src/main.py"))
+
+    def test_missing_ignore_file(self):
+        diff_filter = DiffFilter(Config(), ignore_file="/nonexistent/.commitpilotignore")
+        with self.assertRaises(ValueError):
+            diff_filter.should_skip_file("src/main.py")
@@ -1,11 +1,23 @@
 import os
+import threading
 from unittest.mock import Mock, patch
 
 import unittest
 
 from config import Config
-from core.analyzer import DiffSummary, FileSummary
-from llm.openai import OpenAIProvider
+from core.analyzer import DiffSummary, FileSummary, build_prompt
+from llm.openai import OpenAIProvider, StreamedMessage, clean_commit_message, is_conventional_commit
+from tests.test_daemon import StubAPI
+
+
+class CharEncoder:
+    
+    def __init__(self):
+        self.calls = 0
+    
+    def encode(self, text):
+        self.calls += 1
+        return list(text)
 
 
 class TestOpenAIProvider(unittest.TestCase):
@@ -78,86 +90,56 @@ class TestOpenAIProvider(unittest.TestCase):
             self.assertIs(client, client2)
             self.assertEqual(mock_openai_class.call_count, 1)
     
-    @patch("os._exit")
-    @patch("openai.OpenAI")
-    def test_generate_commit_success(self, mock_openai_class, mock_exit):
-        # Mock the exit to prevent test termination
-        mock_exit.side_effect = SystemExit(1)
-        
-        # Mock OpenAI response
+    def provider_with_reply(self, mock_openai_class, content=None, error=None):
         mock_client = Mock()
-        mock_response = Mock()
-        mock_response.choices = [Mock(message=Mock(content="feat: add new feature\n\nImplemented user authentication"))]
-        mock_client.chat.completions.create.return_value = mock_response
+        if error is not None:
+            mock_client.chat.completions.create.side_effect = error
+        else:
+            mock_client.chat.completions.create.return_value = Mock(choices=[Mock(message=Mock(content=content))])
         mock_openai_class.return_value = mock_client
-        
         with patch.dict(os.environ, self.test_env):
-            config = Config()
-            provider = OpenAIProvider(config)
-            # Expect SystemExit due to os._exit(1) in the code
-            with self.assertRaises(SystemExit):
-                result = provider.generate_commit(self.diff_summary)
+            provider = OpenAIProvider(Config())
+        provider._encoder = CharEncoder()
+        return provider, mock_client
     
-    @patch("os._exit")
     @patch("openai.OpenAI")
-    def test_generate_commit_truncates_long_subject(self, mock_openai_class, mock_exit):
-        # Mock the exit to prevent test termination
-        mock_exit.side_effect = SystemExit(1)
+    def test_generate_commit_success(self, mock_openai_class):
+        provider, client = self.provider_with_reply(
+            mock_openai_class, "feat: add new feature\n\nImplemented user authentication"
+        )
         
-        # Mock response with very long subject line
-        mock_client = Mock()
-        mock_response = Mock()
-        long_subject = "feat: " + "x" * 100  # Very long subject
-        mock_response.choices = [Mock(message=Mock(content=long_subject))]
-        mock_client.chat.completions.create.return_value = mock_response
-        mock_openai_class.return_value = mock_client
+        result = provider.generate_commit(self.diff_summary)
         
-        with patch.dict(os.environ, self.test_env):
-            config = Config()
-            provider = OpenAIProvider(config)
-            # Expect SystemExit due to os._exit(1) in the code
-            with self.assertRaises(SystemExit):
-                result = provider.generate_commit(self.diff_summary)
+        self.assertEqual(result, "feat: add new feature\n\nImplemented user authentication")
+        request = client.chat.completions.create.call_args.kwargs
+        self.assertEqual(request["model"], "gpt-4")
+        self.assertEqual(request["messages"][1], {"role": "user", "content": build_prompt(self.diff_summary)})
+        self.assertNotIn("stream", request)
     
-    @patch("os._exit")
     @patch("openai.OpenAI")
-    def test_generate_commit_empty_response(self, mock_openai_class, mock_exit):
-        # Mock the exit to prevent test termination
-        mock_exit.side_effect = SystemExit(1)
+    def test_generate_commit_truncates_long_subject(self, mock_openai_class):
+        provider, _ = self.provider_with_reply(mock_openai_class, "feat: " + "x" * 100)
         
-        # Mock empty response
-        mock_client = Mock()
-        mock_response = Mock()
-        mock_response.choices = [Mock(message=Mock(content=""))]
-        mock_client.chat.completions.create.return_value = mock_response
-        mock_openai_class.return_value = mock_client
+        result = provider.generate_commit(self.diff_summary)
         
-        with patch.dict(os.environ, self.test_env):
-            config = Config()
-            provider = OpenAIProvider(config)
-            
-            # Expect SystemExit due to os._exit(1) in the code
-            with self.assertRaises(SystemExit):
-                provider.generate_commit(self.diff_summary)
+        self.assertEqual(len(result), 72)
+        self.assertEqual(result, ("feat: " + "x" * 100)[:69] + "...")
     
-    @patch("os._exit")
     @patch("openai.OpenAI")
-    def test_generate_commit_api_error(self, mock_openai_class, mock_exit):
-        # Mock the exit to prevent test termination
-        mock_exit.side_effect = SystemExit(1)
+    def test_generate_commit_empty_response(self, mock_openai_class):
+        provider, _ = self.provider_with_reply(mock_openai_class, "")
         
-        # Mock API error
-        mock_client = Mock()
-        mock_client.chat.completions.create.side_effect = Exception("API Error")
-        mock_openai_class.return_value = mock_client
+        with self.assertRaisesRegex(RuntimeError, "Empty response from OpenAI"):
+            provider.generate_commit(self.diff_summary)
+    
+    @patch("openai.OpenAI")
+    def test_generate_commit_api_error(self, mock_openai_class):
+        error = Exception("API Error")
+        provider, _ = self.provider_with_reply(mock_openai_class, error=error)
         
-        with patch.dict(os.environ, self.test_env):
-            config = Config()
-            provider = OpenAIProvider(config)
-            
-            # Expect SystemExit due to os._exit(1) in the code
-            with self.assertRaises(SystemExit):
-                provider.generate_commit(self.diff_summary)
+        with self.assertRaisesRegex(RuntimeError, "Failed to generate commit message: API Error") as caught:
+            provider.generate_commit(self.diff_summary)
+        self.assertIs(caught.exception.__cause__, error)
     
     def test_import_error_handling(self):
         # Test handling when openai package is not available
@@ -166,4 +148,223 @@ class TestOpenAIProvider(unittest.TestCase):
                 config = Config()
                 provider = OpenAIProvider(config)
                 with self.assertRaises(ImportError):
-                    _ = provider.client
\ No newline at end of file
+                    _ = provider.client
+    
+    def _large_summary(self, num_files=300):
+        files = [
+            FileSummary(path=f"src/module_{i:03d}.py", added=i % 40, removed=i % 7, change_type="modified")
+            for i in range(num_files)
+        ]
+        return DiffSummary(
+            files=files,
+            total_added=sum(f.added for f in files),
+            total_removed=sum(f.removed for f in files),
+            change_type="refactor",
+            contents="diff --git a/src/module_000.py b/src/module_000.py\n+x\n",
+        )
+    
+    def test_trim_files_keeps_contents_and_fits(self):
+        summary = self._large_summary()
+        with patch.dict(os.environ, {**self.test_env, "MAX_PROMPT_TOKENS": "550"}):
+            provider = OpenAIProvider(Config())
+        provider._encoder = CharEncoder()
+        
+        trimmed = provider._trim_files_for_token_limit(summary)
+        
+        self.assertEqual(trimmed.contents, summary.contents)
+        self.assertLess(trimmed.total_files, summary.total_files)
+        self.assertLessEqual(len(build_prompt(trimmed)), 550)
+        
+        # Keeping one more of the largest files must not fit
+        sorted_files = sorted(summary.files, key=lambda f: f.added + f.removed, reverse=True)
+        bigger = DiffSummary(
+            files=sorted_files[:trimmed.total_files + 1],
+            total_added=sum(f.added for f in sorted_files[:trimmed.total_files + 1]),
+            total_removed=sum(f.removed for f in sorted_files[:trimmed.total_files + 1]),
+            change_type=summary.change_type,
+            contents=summary.contents,
+        )
+        self.assertGreater(len(build_prompt(bigger)), 550)
+    
+    def test_trim_files_noop_when_prompt_fits(self):
+        with patch.dict(os.environ, self.test_env):
+            provider = OpenAIProvider(Config())
+        provider._encoder = CharEncoder()
+        
+        self.assertIs(provider._trim_files_for_token_limit(self.diff_summary), self.diff_summary)
+    
+    def test_trim_files_counts_each_segment_once(self):
+        summary = self._large_summary()
+        with patch.dict(os.environ, {**self.test_env, "MAX_PROMPT_TOKENS": "550"}):
+            provider = OpenAIProvider(Config())
+        encoder = CharEncoder()
+        provider._encoder = encoder
+        
+        provider._trim_files_for_token_limit(summary)
+        first_calls = encoder.calls
+        provider._trim_files_for_token_limit(summary)
+        
+        # Diff body, footer and file lines come from the segment cache the second time
+        self.assertLess(encoder.calls - first_calls, first_calls)
+
+
+class TestStreamedMessage(unittest.TestCase):
+    def feed_all(self, text, size=3):
+        streamed = StreamedMessage()
+        for i in range(0, len(text), size):
+            if not streamed.feed(text[i:i + size]):
+                break
+        return streamed
+    
+    def test_matches_clean_commit_message(self):
+        for text in [
+            "feat: add login\n\nUses the session store\n",
+            "```\nfix: handle empty diff\n```",
+            "",
+            "refactor: " + "x" * 100,
+        ]:
+            with self.subTest(text=text):
+                self.assertEqual(self.feed_all(text).message, clean_commit_message(text))
+    
+    def test_subject_truncated_while_streaming(self):
+        streamed = StreamedMessage()
+        streamed.feed("feat: " + "x" * 100)
+        self.assertEqual(len(streamed.subject), 72)
+        self.assertTrue(streamed.subject.endswith("..."))
+    
+    def test_complete_once_fourth_line_ends(self):
+        streamed = StreamedMessage()
+        # Leading blank and fence lines do not count towards the cap
+        self.assertTrue(streamed.feed("\n```\nfeat: a\n\nb\nc"))
+        self.assertFalse(streamed.feed("\n"))
+        self.assertEqual(streamed.message, "feat: a\n\nb\nc")
+
+
+class TestStreamingCompletion(unittest.TestCase):
+    TOKENS = ("feat", ": stream", " the subject", "\n", "\nLine two", "\nLine three", "\nLine four") + (
+        "\nextra",
+    ) * 50
+    
+    def setUp(self):
+        self.api = StubAPI(tokens=self.TOKENS, token_delay=0.005)
+        threading.Thread(target=self.api.serve_forever, daemon=True).start()
+        env = {"OPENAI_API_KEY": "test-key", "OPENAI_MODEL": "gpt-4", "OPENAI_BASE_URL": self.api.base_url}
+        with patch.dict(os.environ, env):
+            self.provider = OpenAIProvider(Config())
+        self.provider._encoder = CharEncoder()
+        self.summary = DiffSummary(
+            files=[FileSummary(path="src/main.py", added=8, removed=3, change_type="modified")],
+            total_added=8,
+            total_removed=3,
+            change_type="feat",
+            contents="diff content",
+        )
+    
+    def tearDown(self):
+        self.api.shutdown()
+        self.api.server_close()
+    
+    def test_stream_renders_subject_and_stops_at_line_cap(self):
+        subjects = []
+        message = self.provider.generate_commit(self.summary, on_update=lambda s: subjects.append(s.subject))
+        
+        self.assertEqual(message, "feat: stream the subject\n\nLine two\nLine three")
+        self.assertEqual(subjects[:3], ["feat", "feat: stream", "feat: stream the subject"])
+        # The request was dropped well before the server finished the reply
+        self.assertTrue(self.api.cancelled.wait(5))
+        self.assertLess(self.api.streamed, len(self.TOKENS))
+    
+    def test_stream_matches_blocking_reply(self):
+        self.api.tokens = ("fix: correct ", "the parser\n")
+        self.api.message = "fix: correct the parser\n"
+        streamed = self.provider.generate_commit(self.summary, on_update=lambda s: None)
+        blocking = self.provider.generate_commit(self.summary)
+        self.assertEqual(streamed, blocking)
+        self.assertEqual(streamed, "fix: correct the parser")
+
+
+class TestConventionalCommit(unittest.TestCase):
+    def test_valid_messages(self):
+        for message in [
+            "feat: add login",
+            "fix(parser): handle empty diff",
+            "refactor(core/git)!: drop the legacy stream",
+            "docs: update README\n\nDescribe the daemon.",
+            "```\nchore: bump deps\n```",
+        ]:
+            with self.subTest(message=message):
+                self.assertTrue(is_conventional_commit(message))
+    
+    def test_invalid_messages(self):
+        for message in [
+            "",
+            "Updated some files",
+            "feature: add login",
+            "feat:add login",
+            "feat(): add login",
+            "feat: " + "x" * 80,
+            "feat: add login\nno blank line before the body",
+        ]:
+            with self.subTest(message=message):
+                self.assertFalse(is_conventional_commit(message))
+
+
+class TestCandidateRace(unittest.TestCase):
+    def make_provider(self, api, candidates=3, timeout=5.0):
+        env = {
+            "OPENAI_API_KEY": "test-key",
+            "OPENAI_MODEL": "gpt-4",
+            "OPENAI_BASE_URL": api.base_url,
+            "EDGE_CANDIDATES": str(candidates),
+            "EDGE_CANDIDATE_TIMEOUT": str(timeout),
+        }
+        with patch.dict(os.environ, env):
+            provider = OpenAIProvider(Config())
+        provider._encoder = CharEncoder()
+        return provider
+    
+    def serve(self, replies):
+        api = StubAPI(replies=replies)
+        threading.Thread(target=api.serve_forever, daemon=True).start()
+        self.addCleanup(api.server_close)
+        self.addCleanup(api.shutdown)
+        return api
+    
+    def summary(self):
+        return DiffSummary(
+            files=[FileSummary(path="src/main.py", added=8, removed=3, change_type="modified")],
+            total_added=8,
+            total_removed=3,
+            change_type="feat",
+            contents="diff content",
+        )
+    
+    def test_first_valid_candidate_wins(self):
+        api = self.serve((
+            (("Updated ", "files"), 0.0),
+            (("feat: ", "slow but valid") + ("",) * 200, 0.02),
+            (("fix: ", "quick ", "and valid"), 0.01),
+        ))
+        provider = self.make_provider(api)
+        
+        self.assertEqual(provider.generate_commit(self.summary()), "fix: quick and valid")
+        self.assertEqual(api.streams, 3)
+        # Every candidate is a streamed request for the same prompt
+        prompt = build_prompt(self.summary())
+        self.assertEqual(len(api.bodies), 3)
+        for body in api.bodies:
+            self.assertTrue(body["stream"])
+            self.assertEqual(body["messages"][1]["content"], prompt)
+        # The slow request is abandoned rather than read to the end
+        self.assertTrue(api.cancelled.wait(5))
+    
+    def test_invalid_candidates_fall_back_to_first(self):
+        api = self.serve(((("Updated files",), 0.0), (("Changed stuff",), 0.05)))
+        provider = self.make_provider(api, candidates=2)
+        self.assertEqual(provider.generate_commit(self.summary()), "Updated files")
+    
+    def test_time_limit(self):
+        api = self.serve(((("feat: ", "too slow"), 1.0),))
+        provider = self.make_provider(api, candidates=2, timeout=0.2)
+        with self.assertRaisesRegex(RuntimeError, "No candidate commit message within 0.2s"):
+            provider.generate_commit(self.summary())
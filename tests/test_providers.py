@@ -0,0 +1,113 @@
+import os
+import threading
+import unittest
+from importlib.metadata import EntryPoint
+from unittest.mock import patch
+
+import llm
+from config import Config
+from core.analyzer import DiffSummary, FileSummary, build_prompt
+from llm import ENTRY_POINT_GROUP, available_providers, get_provider, load_provider
+from llm.base import BaseLLMProvider
+from llm.local import LocalProvider
+from llm.openai import OpenAIProvider
+from tests.test_daemon import StubAPI
+from tests.test_filters import CharEncoder
+
+
+class EchoProvider(BaseLLMProvider):
+    def generate_commit(self, diff_summary, on_update=None):
+        return f"{diff_summary.change_type}: {diff_summary.files[0].path}"
+
+
+class NotAProvider:
+    pass
+
+
+def make_summary() -> DiffSummary:
+    return DiffSummary(
+        files=[FileSummary(path="src/main.py", added=8, removed=3, change_type="modified")],
+        total_added=8,
+        total_removed=3,
+        change_type="feat",
+        contents="diff content",
+    )
+
+
+def plugins(**targets):
+    return [EntryPoint(name=name, value=value, group=ENTRY_POINT_GROUP) for name, value in targets.items()]
+
+
+class TestProviderRegistry(unittest.TestCase):
+    def setUp(self):
+        available_providers.cache_clear()
+        self.addCleanup(available_providers.cache_clear)
+
+    def test_builtin_providers(self):
+        with patch("llm.entry_points", return_value=[]):
+            self.assertIs(load_provider("openai"), OpenAIProvider)
+            self.assertIs(load_provider("local"), LocalProvider)
+
+    def test_unknown_provider(self):
+        with patch("llm.entry_points", return_value=[]):
+            with self.assertRaisesRegex(ValueError, "available: local, openai"):
+                get_provider("missing", Config())
+
+    def test_entry_point_plugin(self):
+        with patch("llm.entry_points", return_value=plugins(echo="tests.test_providers:EchoProvider")):
+            provider = get_provider("echo", Config())
+        # pytest may import this module under a second name, so compare by name
+        self.assertEqual(type(provider).__qualname__, "EchoProvider")
+        self.assertEqual(provider.generate_commit(make_summary()), "feat: src/main.py")
+
+    def test_plugin_must_subclass_base(self):
+        with patch("llm.entry_points", return_value=plugins(bad="tests.test_providers:NotAProvider")):
+            with self.assertRaisesRegex(ValueError, "not a BaseLLMProvider"):
+                load_provider("bad")
+
+    def test_plugin_cannot_replace_builtin(self):
+        with patch("llm.entry_points", return_value=plugins(openai="tests.test_providers:EchoProvider")):
+            self.assertIs(load_provider("openai"), OpenAIProvider)
+
+    def test_default_prompt_matches_analyzer(self):
+        summary = make_summary()
+        self.assertEqual(EchoProvider(Config())._create_prompt(summary), build_prompt(summary))
+
+    def test_old_protocol_name_still_exported(self):
+        self.assertIs(llm.LLMProvider, BaseLLMProvider)
+
+
+class TestLocalProvider(unittest.TestCase):
+    def setUp(self):
+        self.api = StubAPI(message="fix: run against the local model")
+        threading.Thread(target=self.api.serve_forever, daemon=True).start()
+        self.addCleanup(self.api.server_close)
+        self.addCleanup(self.api.shutdown)
+        env = {"EDGE_LOCAL_BASE_URL": self.api.base_url, "EDGE_LOCAL_MODEL": "llama-3-8b"}
+        # No OpenAI key anywhere: the local backend must not need one
+        with patch.dict(os.environ, env, clear=True):
+            self.config = Config(_env_file=None)
+
+    def test_needs_no_api_key(self):
+        provider = get_provider("local", self.config)
+        self.assertEqual(provider.model, "llama-3-8b")
+        self.assertEqual(provider.base_url, self.api.base_url)
+
+    def test_generates_against_local_endpoint(self):
+        provider = get_provider("local", self.config)
+        provider._encoder = CharEncoder()
+
+        message = provider.generate_commit(make_summary())
+
+        self.assertEqual(message, "fix: run against the local model")
+        self.assertEqual(self.api.requests, [("POST", "/v1/chat/completions")])
+        self.assertEqual(self.api.bodies[-1]["model"], "llama-3-8b")
+        self.assertEqual(self.api.bodies[-1]["messages"][1]["content"], build_prompt(make_summary()))
+
+    def test_cache_model_names_the_backend(self):
+        self.config.llm_provider = "local"
+        self.assertEqual(self.config.cache_model, f"local:{self.api.base_url}:llama-3-8b")
+
+
+if __name__ == "__main__":
+    unittest.main()
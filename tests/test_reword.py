@@ -0,0 +1,376 @@
+import os
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from typer.testing import CliRunner
+
+from cli import app
+from config import Config
+from core import git
+from core.filters import DiffFilter
+from llm.base import BaseLLMProvider
+from reword import (
+    CommitReworder,
+    RateLimitBackoff,
+    RewordError,
+    apply_results,
+    is_rate_limited,
+    resolve_range,
+    retry_after,
+    reword_range,
+)
+from tests.test_analyzer import OLD_MODULE, git_repo
+from tests.test_filters import CharEncoder
+
+IDENTITY = {"GIT_COMMITTER_NAME": "rewriter", "GIT_COMMITTER_EMAIL": "rewriter@example.com"}
+
+
+class RateLimitError(Exception):
+    """Stands in for the SDK's error: a 429 with the response that carried it."""
+
+    status_code = 429
+
+    def __init__(self, headers=None):
+        super().__init__("Error code: 429 - Too Many Requests")
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+class CountingProvider(BaseLLMProvider):
+    """Describes the first file; records how many calls overlapped, refuses the first `refusals`."""
+
+    def __init__(self, config, delay=0.0, refusals=0):
+        super().__init__(config)
+        self.delay = delay
+        self.refusals = refusals
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def generate_commit(self, diff_summary, on_update=None):
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            refuse = self.refusals > 0
+            self.refusals -= refuse
+        try:
+            time.sleep(self.delay)
+            if refuse:
+                raise RuntimeError("Failed to generate commit message") from RateLimitError()
+            return f"{diff_summary.change_type}: update {diff_summary.files[0].path}"
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class RepoTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.repo = self.tmpdir.name
+        git_repo(self.repo, {".commitpilotignore": "*.lock\n", "store.py": OLD_MODULE})
+        self.config = Config(_env_file=None)
+
+    def commit(self, files: dict[str, str], message: str) -> str:
+        for name, text in files.items():
+            path = Path(self.repo, name)
+            if text is None:
+                path.unlink()
+                continue
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(text)
+        subprocess.run(["git", "add", "-A"], cwd=self.repo, check=True)
+        subprocess.run(
+            ["git", "-c", "user.name=author", "-c", "user.email=author@example.com",
+             "commit", "-q", "--allow-empty", "-m", message],
+            cwd=self.repo,
+            check=True,
+        )
+        return git.resolve_commit("HEAD", self.repo)
+
+    def log(self, *args: str) -> list[str]:
+        result = subprocess.run(["git", "log", *args], cwd=self.repo, capture_output=True, text=True, check=True)
+        return result.stdout.splitlines()
+
+    def reworder(self, llm, **kwargs) -> CommitReworder:
+        diff_filter = DiffFilter(self.config, Path(self.repo, ".commitpilotignore"))
+        diff_filter._encoder = CharEncoder()
+        backoff = RateLimitBackoff(self.config.reword_max_retries, sleep=lambda seconds: None)
+        return CommitReworder(self.config, llm, diff_filter, self.repo, backoff=backoff, **kwargs)
+
+
+class TestCommitLogStream(RepoTestCase):
+    def test_every_commit_from_one_stream(self):
+        first = self.commit({"notes/todo list.txt": "a\nb\n"}, "wip")
+        empty = self.commit({}, "wip: nothing")
+        renamed = self.commit({"notes/todo list.txt": None, "notes/done.txt": "a\nb\n"}, "wip\n\nmore words")
+        edited = self.commit({"notes/done.txt": "a\nc\n", "logo.bin": "\0\1\2"}, "wip again")
+
+        with git.CommitLogStream("HEAD~4..HEAD", self.repo) as stream:
+            commits = list(stream)
+
+        self.assertEqual([commit.oid for commit in commits], [first, empty, renamed, edited])
+        self.assertEqual([commit.parents for commit in commits[1:]], [[first], [empty], [renamed]])
+        self.assertEqual(commits[2].message, "wip\n\nmore words")
+        self.assertEqual(commits[2].subject, "wip")
+        self.assertEqual(commits[0].author_email, "author@example.com")
+
+        self.assertEqual(commits[1].numstats, [])
+        self.assertEqual(commits[1].file_diffs(), [])
+        self.assertEqual(commits[2].numstats[0].old_path, "notes/todo list.txt")
+        self.assertEqual([stat.is_binary for stat in commits[3].numstats], [True, False])
+        self.assertEqual([file_diff.path for file_diff in commits[3].file_diffs()], ["logo.bin", "notes/done.txt"])
+        self.assertEqual(commits[3].file_diffs()[1].hunks[0].lines, ["-b", "+c"])
+        # Each consumer decides what to leave out
+        self.assertEqual(commits[3].file_diffs(skip=lambda path: path.endswith(".bin"))[0].path, "notes/done.txt")
+
+    def test_small_reads(self):
+        for i in range(5):
+            self.commit({f"module_{i}.py": f"value = {i}\n"}, f"wip {i}")
+        with git.CommitLogStream("HEAD~5..", self.repo) as stream:
+            expected = [(commit.oid, commit.numstats, commit.patch) for commit in stream]
+        with git.CommitLogStream("HEAD~5..", self.repo, chunk_size=7) as stream:
+            self.assertEqual([(commit.oid, commit.numstats, commit.patch) for commit in stream], expected)
+
+    def test_unknown_revision(self):
+        with git.CommitLogStream("no-such-branch..HEAD", self.repo) as stream:
+            with self.assertRaises(git.GitError):
+                list(stream)
+
+
+class TestRewriteMessages(RepoTestCase):
+    def test_one_rewrite(self):
+        base = git.resolve_commit("HEAD", self.repo)
+        self.commit({"a.js": "1\n"}, "wip")
+        self.commit({"b.js": "2\n"}, "wip")
+        with git.CommitLogStream(f"{base}..HEAD", self.repo) as stream:
+            commits = list(stream)
+        trees = self.log("--format=%T %an %ae %ad")
+
+        with patch.dict(os.environ, IDENTITY):
+            tip = git.rewrite_messages(commits, {commits[0].oid: "feat: add a\n\nWith a body."}, self.repo)
+
+        self.assertEqual(git.resolve_commit("HEAD", self.repo), tip)
+        self.assertEqual(self.log("--format=%B", "-1", "HEAD~1"), ["feat: add a", "", "With a body.", ""])
+        self.assertEqual(self.log("--format=%B", "-1", "HEAD"), ["wip", ""])
+        # Content and authorship kept; only the messages and the committer change
+        self.assertEqual(self.log("--format=%T %an %ae %ad"), trees)
+        self.assertEqual(set(self.log("--format=%cn", f"{base}..HEAD")), {"rewriter"})
+        self.assertEqual(self.log("-g", "--format=%gs", "-1"), ["edgecommit: reword"])
+
+    def test_moved_head_left_alone(self):
+        base = git.resolve_commit("HEAD", self.repo)
+        self.commit({"a.js": "1\n"}, "wip")
+        with git.CommitLogStream(f"{base}..HEAD", self.repo) as stream:
+            commits = list(stream)
+        head = self.commit({"b.js": "2\n"}, "later")
+
+        with patch.dict(os.environ, IDENTITY):
+            with self.assertRaises(git.GitError):
+                git.rewrite_messages(commits, {commits[0].oid: "feat: add a"}, self.repo)
+        self.assertEqual(git.resolve_commit("HEAD", self.repo), head)
+
+
+class TestRateLimitBackoff(unittest.TestCase):
+    def setUp(self):
+        self.now = 0.0
+        self.slept = []
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+    def backoff(self, max_retries=3) -> RateLimitBackoff:
+        return RateLimitBackoff(max_retries, base_delay=1.0, max_delay=4.0, sleep=self.sleep, clock=lambda: self.now)
+
+    def flaky(self, errors):
+        errors = list(errors)
+
+        def call():
+            if errors:
+                raise errors.pop(0)
+            return "done"
+        return call
+
+    def test_recognizes_rate_limits(self):
+        self.assertTrue(is_rate_limited(RateLimitError()))
+        try:
+            raise RuntimeError("Failed to generate commit message") from RateLimitError()
+        except RuntimeError as e:
+            self.assertTrue(is_rate_limited(e))
+        self.assertTrue(is_rate_limited(RuntimeError("Rate limit reached for requests")))
+        self.assertFalse(is_rate_limited(RuntimeError("Empty response from OpenAI")))
+
+    def test_retries_with_growing_pauses(self):
+        with patch("reword.random.uniform", return_value=1.0):
+            result = self.backoff().call(self.flaky([RateLimitError()] * 3))
+        self.assertEqual(result, "done")
+        self.assertEqual(self.slept, [1.0, 2.0, 4.0])
+
+    def test_pause_is_capped(self):
+        with patch("reword.random.uniform", return_value=1.0):
+            self.backoff(max_retries=5).call(self.flaky([RateLimitError()] * 5))
+        self.assertEqual(self.slept, [1.0, 2.0, 4.0, 4.0, 4.0])
+
+    def test_honours_retry_after(self):
+        error = RateLimitError({"retry-after": "7"})
+        self.assertEqual(retry_after(error), 7.0)
+        self.backoff().call(self.flaky([error]))
+        self.assertEqual(self.slept, [7.0])
+
+    def test_gives_up(self):
+        with self.assertRaises(RateLimitError):
+            self.backoff(max_retries=2).call(self.flaky([RateLimitError()] * 3))
+
+    def test_other_errors_not_retried(self):
+        with self.assertRaisesRegex(RuntimeError, "Empty response"):
+            self.backoff().call(self.flaky([RuntimeError("Empty response from OpenAI")]))
+        self.assertEqual(self.slept, [])
+
+    def test_refusal_pauses_every_caller(self):
+        backoff = self.backoff()
+        backoff.refused(RateLimitError({"retry-after": "3"}))
+        backoff.call(lambda: None)
+        self.assertEqual(self.slept, [3.0])
+
+
+class TestCommitReworder(RepoTestCase):
+    def test_messages_for_a_stack(self):
+        base = git.resolve_commit("HEAD", self.repo)
+        for i in range(6):
+            self.commit({f"src/module_{i}.js": f"value {i}\n"}, f"wip {i}")
+        self.commit({"poetry.lock": "pinned\n"}, "wip lock")
+        llm = CountingProvider(self.config, delay=0.05)
+        self.config.reword_concurrency = 2
+        seen = []
+
+        results = reword_range(base, self.reworder(llm, on_result=seen.append), self.repo)
+
+        self.assertEqual([result.commit.subject for result in results], [f"wip {i}" for i in range(6)] + ["wip lock"])
+        self.assertEqual([result.message for result in results[:6]], [f"chore: update src/module_{i}.js" for i in range(6)])
+        # A lockfile alone is described by rule, without the model
+        self.assertTrue(results[6].heuristic)
+        self.assertEqual(llm.calls, 6)
+        self.assertEqual(llm.peak, 2)
+        self.assertEqual(len(seen), 7)
+
+    def test_python_symbols_per_commit(self):
+        base = git.resolve_commit("HEAD", self.repo)
+        self.commit({"store.py": OLD_MODULE + "\n\ndef extra():\n    pass\n"}, "wip")
+        results = reword_range(base, self.reworder(CountingProvider(self.config)), self.repo)
+        self.assertEqual([(change.name, change.change) for change in results[0].summary.symbols["store.py"]], [
+            ("extra", "added"),
+        ])
+
+    def test_rate_limited_calls_retried(self):
+        base = git.resolve_commit("HEAD", self.repo)
+        self.commit({"a.js": "1\n"}, "wip")
+        self.commit({"b.js": "2\n"}, "wip")
+        llm = CountingProvider(self.config, refusals=3)
+
+        results = reword_range(base, self.reworder(llm), self.repo)
+
+        self.assertEqual([result.error for result in results], [None, None])
+        self.assertEqual(llm.calls, 5)
+
+    def test_failed_commit_keeps_its_message(self):
+        base = git.resolve_commit("HEAD", self.repo)
+        first = self.commit({"a.js": "1\n"}, "wip a")
+        self.commit({"b.js": "2\n"}, "wip b")
+        llm = CountingProvider(self.config)
+        describe = llm.generate_commit
+
+        def generate_commit(diff_summary, on_update=None):
+            if diff_summary.files[0].path == "a.js":
+                raise RuntimeError("Failed to generate commit message: Empty response from OpenAI")
+            return describe(diff_summary)
+
+        llm.generate_commit = generate_commit
+        results = reword_range(base, self.reworder(llm), self.repo)
+        self.assertIsNone(results[0].message)
+        self.assertIn("Empty response", results[0].error)
+
+        with patch.dict(os.environ, IDENTITY):
+            apply_results(results, self.repo)
+        self.assertEqual(self.log("--format=%s", f"{base}..HEAD"), ["chore: update b.js", "wip a"])
+        self.assertNotEqual(git.resolve_commit("HEAD~1", self.repo), first)
+
+    def test_merges_refused(self):
+        base = git.resolve_commit("HEAD", self.repo)
+        subprocess.run(["git", "checkout", "-qb", "side"], cwd=self.repo, check=True)
+        self.commit({"side.txt": "1\n"}, "side")
+        subprocess.run(["git", "checkout", "-q", "-"], cwd=self.repo, check=True)
+        self.commit({"main.txt": "1\n"}, "main")
+        subprocess.run(
+            ["git", "-c", "user.name=a", "-c", "user.email=a@example.com", "merge", "-q", "--no-edit", "side"],
+            cwd=self.repo,
+            check=True,
+        )
+        llm = CountingProvider(self.config)
+        with self.assertRaisesRegex(RewordError, "merge commit|not linear"):
+            reword_range(base, self.reworder(llm), self.repo)
+        # The whole range is checked before any commit is sent
+        self.assertEqual(llm.calls, 0)
+
+    def test_merge_late_in_range_refused_before_any_call(self):
+        base = git.resolve_commit("HEAD", self.repo)
+        for i in range(4):
+            self.commit({f"src/module_{i}.js": f"value {i}\n"}, f"wip {i}")
+        with git.CommitLogStream(f"{base}..HEAD", self.repo) as stream:
+            commits = list(stream)
+        # A second parent on the last commit, as a merge would have
+        commits[-1].parents = [*commits[-1].parents, base]
+        llm = CountingProvider(self.config)
+        seen = []
+
+        with self.assertRaisesRegex(RewordError, "merge commit"):
+            self.reworder(llm, on_result=seen.append).run(iter(commits))
+        self.assertEqual((llm.calls, seen), (0, []))
+
+    def test_range_must_end_at_head(self):
+        base = git.resolve_commit("HEAD", self.repo)
+        self.commit({"a.js": "1\n"}, "wip")
+        self.commit({"b.js": "2\n"}, "wip")
+        llm = CountingProvider(self.config)
+        with self.assertRaisesRegex(RewordError, "does not end at HEAD"):
+            reword_range(f"{base}..HEAD~1", self.reworder(llm), self.repo)
+        # Refused before any model call
+        self.assertEqual(llm.calls, 0)
+
+    def test_resolve_range(self):
+        self.assertEqual(resolve_range("main"), "main..HEAD")
+        self.assertEqual(resolve_range("main..feature"), "main..feature")
+
+
+class TestRewordCommand(RepoTestCase):
+    def test_rewrites_after_dry_run(self):
+        base = git.resolve_commit("HEAD", self.repo)
+        self.commit({"a.js": "1\n"}, "wip")
+        self.commit({"b.js": "2\n"}, "wip")
+        llm = CountingProvider(self.config)
+        cwd = os.getcwd()
+        os.chdir(self.repo)
+        self.addCleanup(os.chdir, cwd)
+
+        with patch("llm.router.build_provider", return_value=llm), \
+                patch("core.filters.DiffFilter.encoder", CharEncoder()), \
+                patch("core.tokenizer.preload"), \
+                patch.dict(os.environ, {**IDENTITY, "EDGE_BLOB_CACHE": "false"}):
+            result = CliRunner().invoke(app, ["reword", base, "--dry-run"])
+            self.assertEqual(result.exit_code, 0, result.output)
+            self.assertIn("chore: update b.js", result.output)
+            self.assertEqual(self.log("--format=%s", f"{base}..HEAD"), ["wip", "wip"])
+
+            result = CliRunner().invoke(app, ["reword", base, "--yes"])
+            self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(self.log("--format=%s", f"{base}..HEAD"), ["chore: update b.js", "chore: update a.js"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,218 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from config import Config
+from llm.base import BaseLLMProvider
+from llm.router import MIN_SAMPLES, LatencyStats, RoutingProvider, build_provider
+from tests.test_providers import make_summary
+
+
+class TimedProvider(BaseLLMProvider):
+    """Replies with message after delay seconds, or raises error."""
+
+    def __init__(self, config, model, message="feat: add app", delay=0.0, error=None):
+        super().__init__(config)
+        self.model = model
+        self.message = message
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.warmed = False
+
+    def warm_up(self):
+        self.warmed = True
+
+    def generate_commit(self, diff_summary, on_update=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error is not None:
+            raise self.error
+        if on_update is not None:
+            on_update(self.message)
+        return self.message
+
+
+class RouterTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.state = Path(self.tmpdir.name, "latency.json")
+        self.stats = LatencyStats(self.state)
+        self.config = Config(_env_file=None, EDGE_HEDGE_DELAY=5.0)
+
+    def route(self, **backends) -> RoutingProvider:
+        return RoutingProvider(self.config, list(backends), factory=backends.__getitem__, stats=self.stats)
+
+    def seed(self, backend: str, seconds: float, count: int = MIN_SAMPLES) -> None:
+        for _ in range(count):
+            self.stats.record_success(backend, seconds)
+
+
+class TestLatencyStats(RouterTestCase):
+    def test_percentiles_need_enough_samples(self):
+        self.seed("openai:gpt-4", 1.0, count=MIN_SAMPLES - 1)
+        self.assertIsNone(self.stats.p50("openai:gpt-4"))
+        self.stats.record_success("openai:gpt-4", 3.0)
+        self.assertEqual(self.stats.p50("openai:gpt-4"), 1.0)
+        self.assertEqual(self.stats.p95("openai:gpt-4"), 3.0)
+
+    def test_window_moves(self):
+        stats = LatencyStats(self.state, window=MIN_SAMPLES)
+        for seconds in range(10):
+            stats.record_success("local:llama", float(seconds))
+        self.assertEqual(stats.samples("local:llama"), [5.0, 6.0, 7.0, 8.0, 9.0])
+
+    def test_failure_marks_unhealthy_until_success(self):
+        self.stats.record_failure("openai:gpt-4")
+        self.assertFalse(self.stats.healthy("openai:gpt-4"))
+        self.stats.record_success("openai:gpt-4", 1.0)
+        self.assertTrue(self.stats.healthy("openai:gpt-4"))
+
+    def test_persisted_between_runs(self):
+        self.seed("openai:gpt-4", 0.5)
+        self.stats.record_failure("local:llama")
+        self.stats.save()
+
+        restored = LatencyStats(self.state)
+        self.assertEqual(restored.samples("openai:gpt-4"), [0.5] * MIN_SAMPLES)
+        self.assertFalse(restored.healthy("local:llama"))
+
+    def test_unreadable_state_is_ignored(self):
+        self.state.write_text("{not json")
+        self.assertEqual(LatencyStats(self.state).samples("openai:gpt-4"), [])
+        self.state.write_text(json.dumps({"version": 0, "backends": {"openai:gpt-4": {"samples": [1.0]}}}))
+        self.assertEqual(LatencyStats(self.state).samples("openai:gpt-4"), [])
+
+    def test_state_path_from_environment(self):
+        with patch.dict(os.environ, {"EDGE_LATENCY_STATE": str(self.state)}):
+            self.assertEqual(LatencyStats().path, self.state)
+
+
+class TestRoutingProvider(RouterTestCase):
+    def test_fastest_healthy_backend_first(self):
+        slow = TimedProvider(self.config, "gpt-4", message="feat: slow")
+        fast = TimedProvider(self.config, "llama", message="feat: fast")
+        self.seed("openai:gpt-4", 2.0)
+        self.seed("local:llama", 0.2)
+
+        router = self.route(openai=slow, local=fast)
+
+        self.assertEqual([name for name, _ in router.ranked()], ["local:llama", "openai:gpt-4"])
+        self.assertEqual(router.generate_commit(make_summary()), "feat: fast")
+        self.assertEqual(slow.calls, 0)
+
+    def test_unmeasured_backends_keep_configured_order(self):
+        router = self.route(
+            openai=TimedProvider(self.config, "gpt-4"),
+            local=TimedProvider(self.config, "llama"),
+        )
+        self.assertEqual([name for name, _ in router.ranked()], ["openai:gpt-4", "local:llama"])
+
+    def test_failed_backend_tried_last(self):
+        self.seed("openai:gpt-4", 0.1)
+        self.stats.record_failure("openai:gpt-4")
+        router = self.route(
+            openai=TimedProvider(self.config, "gpt-4"),
+            local=TimedProvider(self.config, "llama"),
+        )
+        self.assertEqual([name for name, _ in router.ranked()], ["local:llama", "openai:gpt-4"])
+
+    def test_falls_back_on_error(self):
+        primary = TimedProvider(self.config, "gpt-4", error=RuntimeError("503 Service Unavailable"))
+        fallback = TimedProvider(self.config, "llama", message="fix: from fallback")
+
+        message = self.route(openai=primary, local=fallback).generate_commit(make_summary())
+
+        self.assertEqual(message, "fix: from fallback")
+        self.assertFalse(self.stats.healthy("openai:gpt-4"))
+        self.assertEqual(len(self.stats.samples("local:llama")), 1)
+        # Saved for the next run
+        self.assertFalse(LatencyStats(self.state).healthy("openai:gpt-4"))
+
+    def test_hedges_after_primary_p95(self):
+        self.seed("openai:gpt-4", 0.05)
+        self.seed("local:llama", 0.1)
+        primary = TimedProvider(self.config, "gpt-4", message="feat: primary", delay=2.0)
+        fallback = TimedProvider(self.config, "llama", message="feat: hedge")
+
+        start = time.monotonic()
+        message = self.route(openai=primary, local=fallback).generate_commit(make_summary())
+
+        self.assertEqual(message, "feat: hedge")
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(primary.calls, 1)
+
+    def test_no_hedge_within_p95(self):
+        self.seed("openai:gpt-4", 1.0)
+        primary = TimedProvider(self.config, "gpt-4", delay=0.05)
+        fallback = TimedProvider(self.config, "llama")
+
+        self.route(openai=primary, local=fallback).generate_commit(make_summary())
+
+        self.assertEqual(fallback.calls, 0)
+
+    def test_every_backend_failing(self):
+        router = self.route(
+            openai=TimedProvider(self.config, "gpt-4", error=RuntimeError("timed out")),
+            local=TimedProvider(self.config, "llama", error=RuntimeError("connection refused")),
+        )
+        with self.assertRaisesRegex(RuntimeError, "openai:gpt-4: timed out; local:llama: connection refused"):
+            router.generate_commit(make_summary())
+
+    def test_progress_from_one_backend(self):
+        self.seed("openai:gpt-4", 0.05)
+        self.seed("local:llama", 0.1)
+        primary = TimedProvider(self.config, "gpt-4", message="feat: primary", delay=0.3)
+        fallback = TimedProvider(self.config, "llama", message="feat: hedge")
+        updates = []
+
+        router = self.route(openai=primary, local=fallback)
+        router.generate_commit(make_summary(), on_update=updates.append)
+        # The abandoned primary finishes later; its progress is not shown
+        time.sleep(0.4)
+
+        self.assertEqual(updates, ["feat: hedge"])
+
+    def test_unconfigured_backend_left_out(self):
+        def factory(name):
+            if name == "openai":
+                raise ValueError("OpenAI API key not found")
+            return TimedProvider(self.config, "llama")
+
+        router = RoutingProvider(self.config, ["openai", "local"], factory=factory, stats=self.stats)
+        self.assertEqual([name for name, _ in router.backends], ["local:llama"])
+
+        with self.assertRaisesRegex(ValueError, "API key"):
+            RoutingProvider(self.config, ["openai"], factory=factory, stats=self.stats)
+
+    def test_warm_up_skips_unhealthy(self):
+        primary = TimedProvider(self.config, "gpt-4")
+        fallback = TimedProvider(self.config, "llama")
+        self.stats.record_failure("openai:gpt-4")
+
+        self.route(openai=primary, local=fallback).warm_up()
+
+        self.assertFalse(primary.warmed)
+        self.assertTrue(fallback.warmed)
+
+
+class TestBuildProvider(RouterTestCase):
+    def test_single_provider_is_not_routed(self):
+        provider = TimedProvider(self.config, "gpt-4")
+        self.assertIs(build_provider(self.config, factory=lambda name: provider), provider)
+
+    def test_fallbacks_are_routed(self):
+        config = Config(_env_file=None, EDGE_FALLBACK_PROVIDERS="local, openai,local")
+        self.assertEqual(config.provider_chain, ["openai", "local"])
+        router = build_provider(config, factory=lambda name: TimedProvider(config, name), stats=self.stats)
+        self.assertIsInstance(router, RoutingProvider)
+        self.assertEqual([name for name, _ in router.backends], ["openai:openai", "local:local"])
+
+
+if __name__ == "__main__":
+    unittest.main()
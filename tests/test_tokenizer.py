@@ -0,0 +1,92 @@
+import base64
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+from config import Config
+from core import tokenizer
+from core.filters import DiffFilter
+from llm.openai import OpenAIProvider
+
+
+def write_rank_file(path: Path) -> None:
+    merges = [b"he", b"ll", b"hell", b"hello"]
+    tokens = [bytes([b]) for b in range(256)] + merges
+    with open(path, "wb") as f:
+        for rank, token in enumerate(tokens):
+            f.write(base64.b64encode(token) + b" " + str(rank).encode() + b"\n")
+
+
+class TestTokenizerRegistry(unittest.TestCase):
+    def setUp(self):
+        self._saved = dict(tokenizer._encodings)
+        tokenizer._encodings.clear()
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.env = patch.dict(os.environ, {"EDGE_TOKENIZER_CACHE": self.tmpdir.name})
+        self.env.start()
+
+    def tearDown(self):
+        self.env.stop()
+        self.tmpdir.cleanup()
+        tokenizer._encodings.clear()
+        tokenizer._encodings.update(self._saved)
+
+    def test_cache_dir_is_versioned(self):
+        self.assertEqual(
+            tokenizer.cache_dir(),
+            Path(self.tmpdir.name) / f"v{tokenizer.TOKENIZER_CACHE_VERSION}",
+        )
+
+    def test_encoding_shared_across_modules(self):
+        encoding = object()
+        tokenizer.register_encoding("cl100k_base", encoding)
+
+        with patch.dict(os.environ, {"OPENAI_API_KEY": "test-key", "OPENAI_MODEL": "gpt-4"}):
+            provider = OpenAIProvider(Config())
+        diff_filter = DiffFilter(Config())
+
+        self.assertIs(diff_filter.encoder, encoding)
+        self.assertIs(provider.encoder, encoding)
+
+    def test_loads_offline_from_cache_and_compiles(self):
+        directory = tokenizer.cache_dir()
+        directory.mkdir(parents=True)
+        write_rank_file(directory / "cl100k_base.tiktoken")
+
+        with patch("tiktoken.load.read_file_cached") as mock_download:
+            encoding = tokenizer.get_encoding("cl100k_base")
+            mock_download.assert_not_called()
+
+        self.assertEqual(encoding.decode(encoding.encode("hello")), "hello")
+        self.assertEqual(len(encoding.encode("hello")), 1)
+        self.assertIs(tokenizer.get_encoding("cl100k_base"), encoding)
+        self.assertTrue(any(directory.glob("cl100k_base.*.marshal")))
+
+        # A fresh process goes through the compiled file, not the rank file
+        tokenizer._encodings.clear()
+        with patch("core.tokenizer.parse_rank_file") as mock_parse:
+            encoding = tokenizer.get_encoding("cl100k_base")
+            mock_parse.assert_not_called()
+        self.assertEqual(len(encoding.encode("hello")), 1)
+
+    def test_missing_cache_without_network(self):
+        with patch("tiktoken.load.read_file_cached", side_effect=OSError("offline")):
+            with self.assertRaises(tokenizer.TokenizerError):
+                tokenizer.get_encoding("cl100k_base")
+
+    def test_preload_then_get(self):
+        directory = tokenizer.cache_dir()
+        directory.mkdir(parents=True)
+        write_rank_file(directory / "cl100k_base.tiktoken")
+
+        tokenizer.preload("cl100k_base")
+        encoding = tokenizer.get_encoding("cl100k_base")
+
+        self.assertEqual(len(encoding.encode("hello")), 1)
+        self.assertEqual(tokenizer._loaders, {})
+
+    def test_unknown_model_falls_back_to_default(self):
+        self.assertEqual(tokenizer.encoding_name_for_model("my-local-model"), "cl100k_base")
+        self.assertEqual(tokenizer.encoding_name_for_model("gpt-4"), "cl100k_base")